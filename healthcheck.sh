@@ -3,7 +3,10 @@
 sleep 2
 
 FILE_PATH="./heartbeat"
+STATS_PATH="./stats.json"
 MAX_MINUTES=15
+# A running scrape that saved no page or chapter for this long is stuck
+MAX_STALL_MINUTES=30
 
 if [ ! -f "$FILE_PATH" ]; then
     echo "File missing"
@@ -21,5 +24,24 @@ if [ "$AGE_MINUTES" -gt "$MAX_MINUTES" ]; then
     exit 1
 fi
 
+# The stats file is written by the scraper every 30 seconds, an idle
+# service is healthy, a busy one has to keep making progress
+if [ -f "$STATS_PATH" ]; then
+    STALL_MINUTES=$(python3 -c "
+import json, sys, time
+stats = json.load(open(sys.argv[1]))
+if stats.get('busy_since') is None:
+    print(0)
+else:
+    last = max(stats['busy_since'], stats.get('last_progress') or 0)
+    print(int((time.time() - last) / 60))
+" "$STATS_PATH") || STALL_MINUTES=0
+
+    if [ "$STALL_MINUTES" -gt "$MAX_STALL_MINUTES" ]; then
+        echo "No progress for $STALL_MINUTES minutes"
+        exit 1
+    fi
+fi
+
 echo "OK: $AGE_MINUTES minutes old"
 exit 0
@@ -3,3 +3,14 @@ class GLOBAL:
     SAVE_ROOT = "./manga"
     URL_LIST_FILE_PATH = "./to_scrape.conf"
     TRY_MERGING_SMALLER_IMAGES = True
+    # Store downloaded pages as-is instead of re-encoding them to JPEG
+    PASSTHROUGH_IMAGES = True
+    # Named output profile, see cbz/Encoding.py, overrides PASSTHROUGH_IMAGES when set
+    OUTPUT_PROFILE = None
+    # Try plain HTTP requests before falling back to a headless browser
+    USE_HTTP_FAST_PATH = True
+    # Write pages into the CBZ while the chapter is still downloading
+    STREAM_CHAPTERS = False
+    # Claim chapters through the lease queue in SAVE_ROOT, so several workers
+    # can share one library without scraping the same chapter
+    USE_WORK_QUEUE = False
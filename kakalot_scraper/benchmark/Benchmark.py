@@ -0,0 +1,342 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import kakalot_scraper
+from kakalot_scraper.benchmark.StandIn import StandInConfig, StandInServer
+
+
+class SETTINGS:
+    STAGES = [
+        "get_manga_info",
+        "get_chapters_list",
+        "scrape_manga",
+        "generate_cbz",
+        "scrape_manga_and_save",
+        "scrape_manga_async",
+    ]
+    OUTPUT_PATH = "./benchmark.json"
+    # Requests per second of the rate limiter, None lifts the limit so the
+    # scraper itself is measured
+    RATE_LIMIT: Optional[float] = None
+    UNLIMITED_RATE = 10000.0
+    # The async stage scrapes this many copies of the series, once serially
+    # and once with ENGINE_CONCURRENCY pages open
+    ENGINE_SERIES = 4
+    ENGINE_CONCURRENCY = 4
+
+
+def _setup(save_root: str, options: dict[str, Any]) -> None:
+    """
+    Points a stage process at its own library and applies the run options.
+    """
+    from kakalot_scraper.cache.ImageCache import SETTINGS as CACHE_SETTINGS
+    from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RATE_LIMIT_SETTINGS
+
+    kakalot_scraper.GLOBAL.SAVE_ROOT = save_root
+    kakalot_scraper.GLOBAL.USE_HTTP_FAST_PATH = options["fast_path"]
+    kakalot_scraper.GLOBAL.STREAM_CHAPTERS = options["stream"]
+    # A warm cache would hide the downloads
+    CACHE_SETTINGS.ENABLED = options["cache"]
+
+    rate = options["rate_limit"] or SETTINGS.UNLIMITED_RATE
+    RATE_LIMIT_SETTINGS.INITIAL_RATE = rate
+    RATE_LIMIT_SETTINGS.MAX_RATE = max(RATE_LIMIT_SETTINGS.MAX_RATE, rate)
+    if options["rate_limit"] is None:
+        RATE_LIMIT_SETTINGS.BURST = SETTINGS.UNLIMITED_RATE
+    os.makedirs(save_root, exist_ok=True)
+
+
+def _chapter_pages(chapter_url: str) -> list:
+    """
+    Downloads the pages of a chapter outside of the measured stage.
+    """
+    from kakalot_scraper.fastpath.FastPath import fetch_chapter_images
+
+    return fetch_chapter_images(chapter_url) or []
+
+
+def _run_stage(
+    stage: str, series_url: str, chapters: int, save_root: str, options: dict
+) -> dict[str, Any]:
+    """
+    Runs a single stage in a fresh process and measures it.
+    """
+    from kakalot_scraper.browser.Browser import BrowserSession
+    from kakalot_scraper.metrics.Metrics import metrics
+
+    _setup(save_root, options)
+    chapter_url = f"{series_url}/chapter-1"
+    result: dict[str, Any] = {"stage": stage}
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    session = BrowserSession()
+    start = time.perf_counter()
+    try:
+        if stage == "get_manga_info":
+            from kakalot_scraper.manager.Manager import get_manga_info
+
+            info = get_manga_info(series_url, session=session)
+            result["ok"] = info.healthcheck()
+        elif stage == "get_chapters_list":
+            from kakalot_scraper.manager.Manager import get_chapters_list
+
+            found = get_chapters_list(series_url, session=session)
+            result["ok"] = len(found) == chapters
+            result["chapters"] = len(found)
+        elif stage == "scrape_manga":
+            from kakalot_scraper.scrape.Scraper import scrape_manga
+
+            pages = scrape_manga(chapter_url, session=session)
+            result["ok"] = bool(pages)
+            result["pages"] = len(pages)
+        elif stage == "generate_cbz":
+            from kakalot_scraper.cbz.Generator import generate_cbz
+            from kakalot_scraper.manager.Manager import MangaInfo
+
+            pages = _chapter_pages(chapter_url)
+            manga_info = MangaInfo(
+                "Benchmark Manga", "", "Ongoing", "", "", [], "", series_url
+            )
+            start = time.perf_counter()
+            cbz_path = generate_cbz(manga_info, "0001_0", pages, save_root)
+            result["ok"] = bool(pages)
+            result["pages"] = len(pages)
+            result["cbz_bytes"] = os.path.getsize(cbz_path)
+        elif stage == "scrape_manga_and_save":
+            # main.py sits next to the package, the benchmark is run from there
+            from main import scrape_manga_and_save
+            from kakalot_scraper.library.Library import LibraryIndex
+
+            with LibraryIndex() as index:
+                scrape_manga_and_save(series_url, True, session, None, index)
+            saved = metrics.snapshot()["counters"].get("chapters", 0)
+            result["ok"] = saved == chapters
+            result["chapters"] = saved
+        elif stage == "scrape_manga_async":
+            from kakalot_scraper.engine.Engine import run_engine
+
+            # The fast path would fetch every chapter without the browser
+            kakalot_scraper.GLOBAL.USE_HTTP_FAST_PATH = False
+            # The stand-in serves any slug, so every copy is its own series
+            urls = [f"{series_url}-{i}" for i in range(options["engine_series"])]
+            runs = {}
+            for concurrency in (1, options["engine_concurrency"]):
+                # Every run starts from an empty library
+                kakalot_scraper.GLOBAL.SAVE_ROOT = os.path.join(
+                    save_root, f"concurrency-{concurrency}"
+                )
+                os.makedirs(kakalot_scraper.GLOBAL.SAVE_ROOT, exist_ok=True)
+                runs[concurrency] = run_engine(
+                    urls, concurrency=concurrency, per_host_concurrency=concurrency
+                )
+            result["ok"] = all(
+                stats["series_done"] == len(urls)
+                and stats["chapters_saved"] == len(urls) * chapters
+                for stats in runs.values()
+            )
+            result["engine"] = {
+                "series": len(urls),
+                "concurrency": options["engine_concurrency"],
+                "serial_series_per_hour": runs[1]["series_per_hour"],
+                "concurrent_series_per_hour": runs[options["engine_concurrency"]][
+                    "series_per_hour"
+                ],
+                "runs": {str(c): stats for c, stats in runs.items()},
+            }
+        else:
+            raise ValueError(f"Unknown stage {stage}")
+    except Exception as e:
+        result["ok"] = False
+        message = (str(e).strip().splitlines() or [""])[0]
+        result["error"] = f"{type(e).__name__}: {message}"
+    finally:
+        elapsed = time.perf_counter() - start
+        session.close()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    snapshot = metrics.snapshot()
+    result.update(
+        {
+            "seconds": round(elapsed, 3),
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": round(peak / 1024, 1),
+            "rss_delta_mb": round((peak - baseline) / 1024, 1),
+            "counters": snapshot["counters"],
+            "stages": snapshot["stages"],
+        }
+    )
+    if result.get("chapters") and stage == "scrape_manga_and_save":
+        result["chapters_per_minute"] = round(result["chapters"] / elapsed * 60, 2)
+    return result
+
+
+def run_benchmark(
+    config: StandInConfig,
+    stages: Optional[list[str]] = None,
+    fast_path: bool = True,
+    stream: bool = False,
+    cache: bool = False,
+    rate_limit: Optional[float] = SETTINGS.RATE_LIMIT,
+    engine_series: int = SETTINGS.ENGINE_SERIES,
+    engine_concurrency: int = SETTINGS.ENGINE_CONCURRENCY,
+) -> dict[str, Any]:
+    """
+    Runs the stages against a local stand-in of the site.
+
+    Every stage runs in its own spawned process with an empty library, so
+    peak RSS and timings are not skewed by earlier stages.
+
+    Args:
+        config (StandInConfig): Shape of the synthetic site.
+        stages (list[str] | None): Stages to run, all of SETTINGS.STAGES by default.
+        fast_path (bool): Value of GLOBAL.USE_HTTP_FAST_PATH for the run.
+        stream (bool): Value of GLOBAL.STREAM_CHAPTERS for the run.
+        cache (bool): Keep the image cache enabled.
+        rate_limit (float | None): Requests per second, None for no limit.
+        engine_series (int): Series scraped by the scrape_manga_async stage.
+        engine_concurrency (int): Concurrency compared against the serial run
+            of the scrape_manga_async stage.
+
+    Returns:
+        dict: The run options, the results of every stage and the server stats.
+    """
+    stages = stages or SETTINGS.STAGES
+    options = {
+        "fast_path": fast_path,
+        "stream": stream,
+        "cache": cache,
+        "rate_limit": rate_limit,
+        "engine_series": engine_series,
+        "engine_concurrency": engine_concurrency,
+    }
+    work_dir = tempfile.mkdtemp(prefix="kakalot-bench-")
+    results = []
+
+    try:
+        with StandInServer(config) as server:
+            for stage in stages:
+                print(f"Running {stage}...")
+                with ProcessPoolExecutor(
+                    1, mp_context=multiprocessing.get_context("spawn")
+                ) as pool:
+                    result = pool.submit(
+                        _run_stage,
+                        stage,
+                        server.series_url(),
+                        config.chapters,
+                        os.path.join(work_dir, stage),
+                        options,
+                    ).result()
+                results.append(result)
+            server_stats = server.stats()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "time": time.time(),
+        "python": platform.python_version(),
+        "site": config.to_dict(),
+        "options": options,
+        "stages": results,
+        "server": server_stats,
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    for result in report["stages"]:
+        line = (
+            f"{result['stage']:<24} {'ok' if result['ok'] else 'FAILED':<7}"
+            f"{result['seconds']:>9.2f}s {result['peak_rss_mb']:>8.1f} MB peak"
+        )
+        if "chapters_per_minute" in result:
+            line += f"  {result['chapters_per_minute']} chapters/min"
+        if "engine" in result:
+            engine = result["engine"]
+            line += (
+                f"  {engine['serial_series_per_hour']} series/h serial, "
+                f"{engine['concurrent_series_per_hour']} series/h at "
+                f"concurrency {engine['concurrency']}"
+            )
+        if "error" in result:
+            line += f"  {result['error']}"
+        print(line)
+    print(f"Server: {report['server']}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scraper against a local stand-in of the site"
+    )
+    parser.add_argument("--chapters", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-width", type=int, default=800)
+    parser.add_argument("--page-height", type=int, default=1200)
+    parser.add_argument(
+        "--slices", type=int, default=1, help="Images every page is cut into"
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with HTTP 429",
+    )
+    parser.add_argument("--stages", nargs="+", choices=SETTINGS.STAGES)
+    parser.add_argument(
+        "--no-fast-path", action="store_true", help="Always use the browser"
+    )
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="Keep the image cache")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=SETTINGS.RATE_LIMIT,
+        help="Requests per second, unlimited by default",
+    )
+    parser.add_argument(
+        "--engine-series",
+        type=int,
+        default=SETTINGS.ENGINE_SERIES,
+        help="Series scraped by the scrape_manga_async stage",
+    )
+    parser.add_argument(
+        "--engine-concurrency",
+        type=int,
+        default=SETTINGS.ENGINE_CONCURRENCY,
+        help="Concurrency compared against the serial scrape_manga_async run",
+    )
+    parser.add_argument("--output", default=SETTINGS.OUTPUT_PATH)
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        StandInConfig(
+            chapters=args.chapters,
+            pages=args.pages,
+            page_width=args.page_width,
+            page_height=args.page_height,
+            slices=args.slices,
+            latency_ms=args.latency_ms,
+            throttle_rate=args.throttle_rate,
+        ),
+        stages=args.stages,
+        fast_path=not args.no_fast_path,
+        stream=args.stream,
+        cache=args.cache,
+        rate_limit=args.rate_limit,
+        engine_series=args.engine_series,
+        engine_concurrency=args.engine_concurrency,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"Results written to {args.output}")
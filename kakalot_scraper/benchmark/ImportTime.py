@@ -0,0 +1,156 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+import kakalot_scraper
+
+
+class SETTINGS:
+    # Command lines of main.py that must start without the heavy modules
+    COMMANDS = [["status"], ["list"], ["plan"], ["--help"]]
+    # Top-level packages none of those may import
+    FORBIDDEN = ("playwright", "PIL", "watchdog", "tqdm", "asyncio")
+    # Modules of the package that scrape, encode or watch, same for them
+    FORBIDDEN_MODULES = (
+        "kakalot_scraper.browser",
+        "kakalot_scraper.scrape",
+        "kakalot_scraper.fastpath",
+        "kakalot_scraper.engine",
+        "kakalot_scraper.pipeline",
+        "kakalot_scraper.watchdog",
+        "kakalot_scraper.cbz.Generator",
+        "kakalot_scraper.cbz.Stream",
+        "kakalot_scraper.cbz.Encoding",
+    )
+    # Budget for the summed import time of one command, in milliseconds
+    MAX_IMPORT_MS = 150.0
+    # Each command is run this often and the fastest run is kept
+    RUNS = 3
+    TOP_MODULES = 5
+    MAIN_PATH = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(kakalot_scraper.__file__))),
+        "main.py",
+    )
+
+
+def parse_importtime(output: str) -> list[tuple[str, float, float, int]]:
+    """
+    Parses the stderr of `python -X importtime`.
+
+    Returns:
+        list[tuple[str, float, float, int]]: Module name, self and cumulative
+        microseconds and nesting depth, in import order.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules.append((name.strip(), float(self_us), float(cumulative_us), depth))
+    return modules
+
+
+def is_forbidden(name: str) -> bool:
+    """
+    Whether the fast commands must not import the module `name`.
+    """
+    return name.split(".")[0] in SETTINGS.FORBIDDEN or any(
+        name == module or name.startswith(f"{module}.")
+        for module in SETTINGS.FORBIDDEN_MODULES
+    )
+
+
+def measure(command: list[str]) -> dict[str, Any]:
+    """
+    Runs main.py with `command` in an empty directory and reports what it imported.
+    """
+    best: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="kakalot-importtime-") as work_dir:
+        for _ in range(SETTINGS.RUNS):
+            start = time.perf_counter()
+            process = subprocess.run(
+                [sys.executable, "-X", "importtime", SETTINGS.MAIN_PATH, *command],
+                cwd=work_dir,
+                capture_output=True,
+                text=True,
+            )
+            wall_ms = (time.perf_counter() - start) * 1000
+            modules = parse_importtime(process.stderr)
+            import_ms = sum(self_us for _, self_us, _, _ in modules) / 1000
+            if best and import_ms >= best["import_ms"]:
+                continue
+
+            top_level = sorted(
+                (module for module in modules if module[3] == 0),
+                key=lambda module: module[2],
+                reverse=True,
+            )
+            best = {
+                "command": " ".join(command),
+                "exit_code": process.returncode,
+                "import_ms": round(import_ms, 1),
+                "wall_ms": round(wall_ms, 1),
+                "modules": len(modules),
+                "forbidden": sorted(
+                    {name for name, _, _, _ in modules if is_forbidden(name)}
+                ),
+                "top": [
+                    (name, round(cumulative_us / 1000, 1))
+                    for name, _, cumulative_us, _ in top_level[: SETTINGS.TOP_MODULES]
+                ],
+            }
+    return best
+
+
+def check(results: list[dict[str, Any]]) -> list[str]:
+    """
+    Returns the regressions found in `results`, empty when all is well.
+    """
+    problems = []
+    for result in results:
+        if result["exit_code"] != 0:
+            problems.append(f"{result['command']} exited with {result['exit_code']}")
+        if result["forbidden"]:
+            problems.append(
+                f"{result['command']} imports {', '.join(result['forbidden'][:5])}"
+                + (" ..." if len(result["forbidden"]) > 5 else "")
+            )
+        if result["import_ms"] > SETTINGS.MAX_IMPORT_MS:
+            problems.append(
+                f"{result['command']} spends {result['import_ms']} ms importing, "
+                f"the budget is {SETTINGS.MAX_IMPORT_MS} ms"
+            )
+    return problems
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of the fast main.py commands"
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=SETTINGS.MAX_IMPORT_MS,
+        help="Import time budget per command",
+    )
+    args = parser.parse_args()
+    SETTINGS.MAX_IMPORT_MS = args.max_ms
+
+    results = [measure(command) for command in SETTINGS.COMMANDS]
+    for result in results:
+        top = ", ".join(f"{name} {ms}" for name, ms in result["top"])
+        print(
+            f"{result['command']:<10} {result['import_ms']:>7.1f} ms imports "
+            f"{result['wall_ms']:>7.1f} ms total {result['modules']:>4} modules  {top}"
+        )
+
+    problems = check(results)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,353 @@
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Optional
+
+from PIL import Image
+
+from kakalot_scraper.manager.Manager import SETTINGS as MANAGER_SETTINGS
+from kakalot_scraper.scrape.Scraper import SETTINGS as SCRAPER_SETTINGS
+
+
+class SETTINGS:
+    HOST = "127.0.0.1"
+    SERIES_SLUG = "bench-manga"
+    JPEG_QUALITY = 85
+
+
+class StandInConfig:
+    """
+    Shape of the synthetic site served by StandInServer.
+
+    Args:
+        chapters (int): Chapters of the series.
+        pages (int): Pages per chapter.
+        page_width (int): Width of every page in pixels.
+        page_height (int): Height of a full page in pixels.
+        slices (int): Images a page is cut into, 1 serves whole pages.
+        latency_ms (float): Delay added to every response.
+        throttle_rate (float): Share of requests answered with HTTP 429.
+        seed (int): Seed of the throttling and the image noise.
+    """
+
+    def __init__(
+        self,
+        chapters: int = 5,
+        pages: int = 20,
+        page_width: int = 800,
+        page_height: int = 1200,
+        slices: int = 1,
+        latency_ms: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.chapters = chapters
+        self.pages = pages
+        self.page_width = page_width
+        self.page_height = page_height
+        self.slices = max(1, slices)
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+
+def _series_page(config: StandInConfig, base_url: str, slug: str) -> str:
+    # Chapter links are absolute on the site
+    rows = "\n".join(
+        f'<div class="row"><span><a href="{base_url}/manga/{slug}/chapter-{n}">'
+        f"Chapter {n}</a></span><span>1,000</span></div>"
+        # The site lists the newest chapter first
+        for n in range(config.chapters, 0, -1)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>{slug}</title></head><body>
+<div class="{MANAGER_SETTINGS.INFO_DIV_CLASS_NAME}"><ul>
+<li><h1>Benchmark Manga</h1></li>
+<li>Author(s) : <a href="#">Stand In</a></li>
+<li>Status : Ongoing</li>
+<li>Last updated : Jan-01-2025 12:00:00 PM</li>
+<li>View : 1,000</li>
+<li>Genres : <a href="#">Action</a>, <a href="#">Comedy</a></li>
+<li><em id="rate_row_cmd">4.5 / 5</em></li>
+</ul></div>
+<div class="{MANAGER_SETTINGS.CHAPTERS_DIV_CLASS_NAME}">
+{rows}
+</div>
+</body></html>"""
+
+
+def _chapter_page(config: StandInConfig, slug: str, chapter: int) -> str:
+    images = "\n".join(
+        f'<img src="/img/placeholder.gif" data-src="/img/{slug}/{chapter}/{i:04d}.jpg" '
+        f'loading="lazy" alt="page {i}">'
+        for i in range(config.pages * config.slices)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>{slug} chapter {chapter}</title></head><body>
+<div class="{SCRAPER_SETTINGS.DIV_CLASS_NAME}">
+{images}
+</div>
+</body></html>"""
+
+
+class StandInServer:
+    """
+    Local stand-in for the site, serving a synthetic series with the same
+    markup the scrapers look for.
+
+    Routes:
+        /manga/<slug>                series page
+        /manga/<slug>/chapter-<n>    chapter page with lazy images
+        /img/<slug>/<n>/<i>.jpg      page images, or slices of them
+
+    Usage:
+        with StandInServer(StandInConfig(chapters=3, slices=4)) as server:
+            scrape_manga(server.chapter_url(1))
+            print(server.stats())
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None):
+        self.config = config or StandInConfig()
+        self.requests: dict[str, int] = {}
+        self.throttled = 0
+        self._random = random.Random(self.config.seed)
+        self._images: dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def __enter__(self) -> "StandInServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def series_url(self) -> str:
+        return f"{self.base_url}/manga/{SETTINGS.SERIES_SLUG}"
+
+    def chapter_url(self, chapter: int) -> str:
+        return f"{self.series_url()}/chapter-{chapter}"
+
+    def image(self, index: int) -> bytes:
+        """
+        JPEG of a slice, every slice of a chapter gets its own noise so the
+        images have realistic sizes and do not compress away.
+        """
+        config = self.config
+        variant = index % 8
+        with self._lock:
+            if variant not in self._images:
+                height = config.page_height // config.slices
+                noise = Image.effect_noise(
+                    (config.page_width, height), 48 + variant * 4
+                ).convert("RGB")
+                buffer = BytesIO()
+                noise.save(buffer, format="JPEG", quality=SETTINGS.JPEG_QUALITY)
+                self._images[variant] = buffer.getvalue()
+            return self._images[variant]
+
+    def _count(self, kind: str) -> bool:
+        """
+        Counts a request and decides whether it is throttled.
+        """
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            if self._random.random() < self.config.throttle_rate:
+                self.throttled += 1
+                return True
+        return False
+
+    def respond(self, path: str) -> tuple[int, str, bytes]:
+        """
+        Returns the status, content type and body for `path`.
+        """
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+
+        if path == "/img/placeholder.gif":
+            # Same transparent pixel the reader uses before an image loads
+            return (
+                200,
+                "image/gif",
+                bytes.fromhex(
+                    "47494638396101000100800000000000ffffff21f90401000000002c"
+                    "00000000010001000002024401003b"
+                ),
+            )
+
+        match = re.fullmatch(r"/img/([^/]+)/(\d+)/(\d+)\.jpg", path)
+        if match:
+            if self._count("image"):
+                return 429, "text/plain", b"Too Many Requests"
+            return 200, "image/jpeg", self.image(int(match.group(3)))
+
+        match = re.fullmatch(r"/manga/([^/]+)/chapter-(\d+)", path)
+        if match and 1 <= int(match.group(2)) <= self.config.chapters:
+            if self._count("chapter"):
+                return 429, "text/plain", b"Too Many Requests"
+            html = _chapter_page(self.config, match.group(1), int(match.group(2)))
+            return 200, "text/html; charset=utf-8", html.encode("utf-8")
+
+        match = re.fullmatch(r"/manga/([^/]+)", path)
+        if match:
+            if self._count("series"):
+                return 429, "text/plain", b"Too Many Requests"
+            html = _series_page(self.config, self.base_url, match.group(1))
+            return 200, "text/html; charset=utf-8", html.encode("utf-8")
+
+        return 404, "text/plain", b"Not Found"
+
+    def start(self) -> None:
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, content_type, body = server.respond(self.path.split("?")[0])
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((SETTINGS.HOST, 0), RequestHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Stand-in site serving on {self.base_url}")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "throttled": self.throttled}
+
+
+class StandInProxy:
+    """
+    Local forwarding HTTP proxy, for testing identities without real proxies.
+
+    Plain HTTP requests are forwarded to the stand-in site, a share of them
+    is answered with HTTP 429 like from an IP the site throttles. Requests,
+    throttled requests and the user agents seen are counted.
+
+    Usage:
+        with StandInServer() as site, StandInProxy(throttle_rate=1.0) as proxy:
+            Identity("burned", proxy=proxy.url)
+    """
+
+    def __init__(self, throttle_rate: float = 0.0, seed: int = 0):
+        self.throttle_rate = throttle_rate
+        self.requests = 0
+        self.throttled = 0
+        self.user_agents: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        # Environment proxies must not apply to the forwarded requests
+        self._opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def __enter__(self) -> "StandInProxy":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def forward(self, url: str, headers: dict[str, str]) -> tuple[int, str, bytes]:
+        """
+        Returns the status, content type and body for a proxied request.
+        """
+        user_agent = headers.get("User-Agent", "")
+        with self._lock:
+            self.requests += 1
+            self.user_agents[user_agent] = self.user_agents.get(user_agent, 0) + 1
+            if self._random.random() < self.throttle_rate:
+                self.throttled += 1
+                return 429, "text/plain", b"Too Many Requests"
+
+        request = urllib.request.Request(url, headers={"User-Agent": user_agent})
+        try:
+            with self._opener.open(request, timeout=30) as response:
+                return (
+                    response.status,
+                    response.headers.get("Content-Type", ""),
+                    response.read(),
+                )
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get("Content-Type", ""), e.read()
+        except OSError as e:
+            return 502, "text/plain", str(e).encode("utf-8")
+
+    def start(self) -> None:
+        proxy = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                # Proxied requests carry the full URL
+                status, content_type, body = proxy.forward(
+                    self.path, dict(self.headers)
+                )
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((SETTINGS.HOST, 0), RequestHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "user_agents": dict(self.user_agents),
+            }
+
+
+if __name__ == "__main__":
+    with StandInServer(StandInConfig(chapters=3, slices=4)) as server:
+        print(f"Series page: {server.series_url()}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,354 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+from playwright.async_api import async_playwright
+from playwright.async_api import Browser as AsyncBrowser
+from playwright.async_api import Page as AsyncPage
+from playwright.async_api import Playwright as AsyncPlaywright
+from playwright.sync_api import sync_playwright
+from playwright.sync_api._generated import Browser, Page, Playwright
+from kakalot_scraper.identity.Identity import Identity, identity_pool
+from kakalot_scraper.metrics.Metrics import metrics
+
+
+class SETTINGS:
+    HEADLESS = True
+    # Recycle the browser after this many pages to keep its memory in check
+    MAX_PAGES_PER_BROWSER = 200
+
+
+def launch_options() -> dict:
+    """
+    Options for `chromium.launch`.
+    """
+    options = {"headless": SETTINGS.HEADLESS}
+    if identity_pool.uses_proxies:
+        # Chromium only honours the proxy of a context when launched with one,
+        # every context sets its own so this one is never used
+        options["proxy"] = {"server": "http://per-context"}
+    return options
+
+
+class BrowserSession:
+    """
+    Long-lived Chromium instance shared by every scrape call of a run.
+
+    Each call to `page()` gets a fresh browser context, so cookies and cache
+    do not leak between calls, but the browser process itself is only
+    launched once. It is restarted after `max_pages` pages or when it has
+    crashed / disconnected. Every context takes the proxy, user agent and
+    viewport of an identity from the identity pool.
+
+    Usage:
+        with BrowserSession() as session:
+            info = get_manga_info(url, session=session)
+            images = scrape_manga(chapter_url, session=session)
+            print(session.stats())
+    """
+
+    def __init__(
+        self,
+        headless: bool = SETTINGS.HEADLESS,
+        max_pages: int = SETTINGS.MAX_PAGES_PER_BROWSER,
+    ):
+        self.headless = headless
+        self.max_pages = max_pages
+        self.launch_count = 0
+        self.restart_count = 0
+        self.page_count = 0
+        self._pages_since_launch = 0
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+
+    def __enter__(self) -> "BrowserSession":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+
+    def _launch(self) -> Browser:
+        self.start()
+        print("Launching browser...")
+        with metrics.timer("browser_launch"):
+            self._browser = self._playwright.chromium.launch(
+                **{**launch_options(), "headless": self.headless}
+            )
+        self.launch_count += 1
+        self._pages_since_launch = 0
+        return self._browser
+
+    def _close_browser(self) -> None:
+        if self._browser is None:
+            return
+        try:
+            self._browser.close()
+        except Exception:
+            pass
+        self._browser = None
+
+    def restart(self) -> None:
+        print("Restarting browser...")
+        self._close_browser()
+        self.restart_count += 1
+        self._launch()
+
+    def _ensure_browser(self) -> Browser:
+        if self._browser is None:
+            return self._launch()
+
+        if not self._browser.is_connected():
+            print("Browser disconnected, relaunching.")
+            self.restart()
+        elif self._pages_since_launch >= self.max_pages:
+            print(f"Browser served {self._pages_since_launch} pages, recycling.")
+            self.restart()
+
+        return self._browser
+
+    @contextmanager
+    def page(
+        self, identity: Optional[Identity] = None, **context_options
+    ) -> Iterator[Page]:
+        """
+        Opens a page in a fresh context of the shared browser.
+
+        Args:
+            identity (Identity | None): Identity of the context, picked from
+                the pool when None.
+            **context_options: Passed to `browser.new_context`, over the
+                options of the identity.
+
+        Yields:
+            Page: The new page, closed together with its context on exit.
+        """
+        with identity_pool.use(identity) as identity:
+            context_options = {**identity.context_options(), **context_options}
+            browser = self._ensure_browser()
+            try:
+                context = browser.new_context(**context_options)
+            except Exception as e:
+                # Most likely the browser crashed between calls, retry once
+                print(f"Could not create browser context ({e}), relaunching.")
+                metrics.inc("retries")
+                self.restart()
+                context = self._browser.new_context(**context_options)
+
+            self._pages_since_launch += 1
+            self.page_count += 1
+            try:
+                yield context.new_page()
+            finally:
+                try:
+                    context.close()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "launches": self.launch_count,
+            "restarts": self.restart_count,
+            "pages": self.page_count,
+        }
+
+    def close(self) -> None:
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+class AsyncBrowserSession:
+    """
+    asyncio counterpart of BrowserSession, used by the async scrape engine.
+
+    Pages may be opened concurrently from several tasks, the browser is
+    (re)launched under a lock so only one task ever does it. Once it served
+    `max_pages` pages no new ones are handed out, the open ones are waited
+    for and then the browser is recycled, so it is recycled even when pages
+    are always open.
+    """
+
+    def __init__(
+        self,
+        headless: bool = SETTINGS.HEADLESS,
+        max_pages: int = SETTINGS.MAX_PAGES_PER_BROWSER,
+    ):
+        self.headless = headless
+        self.max_pages = max(1, max_pages)
+        self.launch_count = 0
+        self.restart_count = 0
+        self.page_count = 0
+        self._pages_since_launch = 0
+        self._open_pages = 0
+        self._playwright: Optional[AsyncPlaywright] = None
+        self._browser: Optional[AsyncBrowser] = None
+        self._lock = asyncio.Lock()
+        self._page_closed = asyncio.Condition()
+
+    async def __aenter__(self) -> "AsyncBrowserSession":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+
+    async def _launch(self) -> AsyncBrowser:
+        await self.start()
+        print("Launching browser...")
+        with metrics.timer("browser_launch"):
+            self._browser = await self._playwright.chromium.launch(
+                **{**launch_options(), "headless": self.headless}
+            )
+        self.launch_count += 1
+        self._pages_since_launch = 0
+        return self._browser
+
+    async def _close_browser(self) -> None:
+        if self._browser is None:
+            return
+        try:
+            await self._browser.close()
+        except Exception:
+            pass
+        self._browser = None
+
+    async def _restart(self) -> None:
+        print("Restarting browser...")
+        await self._close_browser()
+        self.restart_count += 1
+        await self._launch()
+
+    async def _open_slot(self) -> AsyncBrowser:
+        """
+        Returns the browser to open the next page in and counts that page as
+        open, recycling the browser first when it is due.
+        """
+        while True:
+            async with self._lock:
+                if self._browser is None:
+                    await self._launch()
+                elif not self._browser.is_connected():
+                    print("Browser disconnected, relaunching.")
+                    await self._restart()
+                elif self._pages_since_launch >= self.max_pages:
+                    if self._open_pages == 0:
+                        await self._restart()
+                    else:
+                        print(
+                            f"Browser served {self._pages_since_launch} pages, "
+                            f"recycling once {self._open_pages} open pages are closed."
+                        )
+
+                if self._pages_since_launch < self.max_pages:
+                    self._pages_since_launch += 1
+                    self._open_pages += 1
+                    return self._browser
+
+            # Waits without the lock, so open pages can still relaunch and
+            # close, no page is opened while the recycle is due
+            async with self._page_closed:
+                await self._page_closed.wait_for(lambda: self._open_pages == 0)
+
+    async def _close_slot(self) -> None:
+        async with self._page_closed:
+            self._open_pages -= 1
+            self._page_closed.notify_all()
+
+    @asynccontextmanager
+    async def page(
+        self, identity: Optional[Identity] = None, **context_options
+    ) -> AsyncIterator[AsyncPage]:
+        """
+        Opens a page in a fresh context of the shared browser.
+
+        Args:
+            identity (Identity | None): Identity of the context, picked from
+                the pool when None.
+            **context_options: Passed to `browser.new_context`, over the
+                options of the identity.
+
+        Yields:
+            Page: The new page, closed together with its context on exit.
+        """
+        with identity_pool.use(identity) as identity:
+            context_options = {**identity.context_options(), **context_options}
+            browser = await self._open_slot()
+            context = None
+            try:
+                try:
+                    context = await browser.new_context(**context_options)
+                except Exception as e:
+                    print(f"Could not create browser context ({e}), relaunching.")
+                    async with self._lock:
+                        if self._browser is browser:
+                            await self._restart()
+                    context = await self._browser.new_context(**context_options)
+
+                self.page_count += 1
+                yield await context.new_page()
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                await self._close_slot()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "launches": self.launch_count,
+            "restarts": self.restart_count,
+            "pages": self.page_count,
+        }
+
+    async def close(self) -> None:
+        await self._close_browser()
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+@contextmanager
+def open_page(
+    session: Optional[BrowserSession] = None, **context_options
+) -> Iterator[Page]:
+    """
+    Opens a page either from the given session or, when no session is
+    passed, from a browser launched just for this call.
+
+    Args:
+        session (BrowserSession | None): Shared browser session to use.
+        **context_options: Passed to `browser.new_context`.
+
+    Yields:
+        Page: A ready to use page.
+    """
+    if session is not None:
+        with session.page(**context_options) as page:
+            yield page
+        return
+
+    with identity_pool.use() as identity, sync_playwright() as p:
+        browser = p.chromium.launch(**launch_options())
+        try:
+            context = browser.new_context(
+                **{**identity.context_options(), **context_options}
+            )
+            yield context.new_page()
+        finally:
+            browser.close()
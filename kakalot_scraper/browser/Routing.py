@@ -0,0 +1,203 @@
+import asyncio
+from collections import defaultdict
+from typing import Optional
+from urllib.parse import urlparse
+
+from kakalot_scraper.cache.ImageCache import ImageCache
+
+
+class SETTINGS:
+    # Resource types a chapter or series page never needs
+    BLOCKED_RESOURCE_TYPES = {
+        "font",
+        "stylesheet",
+        "media",
+        "websocket",
+        "manifest",
+        "texttrack",
+        "eventsource",
+        "beacon",
+        "ping",
+    }
+    # Any request whose host contains one of these is dropped
+    BLOCKED_HOST_KEYWORDS = [
+        "doubleclick",
+        "googlesyndication",
+        "googletagmanager",
+        "google-analytics",
+        "googleadservices",
+        "adservice",
+        "adsystem",
+        "amazon-adsystem",
+        "facebook",
+        "disqus",
+        "histats",
+        "popads",
+        "propellerads",
+        "onclickads",
+        "exoclick",
+        "taboola",
+        "outbrain",
+        "cloudflareinsights",
+    ]
+    # Hosts images may be loaded from, an empty list allows every host that
+    # is not blocked above. Subdomains match, e.g. "storage.com" allows
+    # "img-1.storage.com".
+    IMAGE_HOST_ALLOWLIST: list[str] = []
+    BLOCK_THIRD_PARTY_SCRIPTS = True
+
+
+def site_of(host: str) -> str:
+    """
+    Rough registrable domain of a host, "www.example.gg" -> "example.gg".
+    """
+    parts = host.split(".")
+    return ".".join(parts[-2:]) if len(parts) >= 2 else host
+
+
+def host_matches(host: str, allowed: str) -> bool:
+    return host == allowed or host.endswith(f".{allowed}")
+
+
+class RequestRouter:
+    """
+    Aborts requests a page does not need and accounts for the bytes of the
+    ones it lets through, grouped by resource type. Images found in `cache`
+    are answered from disk without touching the network.
+
+    Usage:
+        router = RequestRouter(chapter_url)
+        router.attach(page)
+        ...
+        router.report(chapter_url)
+    """
+
+    def __init__(
+        self,
+        page_url: str,
+        block_images: bool = False,
+        image_host_allowlist: Optional[list[str]] = None,
+        cache: Optional[ImageCache] = None,
+    ):
+        self.site = site_of(urlparse(page_url).hostname or "")
+        self.block_images = block_images
+        self.image_host_allowlist = (
+            SETTINGS.IMAGE_HOST_ALLOWLIST
+            if image_host_allowlist is None
+            else image_host_allowlist
+        )
+        self.cache = cache
+        self.cached = 0
+        self.requests: dict[str, int] = defaultdict(int)
+        self.bytes: dict[str, int] = defaultdict(int)
+        self.blocked: dict[str, int] = defaultdict(int)
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if url.startswith("data:"):
+            return False
+
+        host = urlparse(url).hostname or ""
+
+        if resource_type in SETTINGS.BLOCKED_RESOURCE_TYPES:
+            return True
+
+        if any(keyword in host for keyword in SETTINGS.BLOCKED_HOST_KEYWORDS):
+            return True
+
+        if resource_type == "script" and SETTINGS.BLOCK_THIRD_PARTY_SCRIPTS:
+            return site_of(host) != self.site
+
+        if resource_type == "image":
+            if self.block_images:
+                return True
+            if self.image_host_allowlist:
+                return not any(
+                    host_matches(host, allowed) for allowed in self.image_host_allowlist
+                )
+
+        return False
+
+    def _route(self, route) -> bool:
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked[request.resource_type] += 1
+            return True
+        return False
+
+    def _cached_body(self, route) -> Optional[bytes]:
+        request = route.request
+        if self.cache is None or request.resource_type != "image":
+            return None
+        data = self.cache.get(request.url)
+        if data is not None:
+            self.cached += 1
+        return data
+
+    def handle(self, route) -> None:
+        if self._route(route):
+            route.abort()
+        elif (data := self._cached_body(route)) is not None:
+            route.fulfill(status=200, body=data)
+        else:
+            route.continue_()
+
+    async def handle_async(self, route) -> None:
+        if self._route(route):
+            await route.abort()
+            return
+        data = None
+        if self.cache is not None and route.request.resource_type == "image":
+            # The cache reads SQLite and the disk, keep that off the event loop
+            data = await asyncio.to_thread(self._cached_body, route)
+        if data is not None:
+            await route.fulfill(status=200, body=data)
+        else:
+            await route.continue_()
+
+    def _account(self, request, sizes: dict[str, int]) -> None:
+        body = max(0, sizes.get("responseBodySize", 0))
+        headers = max(0, sizes.get("responseHeadersSize", 0))
+        self.requests[request.resource_type] += 1
+        self.bytes[request.resource_type] += body + headers
+
+    def on_request_finished(self, request) -> None:
+        try:
+            self._account(request, request.sizes())
+        except Exception:
+            pass
+
+    async def on_request_finished_async(self, request) -> None:
+        try:
+            self._account(request, await request.sizes())
+        except Exception:
+            pass
+
+    def attach(self, page) -> None:
+        page.route("**/*", self.handle)
+        page.on("requestfinished", self.on_request_finished)
+
+    async def attach_async(self, page) -> None:
+        await page.route("**/*", self.handle_async)
+        page.on("requestfinished", self.on_request_finished_async)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            "requests": dict(self.requests),
+            "bytes": dict(self.bytes),
+            "blocked": dict(self.blocked),
+            "cached": self.cached,
+        }
+
+    def report(self, label: str) -> None:
+        total = sum(self.bytes.values())
+        per_type = ", ".join(
+            f"{resource_type}: {size / 1024:.0f} KiB ({self.requests[resource_type]})"
+            for resource_type, size in sorted(
+                self.bytes.items(), key=lambda item: -item[1]
+            )
+        )
+        print(
+            f"Transferred {total / 1024:.0f} KiB for {label} [{per_type}], "
+            f"blocked {sum(self.blocked.values())} requests {dict(self.blocked)}"
+            + (f", served {self.cached} images from cache" if self.cached else "")
+        )
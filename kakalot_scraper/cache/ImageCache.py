@@ -0,0 +1,267 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import kakalot_scraper
+
+
+class SETTINGS:
+    ENABLED = True
+    DIRECTORY_NAME = ".image_cache"
+    MAX_SIZE_MB = 2048
+    SQLITE_TIMEOUT_SECONDS = 30
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_by_access ON blobs (last_access);
+"""
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of downloaded page images.
+
+    Image bodies are stored once under their SHA-256, and every URL that
+    served them points at that hash. When the cache grows past `max_size`
+    bytes the least recently used bodies are evicted.
+
+    Usage:
+        data = image_cache.get(src)
+        if data is None:
+            data = download(src)
+            image_cache.put(src, data)
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_size: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_size = 0
+
+    def _get_directory(self) -> str:
+        return self.directory or os.path.join(
+            kakalot_scraper.GLOBAL.SAVE_ROOT, SETTINGS.DIRECTORY_NAME
+        )
+
+    def _get_max_size(self) -> int:
+        if self.max_size is not None:
+            return self.max_size
+        return SETTINGS.MAX_SIZE_MB * 1024 * 1024
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = self._get_directory()
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(
+                os.path.join(directory, "index.db"),
+                timeout=SETTINGS.SQLITE_TIMEOUT_SECONDS,
+                check_same_thread=False,
+            )
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+            self._total_size = self._stored_size()
+        return self._conn
+
+    def _stored_size(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs")
+        return row.fetchone()[0]
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._get_directory(), digest[:2], digest)
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        Returns the cached body of `url`, or None on a miss.
+        """
+        if not SETTINGS.ENABLED:
+            return None
+
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT hash FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            digest = row[0]
+            try:
+                with open(self._blob_path(digest), "rb") as f:
+                    data = f.read()
+            except OSError:
+                # The body was removed behind our back, forget about it
+                self._forget(digest)
+                conn.commit()
+                self.misses += 1
+                return None
+
+            conn.execute(
+                "UPDATE blobs SET last_access = ? WHERE hash = ?",
+                (time.time(), digest),
+            )
+            conn.commit()
+            self.hits += 1
+            self.bytes_served += len(data)
+            return data
+
+    def contains(self, url: str) -> bool:
+        """
+        True when `url` is cached, without reading it or counting a hit.
+        """
+        if not SETTINGS.ENABLED:
+            return False
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT 1 FROM urls WHERE url = ?", (url,))
+                .fetchone()
+            )
+            return row is not None
+
+    def lookup(self, url: str) -> Optional[str]:
+        """
+        Returns the hash of the cached body of `url` without reading it.
+        """
+        if not SETTINGS.ENABLED:
+            return None
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT hash FROM urls WHERE url = ?", (url,))
+                .fetchone()
+            )
+            return row[0] if row else None
+
+    def has_blob(self, digest: str) -> bool:
+        return SETTINGS.ENABLED and os.path.exists(self._blob_path(digest))
+
+    def read(self, digest: str) -> Optional[bytes]:
+        """
+        Returns the body stored under `digest`, or None when it was evicted.
+        Reads by hash are not counted as hits.
+        """
+        if not SETTINGS.ENABLED:
+            return None
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE blobs SET last_access = ? WHERE hash = ?",
+                (time.time(), digest),
+            )
+            conn.commit()
+        return data
+
+    def put(self, url: str, data: bytes) -> Optional[str]:
+        """
+        Stores the body of `url` and returns its hash.
+        """
+        if not SETTINGS.ENABLED or not data:
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            conn = self._connect()
+            exists = conn.execute(
+                "SELECT 1 FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+            path = self._blob_path(digest)
+
+            if exists is None or not os.path.exists(path):
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    print(f"Could not cache {url}: {e}")
+                    return None
+                self.stores += 1
+
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (hash, size, last_access) VALUES (?, ?, ?)",
+                (digest, len(data), time.time()),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)",
+                (url, digest),
+            )
+            # Workers sharing the cache store and evict too, the write above
+            # holds the database lock so this total is current
+            self._total_size = self._stored_size()
+            if self._total_size > self._get_max_size():
+                self._evict()
+            conn.commit()
+        return digest
+
+    def _forget(self, digest: str) -> None:
+        conn = self._connect()
+        row = conn.execute("SELECT size FROM blobs WHERE hash = ?", (digest,))
+        size = row.fetchone()
+        if size is not None:
+            self._total_size -= size[0]
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        conn.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+
+    def _evict(self) -> None:
+        conn = self._connect()
+        # Leave some room so the next few stores do not evict again
+        target = self._get_max_size() * 0.9
+        rows = conn.execute(
+            "SELECT hash FROM blobs ORDER BY last_access ASC"
+        ).fetchall()
+        for (digest,) in rows:
+            if self._total_size <= target:
+                break
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+            self._forget(digest)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bytes_served": self.bytes_served,
+            "size": self._total_size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Shared by every fetch path so retries and re-runs reuse downloaded pages
+image_cache = ImageCache()
@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+from kakalot_scraper import GLOBAL
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.scrape.PageImage import PageImage
+
+
+class SETTINGS:
+    # Pillow releases the GIL while encoding, so threads scale across cores
+    WORKERS = min(4, os.cpu_count() or 1)
+    DEFAULT_JPEG_QUALITY = 75
+    DEFAULT_WEBP_QUALITY = 80
+    # 0 (fast) to 6 (small)
+    WEBP_METHOD = 4
+
+
+class EncodingProfile:
+    """
+    How the pages of a chapter are stored.
+
+    Args:
+        name (str): Name the profile is selected by.
+        format (str | None): PIL format to encode to, None stores downloaded
+            pages untouched and only encodes merged pages to JPEG.
+        quality (int | None): Encoder quality, the encoder default when None.
+        lossless (bool): Lossless WebP.
+        grayscale (bool): Convert pages to grayscale, for black and white manga.
+        keep_smaller (bool): Keep the downloaded bytes when re-encoding
+            would not make the page smaller. Off by default, a re-encoded
+            page is then always in the profile's format.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        format: Optional[str] = None,
+        quality: Optional[int] = None,
+        lossless: bool = False,
+        grayscale: bool = False,
+        keep_smaller: bool = False,
+    ):
+        self.name = name
+        self.format = format
+        self.quality = quality
+        self.lossless = lossless
+        self.grayscale = grayscale
+        self.keep_smaller = keep_smaller
+
+    @property
+    def passthrough(self) -> bool:
+        return self.format is None
+
+    def __repr__(self):
+        return f"EncodingProfile({self.name})"
+
+
+PROFILES = {
+    "original": EncodingProfile("original"),
+    "jpeg": EncodingProfile("jpeg", "JPEG", SETTINGS.DEFAULT_JPEG_QUALITY),
+    "webp": EncodingProfile(
+        "webp", "WEBP", SETTINGS.DEFAULT_WEBP_QUALITY, keep_smaller=True
+    ),
+    "webp-lossless": EncodingProfile(
+        "webp-lossless", "WEBP", lossless=True, keep_smaller=True
+    ),
+    "gray": EncodingProfile(
+        "gray", "JPEG", SETTINGS.DEFAULT_JPEG_QUALITY, grayscale=True
+    ),
+}
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+def get_profile(name: Optional[str] = None) -> EncodingProfile:
+    """
+    Looks up a profile by name, `jpeg`, `webp` and `gray` also take a
+    quality as in `webp:70`. Without a name GLOBAL.OUTPUT_PROFILE is used,
+    and when that is unset GLOBAL.PASSTHROUGH_IMAGES picks `original` or
+    `jpeg`.
+
+    Raises:
+        ValueError: If the name is not a known profile.
+    """
+    if name is None:
+        name = GLOBAL.OUTPUT_PROFILE or (
+            "original" if GLOBAL.PASSTHROUGH_IMAGES else "jpeg"
+        )
+    if name in PROFILES:
+        return PROFILES[name]
+
+    base, _, quality = name.partition(":")
+    if base in ("jpeg", "webp", "gray") and quality.isdigit():
+        profile = PROFILES[base]
+        return EncodingProfile(
+            name,
+            profile.format,
+            max(1, min(100, int(quality))),
+            grayscale=profile.grayscale,
+            keep_smaller=profile.keep_smaller,
+        )
+    raise ValueError(
+        f"Unknown output profile {name}, expected one of {', '.join(PROFILES)} "
+        "or jpeg:<quality>, webp:<quality>, gray:<quality>"
+    )
+
+
+def _encode_image(img: Image.Image, profile: EncodingProfile) -> tuple[str, bytes]:
+    img_format = profile.format or "JPEG"
+    if profile.grayscale:
+        img = img.convert("L")
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    options = {}
+    if img_format == "JPEG":
+        # No optimize, it makes the encoder hold the whole page in memory
+        if profile.quality is not None:
+            options["quality"] = profile.quality
+    elif img_format == "WEBP":
+        options["method"] = SETTINGS.WEBP_METHOD
+        if profile.lossless:
+            options["lossless"] = True
+        elif profile.quality is not None:
+            options["quality"] = profile.quality
+
+    img_data = BytesIO()
+    img.save(img_data, format=img_format, **options)
+    return EXTENSIONS[img_format], img_data.getvalue()
+
+
+def encode_page(
+    page: PageImage | Image.Image, profile: Optional[EncodingProfile] = None
+) -> tuple[str, bytes]:
+    """
+    Returns the file extension and bytes to store for a page.
+
+    Args:
+        page (PageImage | Image): The page to encode.
+        profile (EncodingProfile | None): Output profile, see get_profile.
+
+    Returns:
+        tuple[str, bytes]: File extension and encoded image data.
+    """
+    profile = profile or get_profile()
+    if isinstance(page, PageImage):
+        if profile.passthrough and page.has_original:
+            return page.extension, page.data
+        img = page.decode()
+    else:
+        img = page
+
+    extension, img_data = _encode_image(img, profile)
+    if (
+        profile.keep_smaller
+        and isinstance(page, PageImage)
+        and page.has_original
+        and len(img_data) >= len(page.data)
+    ):
+        return page.extension, page.data
+    return extension, img_data
+
+
+class EncodedPage:
+    def __init__(
+        self,
+        extension: str,
+        data: bytes,
+        original_size: Optional[int],
+        dimensions: tuple[int, int],
+    ):
+        self.extension = extension
+        self.data = data
+        self.original_size = original_size
+        self.dimensions = dimensions
+
+
+def _encode_job(
+    page: PageImage | Image.Image, profile: EncodingProfile, discard: bool
+) -> EncodedPage:
+    original_size = None
+    if isinstance(page, PageImage) and page.has_original:
+        original_size = len(page.data)
+    with metrics.timer("encode"):
+        extension, data = encode_page(page, profile)
+    if discard and isinstance(page, PageImage):
+        page.discard()
+    elif isinstance(page, PageImage):
+        page.release()
+    # Only the header is parsed
+    dimensions = Image.open(BytesIO(data)).size
+    return EncodedPage(extension, data, original_size, dimensions)
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def encoder_pool() -> ThreadPoolExecutor:
+    """
+    Thread pool shared by every chapter of the process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=SETTINGS.WORKERS, thread_name_prefix="encode"
+            )
+        return _pool
+
+
+def submit_encode(
+    page: PageImage | Image.Image, profile: EncodingProfile, discard: bool = False
+) -> Future:
+    """
+    Encodes a page on the shared pool, the future resolves to an EncodedPage.
+    """
+    return encoder_pool().submit(_encode_job, page, profile, discard)
+
+
+class EncodeReport:
+    """
+    Size and time totals of the pages of one chapter.
+    """
+
+    def __init__(self, profile: EncodingProfile):
+        self.profile = profile
+        self.pages = 0
+        self.original_bytes = 0
+        self.stored_bytes = 0
+        self.started = time.perf_counter()
+
+    def add(self, page: EncodedPage) -> None:
+        self.pages += 1
+        self.stored_bytes += len(page.data)
+        # Merged pages have no downloaded bytes to compare with
+        self.original_bytes += page.original_size or len(page.data)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.stored_bytes
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        percent = (
+            self.bytes_saved / self.original_bytes * 100 if self.original_bytes else 0
+        )
+        return (
+            f"Encoded {self.pages} pages with profile {self.profile.name} in "
+            f"{elapsed:.2f}s: {self.original_bytes / 1024:.0f} KB -> "
+            f"{self.stored_bytes / 1024:.0f} KB ({percent:.1f}% saved)"
+        )
+
+
+if __name__ == "__main__":
+    # Size and encode time of every profile on synthetic manga pages, with
+    # screentone noise and text-like strokes
+    import random
+    from PIL import ImageDraw, ImageFilter
+
+    PAGE_COUNT = 12
+    rng = random.Random(0)
+
+    def make_page() -> PageImage:
+        img = Image.effect_noise((800, 1200), 30).convert("RGB")
+        img = img.filter(ImageFilter.GaussianBlur(1))
+        draw = ImageDraw.Draw(img)
+        for _ in range(60):
+            x, y = rng.randrange(800), rng.randrange(1200)
+            draw.line((x, y, x + rng.randrange(200), y + rng.randrange(40)), 0, 3)
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=92)
+        return PageImage(buffer.getvalue(), "bench.jpg")
+
+    pages = [make_page() for _ in range(PAGE_COUNT)]
+    print(
+        f"{PAGE_COUNT} pages, {sum(len(p.data) for p in pages) / 1024:.0f} KB downloaded"
+    )
+
+    for name in ["original", "jpeg", "jpeg:85", "webp", "webp-lossless", "gray"]:
+        profile = get_profile(name)
+        for workers in (1, SETTINGS.WORKERS):
+            report = EncodeReport(profile)
+            with ThreadPoolExecutor(workers) as pool:
+                for encoded in pool.map(
+                    lambda page: _encode_job(page, profile, False), pages
+                ):
+                    report.add(encoded)
+            print(f"{workers} worker(s): {report.summary()}")
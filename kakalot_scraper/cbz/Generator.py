@@ -1,40 +1,27 @@
 from PIL import Image
 import zipfile
 import os
-from io import BytesIO
-
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional
+
+from kakalot_scraper.cbz.Encoding import (
+    EncodeReport,
+    EncodedPage,
+    EncodingProfile,
+    get_profile,
+    submit_encode,
+)
+from kakalot_scraper.cbz.Naming import generate_file_chapter_name, get_cbz_path
+from kakalot_scraper.library.Manifest import SeriesManifest, chapter_entry
 from kakalot_scraper.manager.Manager import *
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.scrape.PageImage import PageImage
 
 
-def generate_file_chapter_name(manga_info: MangaInfo, chapter_num: str) -> str:
-    """
-    Generates a file name for the manga chapter image.
-
-    Args:
-        manga_info (MangaInfo): The information about the manga.
-        chapter_num (str): The chapter number.
-
-    Returns:
-        str: The generated file name.
-    """
-    safe_title = manga_info.title.replace(" ", "_").replace("/", "-")
-    return f"chapter_{chapter_num}_{safe_title}.cbz"
-
-
-def decode_file_name(file_name: str) -> tuple[str, str]:
-    """
-    Decodes the manga title and chapter number from the file name.
-
-    Args:
-        file_name (str): The file name to decode.
-
-    Returns:
-        tuple[str, str]: A tuple containing the manga title and chapter number.
-    """
-    # Split the file name to extract the title and chapter number
-    base_name = file_name.replace(".cbz", "")
-    chapter, title = base_name.split("_", 2)[1:]
-    return title.replace("_", " ").replace("-", "/"), chapter
+class SETTINGS:
+    # Pages being encoded ahead of the zip writer
+    MAX_PENDING_PAGES = 16
 
 
 def format_chapter_number(chapter_num: str) -> str:
@@ -82,44 +69,194 @@ def generate_ComicInfo_xml(manga_info: MangaInfo, chapter_num: str) -> str:
     return xml_template
 
 
-def get_cbz_path(manga_info: MangaInfo, chapter_num: str, save_root: str) -> str:
-    manga_file_dir_name = manga_info.title
-
-    cbz_path = os.path.join(
-        save_root,
-        manga_file_dir_name,
-        generate_file_chapter_name(manga_info, chapter_num),
-    )
-    return cbz_path
-
-
-def generate_cbz(
-    manga_info: MangaInfo, chapter_num: str, images: list[Image.Image], save_root: str
-) -> None:
-
-    manga_file_dir_name = manga_info.title
+def validate_cbz(cbz_path: str, expected_pages: int) -> None:
+    """
+    Checks that a written CBZ is readable and holds every page.
 
-    if not os.path.exists(save_root):
-        os.makedirs(save_root)
+    Args:
+        cbz_path (str): Path of the CBZ to check.
+        expected_pages (int): Number of pages that were written.
 
-    if not os.path.exists(os.path.join(save_root, manga_file_dir_name)):
-        os.makedirs(os.path.join(save_root, manga_file_dir_name))
+    Raises:
+        ValueError: If the archive is corrupt or incomplete.
+    """
+    try:
+        with zipfile.ZipFile(cbz_path) as cbz:
+            bad_entry = cbz.testzip()
+            names = cbz.namelist()
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{cbz_path} is not a valid zip: {e}")
 
-    cbz_path = get_cbz_path(manga_info, chapter_num, save_root)
+    if bad_entry is not None:
+        raise ValueError(f"{cbz_path} has a corrupt entry {bad_entry}")
+    if "ComicInfo.xml" not in names or len(names) != expected_pages + 1:
+        raise ValueError(
+            f"{cbz_path} holds {len(names)} entries, expected {expected_pages + 1}"
+        )
 
-    pre_name = generate_file_chapter_name(manga_info, chapter_num)[:-4]
 
-    if os.path.exists(cbz_path):
-        print(f"CBZ already exists at: {cbz_path}, deleting existing file.")
-        os.remove(cbz_path)
+class CbzWriter:
+    """
+    Appends pages to a CBZ as soon as they are ready.
+
+    Pages go into `<cbz_path>.tmp`, `commit` adds ComicInfo.xml, validates
+    the archive and renames it into place, so a crash never leaves a
+    truncated CBZ that would be mistaken for a finished chapter. A writer
+    that is not committed is removed again by `abort`.
+
+    Pages are encoded with `profile` on the shared encoder pool, up to
+    `max_pending` at a time, and written in the order they were added. A
+    page can count as several, a stitched page holds the memory of all of
+    its slices until it is encoded. The
+    page count, size, page dimensions and checksum of a committed chapter
+    are recorded in the manifest of its series.
+
+    Usage:
+        with CbzWriter(manga_info, chapter_num, save_root) as writer:
+            for page in pages:
+                writer.add_page(page)
+            cbz_path = writer.commit()
+    """
 
-    with zipfile.ZipFile(cbz_path, "w") as cbz:
-        for i, img in enumerate(images):
-            img_data = BytesIO()
-            img.save(img_data, format="JPEG")
-            cbz.writestr(f"{pre_name}_page_{i + 1:04d}.jpg", img_data.getvalue())
+    def __init__(
+        self,
+        manga_info: MangaInfo,
+        chapter_num: str,
+        save_root: str,
+        profile: Optional[EncodingProfile] = None,
+        max_pending: int = SETTINGS.MAX_PENDING_PAGES,
+    ):
+        self.manga_info = manga_info
+        self.chapter_num = chapter_num
+        self.save_root = save_root
+        self.cbz_path = get_cbz_path(manga_info, chapter_num, save_root)
+        self.tmp_path = f"{self.cbz_path}.tmp"
+        self.profile = profile or get_profile()
+        self.max_pending = max(1, max_pending)
+        self.report = EncodeReport(self.profile)
+        self.page_count = 0
+        self.dimensions: list[tuple[int, int]] = []
+        self.pending_weight = 0
+        self._pending: deque[tuple[Future, int]] = deque()
+        self._pre_name = generate_file_chapter_name(manga_info, chapter_num)[:-4]
+        self._zip: Optional[zipfile.ZipFile] = None
+
+    def __enter__(self) -> "CbzWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.abort()
+
+    def _open(self) -> zipfile.ZipFile:
+        if self._zip is None:
+            # exist_ok, chapters of the same series may be written concurrently
+            os.makedirs(os.path.dirname(self.cbz_path), exist_ok=True)
+            self._zip = zipfile.ZipFile(self.tmp_path, "w")
+        return self._zip
+
+    def add_page(
+        self, page: PageImage | Image.Image, discard: bool = False, weight: int = 1
+    ) -> None:
+        """
+        Queues a page for encoding, `discard` drops its data once encoded.
+        `weight` is how many pages it counts as against `max_pending`.
+        """
+        self.drain(max(0, self.max_pending - weight))
+        self._pending.append((submit_encode(page, self.profile, discard), weight))
+        self.pending_weight += weight
+
+    def drain(self, limit: int) -> None:
+        """
+        Writes queued pages until at most `limit` are left pending.
+        """
+        while self._pending and self.pending_weight > limit:
+            self._write_next()
+
+    def _write_next(self) -> None:
+        future, weight = self._pending.popleft()
+        self.pending_weight -= weight
+        encoded: EncodedPage = future.result()
+        self.page_count += 1
+        with metrics.timer("zip_write"):
+            # Images do not compress any further, store them as they are
+            self._open().writestr(
+                f"{self._pre_name}_page_{self.page_count:04d}.{encoded.extension}",
+                encoded.data,
+                compress_type=zipfile.ZIP_STORED,
+            )
+        self.report.add(encoded)
+        self.dimensions.append(encoded.dimensions)
+        metrics.inc("pages")
+        metrics.inc("bytes_written", len(encoded.data))
+
+    def flush(self) -> None:
+        """
+        Waits for every queued page and writes it.
+        """
+        self.drain(0)
+
+    def commit(self) -> str:
+        self.flush()
+        with metrics.timer("zip_write"):
+            cbz = self._open()
+            cbz.writestr(
+                "ComicInfo.xml",
+                generate_ComicInfo_xml(self.manga_info, self.chapter_num),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            cbz.close()
+        self._zip = None
+
+        if os.path.exists(self.cbz_path):
+            print(f"CBZ already exists at: {self.cbz_path}, replacing existing file.")
+        report = self.report
+        try:
+            validate_cbz(self.tmp_path, self.page_count)
+            entry = chapter_entry(
+                self.tmp_path,
+                self.page_count,
+                self.dimensions,
+                os.path.basename(self.cbz_path),
+            )
+            os.replace(self.tmp_path, self.cbz_path)
+        finally:
+            self.abort()
+        SeriesManifest(os.path.dirname(self.cbz_path)).update({self.chapter_num: entry})
+
+        metrics.inc("chapters")
+        metrics.inc("bytes_saved", report.bytes_saved)
+        print(report.summary())
+        print(f"CBZ created at: {self.cbz_path}")
+        return self.cbz_path
+
+    def abort(self) -> None:
+        """
+        Drops everything written so far.
+        """
+        while self._pending:
+            future, _ = self._pending.popleft()
+            if not future.cancel():
+                future.exception()
+        self.pending_weight = 0
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.page_count = 0
+        self.dimensions = []
+        self.report = EncodeReport(self.profile)
 
-        comicinfo_xml = generate_ComicInfo_xml(manga_info, chapter_num)
-        cbz.writestr("ComicInfo.xml", comicinfo_xml)
 
-    print(f"CBZ created at: {cbz_path}")
+def generate_cbz(
+    manga_info: MangaInfo,
+    chapter_num: str,
+    images: list[PageImage | Image.Image],
+    save_root: str,
+    profile: Optional[EncodingProfile] = None,
+) -> str:
+
+    with CbzWriter(manga_info, chapter_num, save_root, profile) as writer:
+        for img in images:
+            writer.add_page(img)
+        return writer.commit()
@@ -0,0 +1,50 @@
+import os
+
+from kakalot_scraper.manager.Manager import MangaInfo
+
+
+def generate_file_chapter_name(manga_info: MangaInfo, chapter_num: str) -> str:
+    """
+    Generates a file name for the manga chapter image.
+
+    Args:
+        manga_info (MangaInfo): The information about the manga.
+        chapter_num (str): The chapter number.
+
+    Returns:
+        str: The generated file name.
+    """
+    safe_title = manga_info.title.replace(" ", "_").replace("/", "-")
+    return f"chapter_{chapter_num}_{safe_title}.cbz"
+
+
+def decode_file_name(file_name: str) -> tuple[str, str]:
+    """
+    Decodes the manga title and chapter number from the file name.
+
+    Args:
+        file_name (str): The file name to decode.
+
+    Returns:
+        tuple[str, str]: A tuple containing the manga title and chapter number.
+    """
+    # Split the file name to extract the title and chapter number
+    base_name = file_name.replace(".cbz", "")
+    parts = base_name.split("_")
+    # chapter_rename formats numeric chapters as "NNNN_N", keep both parts
+    if len(parts) >= 4 and parts[1].isdigit() and parts[2].isdigit():
+        chapter, title = "_".join(parts[1:3]), "_".join(parts[3:])
+    else:
+        chapter, title = base_name.split("_", 2)[1:]
+    return title.replace("_", " ").replace("-", "/"), chapter
+
+
+def get_cbz_path(manga_info: MangaInfo, chapter_num: str, save_root: str) -> str:
+    manga_file_dir_name = manga_info.title
+
+    cbz_path = os.path.join(
+        save_root,
+        manga_file_dir_name,
+        generate_file_chapter_name(manga_info, chapter_num),
+    )
+    return cbz_path
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import kakalot_scraper
+from kakalot_scraper.cache.ImageCache import image_cache
+
+
+class SETTINGS:
+    DIRECTORY_NAME = ".staging"
+    MANIFEST_FILE_NAME = "manifest.json"
+    # Temp files untouched for this long belong to a run that died
+    STALE_TEMP_SECONDS = 3600
+    STALE_STAGING_DAYS = 7
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Writes `data` to a temp file next to `path` and renames it into place.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ChapterStaging:
+    """
+    Checkpoints the downloaded pages of a chapter until its CBZ is written.
+
+    The manifest keeps the ordered image URLs of the chapter and the image
+    cache hash of every downloaded body, so an interrupted chapter can be
+    finished without loading the chapter page again. The bodies themselves
+    stay in the image cache, only when it is disabled are they saved in the
+    staging area under the hash of their URL. A page evicted from the cache
+    in the meantime is downloaded again.
+
+    Usage:
+        staging = ChapterStaging(chapter_url)
+        staging.set_sources(sources)
+        staging.save_page(src, data)
+        ...
+        staging.clear()
+    """
+
+    def __init__(self, chapter_url: str, save_root: Optional[str] = None):
+        save_root = save_root or kakalot_scraper.GLOBAL.SAVE_ROOT
+        parts = [part for part in urlparse(chapter_url).path.split("/") if part]
+        name = "_".join(parts[-2:]) or hashlib.sha1(chapter_url.encode()).hexdigest()
+        self.chapter_url = chapter_url
+        self.directory = os.path.join(save_root, SETTINGS.DIRECTORY_NAME, name)
+        self.sources: list[str] = []
+        self.pages: dict[str, str] = {}
+        self._load()
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, SETTINGS.MANIFEST_FILE_NAME)
+
+    def _page_path(self, src: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(src.encode()).hexdigest())
+
+    def _load(self) -> None:
+        try:
+            with open(self._manifest_path(), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("url") == self.chapter_url:
+            self.sources = list(manifest.get("sources", []))
+            self.pages = dict(manifest.get("pages", {}))
+
+    def _write_manifest(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {
+            "url": self.chapter_url,
+            "sources": self.sources,
+            "pages": self.pages,
+        }
+        write_atomic(self._manifest_path(), json.dumps(manifest).encode("utf-8"))
+
+    def set_sources(self, sources: list[str]) -> None:
+        """
+        Records the ordered image URLs of the chapter. An empty list, a
+        reload that found no images, keeps the checkpoint as it is.
+        """
+        if not sources or sources == self.sources:
+            return
+        if self.sources:
+            # The chapter changed on the site, the staged pages are stale
+            self.clear()
+        self.sources = list(sources)
+        self._write_manifest()
+
+    def has_page(self, src: str) -> bool:
+        digest = self.pages.get(src)
+        if digest is not None and image_cache.has_blob(digest):
+            return True
+        return os.path.exists(self._page_path(src))
+
+    def load_page(self, src: str) -> Optional[bytes]:
+        digest = self.pages.get(src)
+        if digest is not None:
+            data = image_cache.read(digest)
+            if data is not None:
+                return data
+        try:
+            with open(self._page_path(src), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save_page(self, src: str, data: bytes) -> None:
+        if not data:
+            return
+        try:
+            # Downloads are cached already, only their hash is recorded
+            digest = image_cache.lookup(src) or image_cache.put(src, data)
+            if digest is not None:
+                self.pages[src] = digest
+                self._write_manifest()
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self._page_path(src), data)
+        except OSError as e:
+            print(f"Could not checkpoint {src}: {e}")
+
+    def staged_count(self) -> int:
+        return sum(1 for src in self.sources if self.has_page(src))
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.sources = []
+        self.pages = {}
+
+
+def sweep_stale_files(save_root: Optional[str] = None) -> dict[str, int]:
+    """
+    Removes temp files left behind by runs that died mid-write, and staging
+    areas of chapters that were never finished.
+
+    Args:
+        save_root (str | None): Library root, defaults to GLOBAL.SAVE_ROOT.
+
+    Returns:
+        dict[str, int]: Number of temp files and staging areas removed.
+    """
+    save_root = save_root or kakalot_scraper.GLOBAL.SAVE_ROOT
+    now = time.time()
+    removed = {"temp_files": 0, "staging": 0}
+    if not os.path.isdir(save_root):
+        return removed
+
+    for directory, _, files in os.walk(save_root):
+        for file_name in files:
+            if not file_name.endswith(".tmp"):
+                continue
+            path = os.path.join(directory, file_name)
+            try:
+                # Another worker may still be writing a recent one
+                if now - os.path.getmtime(path) < SETTINGS.STALE_TEMP_SECONDS:
+                    continue
+                os.remove(path)
+                removed["temp_files"] += 1
+            except OSError:
+                pass
+
+    staging_root = os.path.join(save_root, SETTINGS.DIRECTORY_NAME)
+    if os.path.isdir(staging_root):
+        max_age = SETTINGS.STALE_STAGING_DAYS * 86400
+        for entry in os.scandir(staging_root):
+            try:
+                if entry.is_dir() and now - entry.stat().st_mtime > max_age:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed["staging"] += 1
+            except OSError:
+                pass
+
+    if any(removed.values()):
+        print(
+            f"Removed {removed['temp_files']} stale temp files and "
+            f"{removed['staging']} abandoned staging areas."
+        )
+    return removed
@@ -0,0 +1,230 @@
+from typing import Optional
+
+from kakalot_scraper import GLOBAL
+from kakalot_scraper.cbz.Generator import CbzWriter
+from kakalot_scraper.dedupe.Dedupe import ChapterDedupe
+from kakalot_scraper.scrape.PageImage import PageImage
+from kakalot_scraper.scrape.Scraper import PageCollector
+from kakalot_scraper.scrape.Scraper import SETTINGS as SCRAPER_SETTINGS
+from kakalot_scraper.scrape.Stitcher import SliceStitcher
+
+
+class SETTINGS:
+    # Slices held in memory while a page is being stitched or encoded
+    MAX_IN_FLIGHT_PAGES = 16
+
+
+class ChapterStream(PageCollector):
+    """
+    Streams the pages of a chapter straight into an open CBZ.
+
+    Slices are stitched as they arrive and each finished page is written
+    and dropped right away, so memory is bounded by `max_in_flight` pages
+    instead of the whole chapter. The budget covers the slices held by the
+    stitcher and the pages queued in the writer, a stitched page counts as
+    its slices. `finish` returns the written pages with
+    their data discarded, `commit` moves the CBZ into place. Pages that
+    `dedupe` rejects are dropped before they are written. Like
+    `ChapterDedupe.filter`, a chapter of nothing but recurring pages keeps
+    them all, so the rejected pages are held until a page is kept. Once
+    they fill the `max_in_flight` budget the chapter keeps every page.
+
+    Usage:
+        stream = ChapterStream(CbzWriter(manga_info, chapter_num, save_root))
+        if load_chapter_images(chapter_url, sink=stream):
+            cbz_path = stream.commit()
+        else:
+            stream.abort()
+    """
+
+    def __init__(
+        self,
+        writer: CbzWriter,
+        max_in_flight: int = SETTINGS.MAX_IN_FLIGHT_PAGES,
+        dedupe: Optional[ChapterDedupe] = None,
+    ):
+        super().__init__()
+        self.writer = writer
+        self.dedupe = dedupe
+        self.max_in_flight = max(1, max_in_flight)
+        self.writer.max_pending = self.max_in_flight
+        self.pages: list[PageImage] = []
+        self._keep_all = True
+        self._stitcher: Optional[SliceStitcher] = None
+        # Recurring pages seen before any page was kept
+        self._held: list[tuple[PageImage, str, int]] = []
+        self._held_weight = 0
+        self._dedupe_off = False
+
+    def begin(self, manga_name: str, sources: list[str]) -> None:
+        super().begin(manga_name, sources)
+        self.writer.abort()
+        self.pages = []
+        if self.dedupe is not None:
+            self.dedupe.reset()
+        self._drop_held()
+        self._dedupe_off = False
+        # finalize_images drops pages from other hosts unless none match,
+        # the sources are known up front so decide that now
+        self._keep_all = not any(manga_name in src for src in sources)
+        self._stitcher = None
+        if GLOBAL.TRY_MERGING_SMALLER_IMAGES:
+            self._stitcher = SliceStitcher(
+                self._write,
+                SCRAPER_SETTINGS.MINIMUM_IMAGE_HEIGHT,
+                # The slice that ends a run is held along with it
+                max_pages=max(1, self.max_in_flight - 1),
+            )
+
+    def add(self, image: PageImage, src: str) -> None:
+        if self._stitcher is not None:
+            self.writer.drain(
+                self.max_in_flight - self._stitcher.held - self._held_weight - 1
+            )
+            self._stitcher.add(image, src)
+        else:
+            self._write(image, src)
+
+    def _write(self, page: PageImage, src: str, slice_count: int = 1) -> None:
+        if not self._keep_all and self.manga_name not in src:
+            return
+        if (
+            self.dedupe is not None
+            and not self._dedupe_off
+            and not self.dedupe.keep(page)
+        ):
+            if self.pages:
+                page.discard()
+                return
+            self._held.append((page, src, slice_count))
+            self._held_weight += slice_count
+            if self._held_weight >= self.max_in_flight:
+                print(
+                    f"The first {len(self._held)} pages all recur in other "
+                    "chapters, keeping every page of the chapter."
+                )
+                self._write_held()
+            return
+        self._drop_held()
+        self._add(page, slice_count)
+
+    def _add(self, page: PageImage, slice_count: int) -> None:
+        # Encoded on the writer's pool, the page data is dropped after that
+        self.writer.add_page(page, discard=True, weight=slice_count)
+        self.pages.append(page)
+
+    def _write_held(self) -> None:
+        """
+        Writes the held recurring pages and stops deduplicating the chapter.
+        """
+        self._dedupe_off = True
+        self.dedupe.dropped = 0
+        held, self._held, self._held_weight = self._held, [], 0
+        for page, _, slice_count in held:
+            self._add(page, slice_count)
+
+    def _drop_held(self) -> None:
+        for page, _, _ in self._held:
+            page.discard()
+        self._held = []
+        self._held_weight = 0
+
+    def finish(self) -> list[PageImage]:
+        if self._stitcher is not None:
+            self._stitcher.flush()
+            print(f"Merged {self._stitcher.merge_count} images due to small sizes.")
+        if self._held:
+            # Nothing but recurring pages, most likely not what it looks like
+            self._write_held()
+        print(f"Streamed {len(self.pages)} pages into {self.writer.tmp_path}")
+        return self.pages
+
+    def commit(self) -> str:
+        return self.writer.commit()
+
+    def abort(self) -> None:
+        self.writer.abort()
+        self._drop_held()
+        self.pages = []
+
+
+def _measure(mode: str, directory: str) -> dict[str, float]:
+    """
+    Builds a chapter from the images in `directory` and returns the peak
+    RSS of the process, run in a fresh process per mode.
+    """
+    import os
+    import resource
+    from kakalot_scraper.cbz.Generator import generate_cbz
+    from kakalot_scraper.manager.Manager import MangaInfo
+    from kakalot_scraper.scrape.Scraper import check_image
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    manga_info = MangaInfo(
+        "Benchmark", "", "Ongoing", "", "", [], "", "https://example.com/manga/bench"
+    )
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".jpg"))
+    sink = PageCollector()
+    if mode == "stream":
+        sink = ChapterStream(CbzWriter(manga_info, "0001_0", directory))
+    sink.begin("bench", files)
+
+    for file_name in files:
+        with open(os.path.join(directory, file_name), "rb") as f:
+            image = check_image(file_name, f.read())
+        if image is not None:
+            sink.add(image, file_name)
+    pages = sink.finish()
+
+    if mode == "stream":
+        sink.commit()
+    else:
+        generate_cbz(manga_info, "0001_0", pages, directory)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "pages": len(pages),
+        "peak_mb": peak / 1024,
+        "delta_mb": (peak - baseline) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    # Peak RSS of collecting a 200 slice webtoon chapter in memory and then
+    # zipping it, against streaming it into the CBZ
+    import multiprocessing
+    import os
+    import random
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from PIL import Image
+
+    PAGE_COUNT = 200
+    PAGE_WIDTH = 800
+    PAGE_HEIGHT = 280
+
+    directory = tempfile.mkdtemp(prefix="stream-bench-")
+    rng = random.Random(0)
+    for i in range(PAGE_COUNT):
+        noise = Image.frombytes(
+            "RGB",
+            (PAGE_WIDTH // 4, PAGE_HEIGHT // 4),
+            rng.randbytes(PAGE_WIDTH * PAGE_HEIGHT * 3 // 16),
+        ).resize((PAGE_WIDTH, PAGE_HEIGHT))
+        noise.save(os.path.join(directory, f"{i:04d}.jpg"), quality=85)
+    size = sum(
+        os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)
+    )
+    print(
+        f"{PAGE_COUNT} pages of {PAGE_WIDTH}x{PAGE_HEIGHT}, {size / 1024 / 1024:.1f} MB"
+    )
+
+    for mode in ["collect", "stream"]:
+        with ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            result = pool.submit(_measure, mode, directory).result()
+        print(
+            f"{mode}: {result['pages']} pages, peak RSS {result['peak_mb']:.0f} MB "
+            f"(+{result['delta_mb']:.0f} MB over the baseline)"
+        )
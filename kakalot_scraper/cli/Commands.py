@@ -0,0 +1,234 @@
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, Optional
+
+import kakalot_scraper
+from kakalot_scraper.library.Library import LibraryIndex
+from kakalot_scraper.library.Library import SETTINGS as LIBRARY_SETTINGS
+from kakalot_scraper.manager.Manager import get_manga_name
+from kakalot_scraper.metrics.Metrics import SETTINGS as METRICS_SETTINGS
+from kakalot_scraper.scheduler.Scheduler import SETTINGS as SCHEDULER_SETTINGS
+from kakalot_scraper.scheduler.Scheduler import SeriesScheduler
+from kakalot_scraper.utils.Utils import load_urls_from_file
+
+
+class SETTINGS:
+    # Commands that only read the configuration and the library on disk.
+    # Nothing here may import the browser stack, Pillow or watchdog, see
+    # `python -m kakalot_scraper.benchmark.ImportTime`
+    NAMES = ("list", "status", "plan")
+
+
+def _slug(url: str) -> str:
+    try:
+        return get_manga_name(url)
+    except IndexError:
+        return url
+
+
+def _library() -> dict[str, dict[str, Any]]:
+    """
+    Series of the library index by slug, empty when there is no index yet.
+    """
+    path = os.path.join(
+        kakalot_scraper.GLOBAL.SAVE_ROOT, LIBRARY_SETTINGS.INDEX_FILE_NAME
+    )
+    # Opening the index would create it
+    if not os.path.exists(path):
+        return {}
+    with LibraryIndex(path) as index:
+        return {series["slug"]: series for series in index.overview()}
+
+
+def _schedule() -> dict[str, float]:
+    """
+    Next check time of every scheduled series by URL.
+    """
+    scheduler = SeriesScheduler()
+    return {url: entry.next_check for url, entry in scheduler.series.items()}
+
+
+def _age(seconds: Optional[float]) -> str:
+    """
+    "5m ago" for a past time, "in 5m" for a future one.
+    """
+    if seconds is None:
+        return "-"
+    future = seconds < 0
+    seconds = abs(seconds)
+    if seconds < 120:
+        text = f"{seconds:.0f}s"
+    elif seconds < 2 * 3600:
+        text = f"{seconds / 60:.0f}m"
+    elif seconds < 2 * 86400:
+        text = f"{seconds / 3600:.1f}h"
+    else:
+        text = f"{seconds / 86400:.1f}d"
+    return f"in {text}" if future else f"{text} ago"
+
+
+def _print_table(rows: list[dict[str, Any]], columns: list[str]) -> None:
+    if not rows:
+        print("Nothing to show.")
+        return
+    cells = [[str(row[column]) for column in columns] for row in rows]
+    widths = [
+        max(len(column), *(len(line[i]) for line in cells))
+        for i, column in enumerate(columns)
+    ]
+    print("  ".join(column.upper().ljust(w) for column, w in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(w) for cell, w in zip(line, widths)))
+
+
+def _series_row(
+    slug: str, series: dict[str, Any], configured: bool, now: float
+) -> dict[str, Any]:
+    checked_at = series.get("checked_at")
+    return {
+        "slug": slug,
+        "title": series.get("title") or "-",
+        "status": series.get("status") or "-",
+        "chapters": series.get("stored", 0),
+        "on_site": series.get("chapter_count") or "-",
+        "size_mb": round(series.get("stored_size", 0) / 1024**2, 1),
+        "checked": _age(now - checked_at if checked_at else None),
+        "configured": configured,
+    }
+
+
+def list_series() -> list[dict[str, Any]]:
+    """
+    Configured series with what the library holds of them. Series in the
+    library that are no longer configured come last.
+    """
+    now = time.time()
+    urls = load_urls_from_file(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
+    library = _library()
+    rows = [
+        _series_row(_slug(url), library.pop(_slug(url), {}), True, now) for url in urls
+    ]
+    rows += [_series_row(slug, series, False, now) for slug, series in library.items()]
+    return rows
+
+
+def service_status() -> dict[str, Any]:
+    """
+    Health of the scraper: heartbeat, progress of the running scrape, the
+    schedule and library totals.
+    """
+    now = time.time()
+    status: dict[str, Any] = {"heartbeat_age_seconds": None, "busy": False}
+
+    if os.path.exists(SCHEDULER_SETTINGS.HEARTBEAT_PATH):
+        status["heartbeat_age_seconds"] = round(
+            now - os.path.getmtime(SCHEDULER_SETTINGS.HEARTBEAT_PATH)
+        )
+
+    if os.path.exists(METRICS_SETTINGS.STATS_FILE_PATH):
+        try:
+            with open(METRICS_SETTINGS.STATS_FILE_PATH, "r") as f:
+                stats = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read {METRICS_SETTINGS.STATS_FILE_PATH}: {e}")
+            stats = {}
+        busy_since = stats.get("busy_since")
+        last_progress = stats.get("last_progress")
+        status["busy"] = busy_since is not None
+        status["busy_seconds"] = round(now - busy_since) if busy_since else None
+        status["last_progress_seconds"] = (
+            round(now - last_progress) if last_progress else None
+        )
+        status["stats_age_seconds"] = (
+            round(now - stats["time"]) if stats.get("time") else None
+        )
+        counters = stats.get("counters", {})
+        status["chapters_this_run"] = int(counters.get("chapters", 0))
+        status["pages_this_run"] = int(counters.get("pages", 0))
+
+    schedule = _schedule()
+    status["scheduled_series"] = len(schedule)
+    status["due_series"] = sum(1 for when in schedule.values() if when <= now)
+    status["next_check_in_seconds"] = (
+        max(0, round(min(schedule.values()) - now)) if schedule else None
+    )
+
+    library = _library()
+    status["library_series"] = len(library)
+    status["library_chapters"] = sum(s["stored"] for s in library.values())
+    status["library_size_mb"] = round(
+        sum(s["stored_size"] for s in library.values()) / 1024**2, 1
+    )
+    return status
+
+
+def plan_checks() -> list[dict[str, Any]]:
+    """
+    Configured series in the order they are checked next. Series that are
+    not scheduled yet are due right away. `behind` is how many chapters the
+    site had at the last check that are not in the library.
+    """
+    now = time.time()
+    urls = load_urls_from_file(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
+    library = _library()
+    schedule = _schedule()
+    rows = []
+    for url in urls:
+        series = library.get(_slug(url)) or {}
+        next_check = schedule.get(url, now)
+        on_site = series.get("chapter_count")
+        rows.append(
+            {
+                "slug": _slug(url),
+                "title": series.get("title") or "-",
+                "due": "now" if next_check <= now else _age(now - next_check),
+                "next_check": round(next_check),
+                "behind": (
+                    max(0, on_site - series.get("stored", 0))
+                    if on_site is not None
+                    else "-"
+                ),
+                "new": url not in schedule,
+            }
+        )
+    rows.sort(key=lambda row: row["next_check"])
+    return rows
+
+
+def run_command(name: str, as_json: bool = False) -> int:
+    """
+    Runs a subcommand and prints its result as a table or as JSON.
+
+    Returns:
+        int: The exit code.
+    """
+    # Warnings go to stderr so the JSON stays parseable
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        if name == "list":
+            result: Any = list_series()
+        elif name == "status":
+            result = service_status()
+        elif name == "plan":
+            result = plan_checks()
+        else:
+            raise ValueError(f"Unknown command {name}")
+
+    if as_json:
+        print(json.dumps(result, indent=2))
+    elif name == "list":
+        _print_table(
+            result,
+            ["slug", "title", "status", "chapters", "on_site", "size_mb", "checked"],
+        )
+        missing = [row["slug"] for row in result if not row["configured"]]
+        if missing:
+            print(f"In the library but not configured: {', '.join(missing)}")
+    elif name == "status":
+        for key, value in result.items():
+            print(f"{key}: {'-' if value is None else value}")
+    else:
+        _print_table(result, ["slug", "title", "due", "behind"])
+    return 0
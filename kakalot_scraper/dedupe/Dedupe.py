@@ -0,0 +1,334 @@
+import json
+import os
+import sqlite3
+import threading
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+import kakalot_scraper
+from kakalot_scraper.cbz.Encoding import encode_page
+from kakalot_scraper.cbz.Generator import get_cbz_path
+from kakalot_scraper.cbz.Staging import write_atomic
+from kakalot_scraper.manager.Manager import MangaInfo, get_manga_name
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.scrape.PageImage import PageImage
+
+
+class SETTINGS:
+    INDEX_FILE_NAME = ".page_hashes.db"
+    # {"default": "keep", "series": {"<slug>": "drop"}}
+    POLICY_FILE_PATH = "./dedupe.json"
+    # "keep" stores every page, "drop" leaves recurring pages out of new
+    # chapters, "store_once" also saves one copy of them next to the chapters
+    POLICIES = ("keep", "drop", "store_once")
+    DEFAULT_POLICY = "keep"
+    RECURRING_DIRECTORY_NAME = "Recurring Pages"
+    # Differing bits up to which two 64 bit hashes are the same page
+    MAX_DISTANCE = 6
+    # A page seen in this many other chapters is recurring, a page shared
+    # with a single other chapter is more likely a recap or a cover
+    MIN_OTHER_CHAPTERS = 2
+    # Near uniform pages (blank, black) hash to almost no set bits and
+    # cannot be told apart, they are never treated as recurring
+    MIN_HASH_BITS = 8
+    SQLITE_TIMEOUT_SECONDS = 30
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_hashes (
+    series TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    hash INTEGER NOT NULL,
+    PRIMARY KEY (series, chapter, hash)
+);
+"""
+
+
+def page_hash(page: PageImage) -> int:
+    """
+    64 bit difference hash of a page.
+
+    JPEGs are decoded at a reduced scale, which is all the hash needs, and
+    the pixels are not kept on the page.
+    """
+    if page.has_original:
+        image = Image.open(BytesIO(page.data))
+        image.draft("L", (64, 64))
+    else:
+        image = page.decode()
+
+    pixels = image.convert("L").resize((9, 8), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    # SQLite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _distance(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def _is_informative(value: int) -> bool:
+    bits = (value & 0xFFFFFFFFFFFFFFFF).bit_count()
+    return SETTINGS.MIN_HASH_BITS <= bits <= 64 - SETTINGS.MIN_HASH_BITS
+
+
+def _bands(value: int) -> list[tuple[int, int]]:
+    """
+    Splits a hash into MAX_DISTANCE + 1 bands, two hashes within
+    MAX_DISTANCE bits of each other match exactly in at least one of them.
+    """
+    value &= 0xFFFFFFFFFFFFFFFF
+    count = SETTINGS.MAX_DISTANCE + 1
+    bands = []
+    for band in range(count):
+        start = band * 64 // count
+        end = (band + 1) * 64 // count
+        bands.append((band, (value >> start) & ((1 << (end - start)) - 1)))
+    return bands
+
+
+class SeriesHashes:
+    """
+    Page hashes of one series, indexed by band so a lookup only compares
+    against the hashes that share a band with it.
+    """
+
+    def __init__(self):
+        self.chapters: dict[int, set[str]] = {}
+        self._bands: dict[tuple[int, int], set[int]] = {}
+
+    def add(self, value: int, chapter: str) -> None:
+        if value not in self.chapters:
+            self.chapters[value] = set()
+            for band in _bands(value):
+                self._bands.setdefault(band, set()).add(value)
+        self.chapters[value].add(chapter)
+
+    def near(self, value: int) -> set[str]:
+        """
+        Chapters holding a hash within MAX_DISTANCE bits of `value`.
+        """
+        candidates = set()
+        for band in _bands(value):
+            candidates |= self._bands.get(band, set())
+        chapters = set()
+        for other in candidates:
+            if _distance(value, other) <= SETTINGS.MAX_DISTANCE:
+                chapters |= self.chapters[other]
+        return chapters
+
+
+class ChapterDedupe:
+    """
+    Filters the pages of one chapter against the pages of the other
+    chapters of its series. Created by PageHashIndex.for_chapter.
+
+    Usage:
+        dedupe = page_hashes.for_chapter(manga_info, chapter_num, save_root)
+        pages = dedupe.filter(pages)
+        dedupe.commit()
+    """
+
+    def __init__(
+        self,
+        index: "PageHashIndex",
+        series: str,
+        chapter: str,
+        policy: str,
+        recurring_directory: str,
+    ):
+        self.index = index
+        self.series = series
+        self.chapter = chapter
+        self.policy = policy
+        self.recurring_directory = recurring_directory
+        self.dropped = 0
+        self._hashes: set[int] = set()
+
+    def reset(self) -> None:
+        """
+        Forgets the pages seen so far, for a chapter that is scraped again.
+        """
+        self.dropped = 0
+        self._hashes = set()
+
+    def keep(self, page: PageImage) -> bool:
+        """
+        Returns False for a page that recurs in other chapters.
+        """
+        try:
+            value = page_hash(page)
+        except Exception as e:
+            print(f"Could not hash {page.src}: {e}")
+            return True
+        if not _is_informative(value):
+            return True
+
+        self._hashes.add(value)
+        others = self.index.chapters_with(self.series, value) - {self.chapter}
+        if len(others) < SETTINGS.MIN_OTHER_CHAPTERS:
+            return True
+
+        if self.policy == "store_once":
+            self._store(page, value)
+        self.dropped += 1
+        metrics.inc("pages_deduplicated")
+        if page.has_original:
+            metrics.inc("bytes_deduplicated", len(page.data))
+        return False
+
+    def filter(self, pages: list[PageImage]) -> list[PageImage]:
+        kept = [page for page in pages if self.keep(page)]
+        if not kept:
+            # Nothing but recurring pages, most likely not what it looks like
+            self.dropped = 0
+            return pages
+        if self.dropped:
+            print(
+                f"Left out {self.dropped} pages that recur in other chapters "
+                f"({self.policy})."
+            )
+        return kept
+
+    def _store(self, page: PageImage, value: int) -> None:
+        name = f"{value & 0xFFFFFFFFFFFFFFFF:016x}"
+        directory = self.recurring_directory
+        if os.path.isdir(directory) and any(
+            file_name.startswith(name) for file_name in os.listdir(directory)
+        ):
+            return
+        try:
+            extension, data = encode_page(page)
+            os.makedirs(directory, exist_ok=True)
+            write_atomic(os.path.join(directory, f"{name}.{extension}"), data)
+        except OSError as e:
+            print(f"Could not store recurring page {page.src}: {e}")
+
+    def commit(self) -> None:
+        """
+        Records the pages of the chapter, call once it was scraped.
+        """
+        self.index.record(self.series, self.chapter, self._hashes)
+
+
+class PageHashIndex:
+    """
+    Persistent perceptual hashes of the pages of every series.
+
+    A page whose hash is within `MAX_DISTANCE` bits of a page of another
+    chapter of the same series recurs, like credit or recruitment pages.
+    What happens to recurring pages is decided per series by the policy
+    file. The hashes of a series are loaded once and indexed by band, after
+    that every page is only compared against the hashes sharing a band.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.default_policy: Optional[str] = None
+        self._series: dict[str, SeriesHashes] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            path = self.path or os.path.join(
+                kakalot_scraper.GLOBAL.SAVE_ROOT, SETTINGS.INDEX_FILE_NAME
+            )
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(
+                path,
+                timeout=SETTINGS.SQLITE_TIMEOUT_SECONDS,
+                check_same_thread=False,
+            )
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def policy(self, series: str) -> str:
+        """
+        The policy of a series, from the policy file or the default.
+        """
+        policies = {}
+        if os.path.exists(SETTINGS.POLICY_FILE_PATH):
+            try:
+                with open(SETTINGS.POLICY_FILE_PATH, "r") as f:
+                    policies = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read {SETTINGS.POLICY_FILE_PATH}: {e}")
+
+        policy = policies.get("series", {}).get(series) or (
+            self.default_policy or policies.get("default") or SETTINGS.DEFAULT_POLICY
+        )
+        if policy not in SETTINGS.POLICIES:
+            print(f"Unknown dedupe policy {policy} for {series}, keeping all pages.")
+            return "keep"
+        return policy
+
+    def _load(self, series: str) -> SeriesHashes:
+        hashes = self._series.get(series)
+        if hashes is None:
+            hashes = SeriesHashes()
+            rows = self._connect().execute(
+                "SELECT hash, chapter FROM page_hashes WHERE series = ?", (series,)
+            )
+            for value, chapter in rows:
+                hashes.add(value, chapter)
+            self._series[series] = hashes
+        return hashes
+
+    def chapters_with(self, series: str, value: int) -> set[str]:
+        """
+        Chapters of `series` that hold a page close to `value`.
+        """
+        with self._lock:
+            return self._load(series).near(value)
+
+    def record(self, series: str, chapter: str, values: set[int]) -> None:
+        with self._lock:
+            hashes = self._load(series)
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR IGNORE INTO page_hashes (series, chapter, hash) VALUES (?, ?, ?)",
+                [(series, chapter, value) for value in values],
+            )
+            conn.commit()
+            for value in values:
+                hashes.add(value, chapter)
+
+    def for_chapter(
+        self, manga_info: MangaInfo, chapter_num: str, save_root: str
+    ) -> Optional[ChapterDedupe]:
+        """
+        Returns the filter for a chapter, None when its series keeps every page.
+        """
+        series = get_manga_name(manga_info.url)
+        policy = self.policy(series)
+        if policy == "keep":
+            return None
+        series_directory = os.path.dirname(
+            get_cbz_path(manga_info, chapter_num, save_root)
+        )
+        return ChapterDedupe(
+            self,
+            series,
+            chapter_num,
+            policy,
+            os.path.join(series_directory, SETTINGS.RECURRING_DIRECTORY_NAME),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._series = {}
+
+
+page_hashes = PageHashIndex()
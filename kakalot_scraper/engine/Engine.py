@@ -0,0 +1,590 @@
+import asyncio
+import os
+from collections import deque
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+from urllib.parse import urlparse
+from playwright.async_api import Page
+
+import kakalot_scraper
+from kakalot_scraper.browser.Browser import AsyncBrowserSession
+from kakalot_scraper.browser.Routing import RequestRouter
+from kakalot_scraper.cache.ImageCache import image_cache
+from kakalot_scraper.cbz.Generator import CbzWriter, generate_cbz, get_cbz_path
+from kakalot_scraper.cbz.Staging import ChapterStaging
+from kakalot_scraper.cbz.Stream import ChapterStream
+from kakalot_scraper.dedupe.Dedupe import page_hashes
+from kakalot_scraper.identity.Identity import current_identity, identity_pool
+from kakalot_scraper.library.Library import LibraryIndex, chapter_exists
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.fastpath.FastPath import (
+    fetch_chapter_images,
+    fetch_series_snapshot,
+    resume_chapter_images,
+)
+from kakalot_scraper.manager.Manager import (
+    SERIES_PAGE_SCRIPT,
+    MangaInfo,
+    build_chapters_list,
+    build_manga_info,
+    get_manga_name,
+    record_series_page_outcome,
+)
+from kakalot_scraper.manager.Manager import SETTINGS as MANAGER_SETTINGS
+from kakalot_scraper.scrape.Scraper import (
+    PageCollector,
+    check_image,
+    parse_chapter_url,
+)
+from kakalot_scraper.scrape.Scraper import SETTINGS as SCRAPER_SETTINGS
+from kakalot_scraper.scrape.LazyLoad import (
+    read_image_sources_async,
+    read_reader_sources_async,
+    trigger_lazy_loading_async,
+)
+from kakalot_scraper.scrape.PageImage import PageImage
+from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RATE_LIMIT_SETTINGS
+from kakalot_scraper.workqueue.WorkQueue import work_queue
+
+
+class SETTINGS:
+    GLOBAL_CONCURRENCY = 4
+    PER_HOST_CONCURRENCY = 2
+    MAX_RETRIES = 3
+
+
+async def read_series_page_async(page: Page, url: str, wait_for: list[str]) -> dict:
+    """
+    Async version of Manager.read_series_page.
+    """
+    # Series pages need no images at all
+    await RequestRouter(url, block_images=True).attach_async(page)
+
+    await rate_limiter.acquire_async(url)
+    try:
+        with metrics.timer("navigate"):
+            response = await page.goto(url)
+    except Exception:
+        rate_limiter.record_failure(url, "navigation failed")
+        raise
+
+    if (
+        response is not None
+        and response.status in RATE_LIMIT_SETTINGS.THROTTLE_STATUSES
+    ):
+        rate_limiter.record_failure(url, f"HTTP {response.status}")
+        return {}
+
+    for class_name in wait_for:
+        try:
+            await page.wait_for_selector(
+                f".{class_name}", timeout=MANAGER_SETTINGS.SELECTOR_TIMEOUT
+            )
+        except Exception as e:
+            print(f"Timeout waiting for .{class_name}: {e}")
+    data = await page.evaluate(SERIES_PAGE_SCRIPT)
+    record_series_page_outcome(url, data)
+    return data
+
+
+async def fetch_image_async(page: Page, src: str) -> Optional[bytes]:
+    """
+    Async version of Scraper.fetch_fallback_image, downloads an image the
+    page did not load through its request context.
+
+    Returns:
+        bytes | None: The image, None when every attempt failed.
+    """
+    for attempt in range(SCRAPER_SETTINGS.FALLBACK_RETRIES + 1):
+        if attempt:
+            metrics.inc("retries")
+            await asyncio.sleep(SCRAPER_SETTINGS.FALLBACK_RETRY_DELAY_SECONDS * attempt)
+        await rate_limiter.acquire_async(src, RATE_LIMIT_SETTINGS.IMAGE_REQUEST_COST)
+        try:
+            with metrics.timer("image_fetch"):
+                response = await page.request.get(
+                    src, timeout=SCRAPER_SETTINGS.FALLBACK_TIMEOUT_SECONDS * 1000
+                )
+        except Exception as e:
+            print(f"Fallback fetch of {src} failed: {e}")
+            continue
+
+        rate_limiter.record_status(src, response.status)
+        if response.status == 200:
+            image_data = await response.body()
+            metrics.inc("bytes_downloaded", len(image_data))
+            await asyncio.to_thread(image_cache.put, src, image_data)
+            return image_data
+        print(f"Fallback fetch of {src} got HTTP {response.status}.")
+        if response.status in SCRAPER_SETTINGS.PERMANENT_STATUSES:
+            break
+    return None
+
+
+async def scrape_manga_async(
+    manga: str,
+    page: Page,
+    staging: Optional[ChapterStaging] = None,
+    sink: Optional[PageCollector] = None,
+) -> list[PageImage]:
+    """
+    Async version of Scraper.scrape_manga working on an already opened page.
+
+    Args:
+        manga (str): The chapter URL.
+        page (Page): Page to scrape with.
+        staging (ChapterStaging | None): Checkpoint of the chapter.
+        sink (PageCollector | None): Receives the validated images.
+
+    Returns:
+        list[PageImage]: The pages of the chapter, empty when scraping failed.
+    """
+    manga_name = parse_chapter_url(manga)
+    if manga_name is None:
+        return []
+
+    sink = sink or PageCollector()
+    captured_images: dict[str, bytes] = {}
+    reader_sources: Optional[set[str]] = None
+    # Response callbacks do not run in the task the identity is set in
+    identity = current_identity()
+
+    async def handle_response(response):
+        try:
+            if response.request.resource_type == "image":
+                if response.status in RATE_LIMIT_SETTINGS.THROTTLE_STATUSES:
+                    rate_limiter.record_status(response.url, response.status, identity)
+                    return
+                if reader_sources is not None and response.url not in reader_sources:
+                    return
+                body = await response.body()
+                metrics.inc("bytes_downloaded", len(body))
+                if response.status == 200 and await asyncio.to_thread(
+                    image_cache.put, response.url, body
+                ):
+                    return
+                captured_images[response.url] = body
+        except Exception:
+            pass
+
+    page.on("response", handle_response)
+
+    router = RequestRouter(manga, cache=image_cache)
+    await router.attach_async(page)
+
+    try:
+        await rate_limiter.acquire_async(manga)
+        print(f"Navigating to {manga}...")
+        with metrics.timer("navigate"):
+            response = await page.goto(manga, wait_until="domcontentloaded")
+        if (
+            response is not None
+            and response.status in RATE_LIMIT_SETTINGS.THROTTLE_STATUSES
+        ):
+            rate_limiter.record_failure(manga, f"HTTP {response.status}")
+            return []
+
+        try:
+            await page.wait_for_selector(
+                f".{SCRAPER_SETTINGS.DIV_CLASS_NAME}", timeout=30000
+            )
+        except Exception:
+            print(f"Timeout waiting for content container on {manga}.")
+            rate_limiter.record_failure(manga, "container timeout")
+            return []
+
+        reader_sources = await read_reader_sources_async(
+            page, f".{SCRAPER_SETTINGS.DIV_CLASS_NAME}"
+        )
+        for url in list(captured_images):
+            if url not in reader_sources:
+                del captured_images[url]
+
+        await trigger_lazy_loading_async(page, f".{SCRAPER_SETTINGS.DIV_CLASS_NAME}")
+
+        sources = await read_image_sources_async(
+            page, f".{SCRAPER_SETTINGS.DIV_CLASS_NAME}"
+        )
+        print(f"Found {len(sources)} potential images on {manga}.")
+        if staging is not None:
+            await asyncio.to_thread(staging.set_sources, sources)
+        sink.begin(manga_name, sources)
+
+        # Images that are not staged, captured or cached are downloaded
+        # concurrently, at most a window ahead of the image being added
+        def find_missing() -> list[str]:
+            return [
+                src
+                for src in dict.fromkeys(sources)
+                if src not in captured_images
+                and not (staging is not None and staging.has_page(src))
+                and not image_cache.contains(src)
+            ]
+
+        queued = deque(await asyncio.to_thread(find_missing))
+        if queued:
+            print(f"{len(queued)} images of {manga} not captured, fetching them...")
+        window = sink.max_in_flight or SCRAPER_SETTINGS.FALLBACK_WINDOW
+        fetches: dict[str, asyncio.Task] = {}
+
+        def fill() -> None:
+            while queued and len(fetches) < window:
+                src = queued.popleft()
+                fetches[src] = asyncio.create_task(fetch_image_async(page, src))
+
+        def add_image(src: str, image_data: Optional[bytes]) -> None:
+            image = check_image(src, image_data)
+            if image is not None:
+                sink.add(image, src)
+
+        fill()
+        try:
+            for src in sources:
+                try:
+                    staged_data = None
+                    if staging is not None:
+                        staged_data = await asyncio.to_thread(staging.load_page, src)
+                    image_data = staged_data or captured_images.pop(src, None)
+                    fetch = fetches.pop(src, None)
+                    if src in queued:
+                        queued.remove(src)
+                    if fetch is not None:
+                        if image_data:
+                            fetch.cancel()
+                        else:
+                            image_data = await fetch
+                    fill()
+                    if not image_data:
+                        image_data = await asyncio.to_thread(image_cache.get, src)
+                    if not image_data:
+                        image_data = await fetch_image_async(page, src)
+
+                    if staging is not None and image_data and not staged_data:
+                        await asyncio.to_thread(staging.save_page, src, image_data)
+
+                    # Probing the image and streaming sinks, which stitch and
+                    # encode here, stay off the event loop
+                    await asyncio.to_thread(add_image, src, image_data)
+                except Exception as e:
+                    print(f"Error processing image {src}: {e}")
+        finally:
+            for fetch in fetches.values():
+                fetch.cancel()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        router.report(manga)
+
+    # Merging is CPU bound, keep it off the event loop
+    pages = await asyncio.to_thread(sink.finish)
+    if pages:
+        rate_limiter.record_success(manga)
+    else:
+        rate_limiter.record_failure(manga, "no images")
+    return pages
+
+
+class AsyncScrapeEngine:
+    """
+    Scrapes several series and chapters concurrently.
+
+    Every navigation holds one slot of the global limit and one slot of the
+    limit of its host, so `concurrency` caps the number of open pages and
+    `per_host_concurrency` caps how hard a single site is hit.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = SETTINGS.GLOBAL_CONCURRENCY,
+        per_host_concurrency: int = SETTINGS.PER_HOST_CONCURRENCY,
+        full_reset: bool = False,
+        save_root: Optional[str] = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.full_reset = full_reset
+        self.save_root = save_root or kakalot_scraper.GLOBAL.SAVE_ROOT
+        self.session: Optional[AsyncBrowserSession] = None
+        self.index: Optional[LibraryIndex] = None
+        # The index is a SQLite connection, it is only used from this thread
+        self._index_thread: Optional[ThreadPoolExecutor] = None
+        self._global_slots: Optional[asyncio.Semaphore] = None
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self.series_done = 0
+        self.series_failed = 0
+        self.chapters_saved = 0
+        self.chapters_failed = 0
+        self.elapsed = 0.0
+
+    @asynccontextmanager
+    async def _slot(self, url: str) -> AsyncIterator[None]:
+        host = urlparse(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+
+        # Host first, so tasks waiting on a busy host don't hold global slots
+        async with self._host_slots[host]:
+            async with self._global_slots:
+                yield
+
+    async def _in_index(self, function: Callable[..., Any], *args) -> Any:
+        """
+        Runs `function` on the thread that owns the library index.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._index_thread, function, *args
+        )
+
+    async def _get_series_snapshot(
+        self, url: str
+    ) -> tuple[MangaInfo, list[tuple[str, str]]]:
+        data: dict = {}
+        async with self._slot(url):
+            if kakalot_scraper.GLOBAL.USE_HTTP_FAST_PATH:
+                snapshot = await asyncio.to_thread(fetch_series_snapshot, url)
+                if snapshot is not None:
+                    return snapshot
+
+            async with self.session.page() as page:
+                try:
+                    data = await read_series_page_async(
+                        page,
+                        url,
+                        [
+                            MANAGER_SETTINGS.INFO_DIV_CLASS_NAME,
+                            MANAGER_SETTINGS.CHAPTERS_DIV_CLASS_NAME,
+                        ],
+                    )
+                except Exception as e:
+                    print(f"Error getting series snapshot: {e}")
+        return build_manga_info(data, url), build_chapters_list(data)
+
+    async def _process_chapter(
+        self, manga_info: MangaInfo, chapter_num: str, chapter_url: str
+    ) -> bool:
+        slug = get_manga_name(manga_info.url)
+        if not await asyncio.to_thread(work_queue.claim, slug, chapter_num):
+            print(f"Chapter {chapter_num} is claimed by another worker, skipping...")
+            return False
+        try:
+            # Another worker may have saved it between the check and the claim
+            if work_queue.enabled and await asyncio.to_thread(
+                os.path.exists, get_cbz_path(manga_info, chapter_num, self.save_root)
+            ):
+                return False
+            return await self._scrape_chapter(manga_info, chapter_num, chapter_url)
+        finally:
+            await asyncio.to_thread(work_queue.release, slug, chapter_num)
+
+    async def _scrape_chapter(
+        self, manga_info: MangaInfo, chapter_num: str, chapter_url: str
+    ) -> bool:
+        # Both read from disk
+        staging = await asyncio.to_thread(ChapterStaging, chapter_url, self.save_root)
+        dedupe = await asyncio.to_thread(
+            page_hashes.for_chapter, manga_info, chapter_num, self.save_root
+        )
+        stream = None
+        if kakalot_scraper.GLOBAL.STREAM_CHAPTERS:
+            stream = ChapterStream(
+                CbzWriter(manga_info, chapter_num, self.save_root), dedupe=dedupe
+            )
+        for attempt in range(SETTINGS.MAX_RETRIES):
+            async with self._slot(chapter_url):
+                images = None
+                if staging.sources:
+                    images = await asyncio.to_thread(
+                        resume_chapter_images, chapter_url, staging, sink=stream
+                    )
+                if not images and kakalot_scraper.GLOBAL.USE_HTTP_FAST_PATH:
+                    images = await asyncio.to_thread(
+                        fetch_chapter_images, chapter_url, staging=staging, sink=stream
+                    )
+                if not images:
+                    async with self.session.page() as page:
+                        images = await scrape_manga_async(
+                            chapter_url, page, staging, stream
+                        )
+
+            if images:
+                if dedupe is not None:
+                    if stream is None:
+                        images = await asyncio.to_thread(dedupe.filter, images)
+                    dedupe.commit()
+                if stream is not None:
+                    cbz_path = await asyncio.to_thread(stream.commit)
+                else:
+                    cbz_path = await asyncio.to_thread(
+                        generate_cbz, manga_info, chapter_num, images, self.save_root
+                    )
+                staging.clear()
+                await self._in_index(
+                    self.index.add_chapter,
+                    get_manga_name(manga_info.url),
+                    chapter_num,
+                    cbz_path,
+                )
+                self.chapters_saved += 1
+                return True
+
+            # The rate limiter has already backed off this host
+            metrics.inc("retries")
+            print(
+                f"No valid images found for Chapter {chapter_num} "
+                f"(attempt {attempt + 1}/{SETTINGS.MAX_RETRIES}), assuming rate limit."
+            )
+
+        if stream is not None:
+            stream.abort()
+        self.chapters_failed += 1
+        return False
+
+    async def _process_series(self, url: str) -> None:
+        print(f"Processing Manga: {url}")
+        for attempt in range(SETTINGS.MAX_RETRIES):
+            manga_info, chapters = await self._get_series_snapshot(url)
+            if manga_info.healthcheck():
+                break
+            metrics.inc("retries")
+        else:
+            print(f"Maximum retries reached for {url}, skipping series.")
+            self.series_failed += 1
+            return
+
+        slug = get_manga_name(url)
+        unchanged = not self.full_reset and await self._in_index(
+            self.index.is_unchanged, manga_info, chapters
+        )
+        await self._in_index(
+            self.index.update_series, manga_info, len(chapters), self.save_root
+        )
+        # Other workers may have recorded the series while still scraping it
+        if unchanged and not await asyncio.to_thread(work_queue.active, slug):
+            print(f"{manga_info.title} has not changed since the last check, skipping.")
+            self.series_done += 1
+            return
+
+        chapters.reverse()
+
+        def plan_missing() -> list[tuple[str, str]]:
+            return [
+                (chapter_num, chapter_url)
+                for chapter_num, chapter_url in chapters
+                if self.full_reset
+                or not chapter_exists(
+                    self.index, manga_info, chapter_num, self.save_root
+                )
+            ]
+
+        missing = await self._in_index(plan_missing)
+        print(
+            f"{manga_info.title}: {len(chapters)} chapters, {len(missing)} to download."
+        )
+
+        # A few workers per series take the chapters from a bounded queue, so
+        # a long series does not start a task for each of its chapters
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+
+        async def work() -> None:
+            while (item := await queue.get()) is not None:
+                chapter_num, chapter_url = item
+                try:
+                    await self._process_chapter(manga_info, chapter_num, chapter_url)
+                except Exception as e:
+                    print(f"Error processing chapter {chapter_num} of {url}: {e}")
+                    self.chapters_failed += 1
+
+        workers = [
+            asyncio.create_task(work())
+            for _ in range(min(self.concurrency, len(missing)))
+        ]
+        try:
+            for item in missing:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        self.series_done += 1
+
+    async def run(self, urls: list[str]) -> dict[str, float]:
+        """
+        Scrapes every series in `urls` and returns the run statistics.
+        """
+        self._global_slots = asyncio.Semaphore(self.concurrency)
+        self._host_slots = {}
+        start = time.monotonic()
+
+        async with AsyncBrowserSession() as session:
+            self.session = session
+            self._index_thread = ThreadPoolExecutor(1)
+            self.index = await self._in_index(LibraryIndex)
+            try:
+                results = await asyncio.gather(
+                    *(self._process_series(url) for url in urls),
+                    return_exceptions=True,
+                )
+                for url, result in zip(urls, results):
+                    if isinstance(result, Exception):
+                        print(f"Error processing {url}: {result}")
+                        self.series_failed += 1
+            finally:
+                self.session = None
+                await self._in_index(self.index.close)
+                self.index = None
+                self._index_thread.shutdown()
+                self._index_thread = None
+
+            self.elapsed = time.monotonic() - start
+            stats = self.stats()
+            stats.update({f"browser_{k}": v for k, v in session.stats().items()})
+            stats.update({f"cache_{k}": v for k, v in image_cache.stats().items()})
+
+        rate_limiter.save()
+        return stats
+
+    def stats(self) -> dict[str, float]:
+        hours = self.elapsed / 3600
+        return {
+            "series_done": self.series_done,
+            "series_failed": self.series_failed,
+            "chapters_saved": self.chapters_saved,
+            "chapters_failed": self.chapters_failed,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "series_per_hour": round(self.series_done / hours, 2) if hours else 0.0,
+        }
+
+
+def run_engine(
+    urls: list[str],
+    concurrency: int = SETTINGS.GLOBAL_CONCURRENCY,
+    per_host_concurrency: int = SETTINGS.PER_HOST_CONCURRENCY,
+    full_reset: bool = False,
+) -> dict[str, float]:
+    """
+    Runs the async engine over `urls` from synchronous code.
+
+    Args:
+        urls (list[str]): Series URLs to scrape.
+        concurrency (int): Maximum number of pages open at once.
+        per_host_concurrency (int): Maximum number of pages open per host.
+        full_reset (bool): Re-download chapters that already exist.
+
+    Returns:
+        dict: Run statistics, including series per hour.
+    """
+    engine = AsyncScrapeEngine(
+        concurrency=concurrency,
+        per_host_concurrency=per_host_concurrency,
+        full_reset=full_reset,
+    )
+    stats = asyncio.run(engine.run(urls))
+    print(f"Engine stats: {stats}")
+    print(f"Identities: {identity_pool.stats()}")
+    return stats
@@ -0,0 +1,404 @@
+from html.parser import HTMLParser
+from typing import Any, Optional
+from urllib.parse import urljoin
+
+import kakalot_scraper
+from kakalot_scraper.browser.Browser import BrowserSession
+from kakalot_scraper.cache.ImageCache import image_cache
+from kakalot_scraper.cbz.Staging import ChapterStaging
+from kakalot_scraper.fastpath.HttpClient import HttpClient, http_client
+from kakalot_scraper.identity.Identity import identity_pool
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.manager.Manager import (
+    MangaInfo,
+    build_chapters_list,
+    build_manga_info,
+    get_series_snapshot,
+)
+from kakalot_scraper.manager.Manager import SETTINGS as MANAGER_SETTINGS
+from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RATE_LIMIT_SETTINGS
+from kakalot_scraper.scrape.PageImage import PageImage
+from kakalot_scraper.scrape.Scraper import (
+    PageCollector,
+    check_image,
+    parse_chapter_url,
+    scrape_manga,
+)
+from kakalot_scraper.scrape.Scraper import SETTINGS as SCRAPER_SETTINGS
+
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+
+class ScopedParser(HTMLParser):
+    """
+    HTMLParser that keeps track of the open elements, so subclasses can
+    ask whether they are inside an element with a given class.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # (tag, classes, id) of every open element
+        self.stack: list[tuple[str, set[str], str]] = []
+
+    def in_class(self, class_name: str) -> bool:
+        return any(class_name in classes for _, classes, _ in self.stack)
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        classes = set((attributes.get("class") or "").split())
+        element_id = attributes.get("id") or ""
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, classes, element_id))
+        self.on_start(tag, attributes, classes, element_id)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                depth = len(self.stack)
+                del self.stack[i:]
+                self.on_end(i, depth)
+                return
+
+    def on_start(self, tag, attributes, classes, element_id) -> None:
+        pass
+
+    def on_end(self, depth: int, previous_depth: int) -> None:
+        pass
+
+
+class _Capture:
+    """
+    Collects the text of an element until it is closed.
+    """
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.parts: list[str] = []
+
+    def text(self) -> str:
+        return " ".join("".join(self.parts).split())
+
+
+class SeriesPageParser(ScopedParser):
+    """
+    Extracts the same raw data from a series page as SERIES_PAGE_SCRIPT.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.data: dict[str, Any] = {
+            "title": None,
+            "items": [],
+            "rating": None,
+            "chapters": [],
+        }
+        self._title: Optional[_Capture] = None
+        self._item: Optional[_Capture] = None
+        self._item_link: Optional[_Capture] = None
+        self._item_links: list[str] = []
+        self._rating: Optional[_Capture] = None
+        self._chapter: Optional[_Capture] = None
+        self._chapter_href: Optional[str] = None
+        self._row_has_link = False
+
+    def on_start(self, tag, attributes, classes, element_id):
+        depth = len(self.stack)
+        if self.in_class(MANAGER_SETTINGS.INFO_DIV_CLASS_NAME):
+            if tag == "h1" and self.data["title"] is None and self._title is None:
+                self._title = _Capture(depth)
+            elif tag == "li" and self._item is None:
+                self._item = _Capture(depth)
+                self._item_links = []
+            elif tag == "a" and self._item is not None and self._item_link is None:
+                self._item_link = _Capture(depth)
+            if element_id == "rate_row_cmd" and self._rating is None:
+                self._rating = _Capture(depth)
+
+        if self.in_class(MANAGER_SETTINGS.CHAPTERS_DIV_CLASS_NAME):
+            if "row" in classes:
+                self._row_has_link = False
+            elif (
+                tag == "a"
+                and self.in_class("row")
+                and not self._row_has_link
+                and self._chapter is None
+            ):
+                self._row_has_link = True
+                self._chapter = _Capture(depth)
+                self._chapter_href = attributes.get("href")
+
+    def handle_data(self, data):
+        for capture in (
+            self._title,
+            self._item,
+            self._item_link,
+            self._rating,
+            self._chapter,
+        ):
+            if capture is not None:
+                capture.parts.append(data)
+
+    def on_end(self, depth, previous_depth):
+        if self._item_link is not None and self._item_link.depth > depth:
+            self._item_links.append(self._item_link.text())
+            self._item_link = None
+        if self._item is not None and self._item.depth > depth:
+            self.data["items"].append(
+                {"text": self._item.text(), "links": self._item_links}
+            )
+            self._item = None
+        if self._title is not None and self._title.depth > depth:
+            self.data["title"] = self._title.text()
+            self._title = None
+        if self._rating is not None and self._rating.depth > depth:
+            self.data["rating"] = self._rating.text()
+            self._rating = None
+        if self._chapter is not None and self._chapter.depth > depth:
+            self.data["chapters"].append(
+                {"href": self._chapter_href, "text": self._chapter.text()}
+            )
+            self._chapter = None
+
+
+class ChapterPageParser(ScopedParser):
+    """
+    Collects the image sources of the chapter reader container.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sources: list[str] = []
+        self.found_container = False
+
+    def on_start(self, tag, attributes, classes, element_id):
+        if SCRAPER_SETTINGS.DIV_CLASS_NAME in classes:
+            self.found_container = True
+        if tag == "img" and self.in_class(SCRAPER_SETTINGS.DIV_CLASS_NAME):
+            # Lazy loaded images keep the real URL in data-src
+            src = attributes.get("data-src") or attributes.get("src")
+            if src:
+                self.sources.append(src)
+
+
+def fetch_series_snapshot(
+    url: str, client: HttpClient = http_client
+) -> Optional[tuple[MangaInfo, list[tuple[str, str]]]]:
+    """
+    Fetches series info and chapter list without a browser.
+
+    Args:
+        url (str): The URL of the manga page.
+        client (HttpClient): Client to fetch with.
+
+    Returns:
+        tuple[MangaInfo, list[tuple[str, str]]] | None: Same as
+        get_series_snapshot, None when the page needs a browser.
+    """
+    try:
+        response = client.get(url)
+    except Exception as e:
+        print(f"Fast path could not fetch {url}: {e}")
+        return None
+
+    if response.status != 200:
+        print(f"Fast path got HTTP {response.status} for {url}, falling back.")
+        return None
+
+    parser = SeriesPageParser()
+    parser.feed(response.text())
+    parser.close()
+
+    if not parser.data["title"] or not parser.data["chapters"]:
+        print(f"Fast path found no series data on {url}, falling back.")
+        return None
+
+    return build_manga_info(parser.data, url), build_chapters_list(parser.data)
+
+
+def fetch_chapter_images(
+    manga: str,
+    client: HttpClient = http_client,
+    staging: Optional[ChapterStaging] = None,
+    sink: Optional[PageCollector] = None,
+) -> Optional[list[PageImage]]:
+    """
+    Fetches the pages of a chapter without a browser.
+
+    Args:
+        manga (str): The chapter URL.
+        client (HttpClient): Client to fetch with.
+        staging (ChapterStaging | None): Checkpoint of the chapter.
+        sink (PageCollector | None): Receives the validated images.
+
+    Returns:
+        list[PageImage] | None: Same as scrape_manga, None when the page
+        needs a browser or any page could not be downloaded.
+    """
+    # The chapter page and its images are fetched as the same identity
+    with identity_pool.use():
+        manga_name = parse_chapter_url(manga)
+        if manga_name is None:
+            return None
+
+        try:
+            response = client.get(manga)
+        except Exception as e:
+            print(f"Fast path could not fetch {manga}: {e}")
+            return None
+
+        if response.status != 200:
+            print(f"Fast path got HTTP {response.status} for {manga}, falling back.")
+            return None
+
+        parser = ChapterPageParser()
+        parser.feed(response.text())
+        parser.close()
+
+        if not parser.found_container or not parser.sources:
+            print(f"Fast path found no reader images on {manga}, falling back.")
+            return None
+
+        print(f"Fast path found {len(parser.sources)} potential images.")
+        sources = [urljoin(manga, src) for src in parser.sources]
+        if staging is not None:
+            staging.set_sources(sources)
+        return collect_chapter_images(manga, manga_name, sources, client, staging, sink)
+
+
+def collect_chapter_images(
+    manga: str,
+    manga_name: str,
+    sources: list[str],
+    client: HttpClient = http_client,
+    staging: Optional[ChapterStaging] = None,
+    sink: Optional[PageCollector] = None,
+) -> Optional[list[PageImage]]:
+    """
+    Gets every image of `sources` from the staging area, the image cache or
+    the network, and turns them into the pages of the chapter.
+
+    Returns:
+        list[PageImage] | None: The pages, None when an image could not be
+        downloaded.
+    """
+    sink = sink or PageCollector()
+    sink.begin(manga_name, sources)
+    for src in sources:
+        image_data = staging.load_page(src) if staging else None
+        if image_data is None:
+            image_data = image_cache.get(src)
+            if image_data is None:
+                image_data = fetch_image(client, src, manga)
+                if image_data is None:
+                    return None
+                image_cache.put(src, image_data)
+            if staging is not None:
+                staging.save_page(src, image_data)
+
+        try:
+            image = check_image(src, image_data)
+        except Exception as e:
+            print(f"Error processing image {src}: {e}")
+            continue
+        if image is not None:
+            sink.add(image, src)
+
+    return sink.finish() or None
+
+
+def fetch_image(client: HttpClient, src: str, referer: str) -> Optional[bytes]:
+    """
+    Downloads a single page image, None when it could not be fetched.
+    """
+    try:
+        with metrics.timer("image_fetch"):
+            image_response = client.get(
+                src,
+                headers={"Referer": referer},
+                cost=RATE_LIMIT_SETTINGS.IMAGE_REQUEST_COST,
+            )
+    except Exception as e:
+        print(f"Fast path could not fetch image {src}: {e}")
+        return None
+
+    if image_response.status != 200:
+        print(f"Fast path got HTTP {image_response.status} for {src}, falling back.")
+        return None
+    return image_response.body
+
+
+def resume_chapter_images(
+    manga: str,
+    staging: ChapterStaging,
+    client: HttpClient = http_client,
+    sink: Optional[PageCollector] = None,
+) -> Optional[list[PageImage]]:
+    """
+    Finishes an interrupted chapter from its staging area without loading
+    the chapter page again, only the pages that are not staged are fetched.
+
+    Returns:
+        list[PageImage] | None: The pages, None when nothing is staged or a
+        missing page could not be downloaded.
+    """
+    # Fetched as one identity, like a chapter loaded in one go
+    with identity_pool.use():
+        manga_name = parse_chapter_url(manga)
+        if manga_name is None or not staging.sources:
+            return None
+        print(
+            f"Resuming {manga} from {staging.staged_count()}/{len(staging.sources)} "
+            "staged pages."
+        )
+        return collect_chapter_images(
+            manga, manga_name, staging.sources, client, staging, sink
+        )
+
+
+def load_series_snapshot(
+    url: str, session: Optional[BrowserSession] = None
+) -> tuple[MangaInfo, list[tuple[str, str]]]:
+    """
+    get_series_snapshot that tries the browserless fast path first.
+    """
+    if kakalot_scraper.GLOBAL.USE_HTTP_FAST_PATH:
+        snapshot = fetch_series_snapshot(url)
+        if snapshot is not None:
+            return snapshot
+    return get_series_snapshot(url, session=session)
+
+
+def load_chapter_images(
+    manga: str,
+    session: Optional[BrowserSession] = None,
+    staging: Optional[ChapterStaging] = None,
+    sink: Optional[PageCollector] = None,
+) -> list[PageImage]:
+    """
+    scrape_manga that resumes from `staging` or tries the browserless fast
+    path first.
+    """
+    if staging is not None and staging.sources:
+        pages = resume_chapter_images(manga, staging, sink=sink)
+        if pages:
+            return pages
+    if kakalot_scraper.GLOBAL.USE_HTTP_FAST_PATH:
+        pages = fetch_chapter_images(manga, staging=staging, sink=sink)
+        if pages:
+            return pages
+    return scrape_manga(manga, session=session, staging=staging, sink=sink)
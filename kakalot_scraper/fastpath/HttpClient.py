@@ -0,0 +1,207 @@
+import gzip
+import http.client
+import threading
+import zlib
+from typing import Optional
+from urllib.parse import urljoin, urlsplit
+
+from kakalot_scraper.identity.Identity import Identity, identity_pool
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+
+
+class SETTINGS:
+    TIMEOUT_SECONDS = 20
+    MAX_REDIRECTS = 5
+    # Idle keep-alive connections kept per host
+    MAX_IDLE_CONNECTIONS = 4
+
+
+class HttpResponse:
+    def __init__(self, url: str, status: int, headers: dict[str, str], body: bytes):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        content_type = self.headers.get("content-type", "")
+        charset = "utf-8"
+        if "charset=" in content_type:
+            charset = content_type.split("charset=")[-1].split(";")[0].strip()
+        return self.body.decode(charset, errors="replace")
+
+
+class HttpClient:
+    """
+    Minimal HTTP/1.1 client with a keep-alive connection pool per host and
+    identity.
+
+    Every request goes through the shared rate limiter and is sent with the
+    user agent and proxy of an identity. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.request_count = 0
+        self.connection_count = 0
+        # (identity, scheme, host) -> idle connections
+        self._idle: dict[tuple[str, str, str], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _checkout(
+        self, key: tuple[str, str, str], identity: Identity
+    ) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+            self.connection_count += 1
+
+        _, scheme, host = key
+        proxy = identity.proxy_address()
+        if proxy is None:
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(
+                    host, timeout=SETTINGS.TIMEOUT_SECONDS
+                )
+            else:
+                conn = http.client.HTTPConnection(
+                    host, timeout=SETTINGS.TIMEOUT_SECONDS
+                )
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(*proxy, timeout=SETTINGS.TIMEOUT_SECONDS)
+            conn.set_tunnel(host, headers=identity.proxy_headers())
+        else:
+            conn = http.client.HTTPConnection(*proxy, timeout=SETTINGS.TIMEOUT_SECONDS)
+        return conn, False
+
+    def _checkin(
+        self, key: tuple[str, str, str], conn: http.client.HTTPConnection
+    ) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < SETTINGS.MAX_IDLE_CONNECTIONS:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _request_once(
+        self,
+        url: str,
+        headers: dict[str, str],
+        identity: Identity,
+        timeout: Optional[float] = None,
+    ) -> HttpResponse:
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+
+        request_headers = {
+            "User-Agent": identity.user_agent,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        if identity.proxy and parts.scheme == "http":
+            # Plain HTTP goes to the proxy with the full URL instead of a tunnel
+            path = url
+            request_headers.update(identity.proxy_headers())
+        request_headers.update(headers)
+
+        key = (identity.name, parts.scheme, parts.netloc)
+        # A pooled connection may have been closed by the server meanwhile,
+        # in that case retry once on a fresh one
+        for attempt in range(2):
+            conn, reused = self._checkout(key, identity)
+            # Pooled connections keep the timeout of the request that opened them
+            conn.timeout = timeout or SETTINGS.TIMEOUT_SECONDS
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, ConnectionError, BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0:
+                    metrics.inc("retries")
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(key, conn)
+            break
+
+        response_headers = {k.lower(): v for k, v in response.getheaders()}
+        encoding = response_headers.get("content-encoding", "")
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        elif encoding == "deflate":
+            body = zlib.decompress(body)
+
+        self.request_count += 1
+        metrics.inc("bytes_downloaded", len(body))
+        return HttpResponse(url, response.status, response_headers, body)
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        cost: float = 1.0,
+        identity: Optional[Identity] = None,
+        timeout: Optional[float] = None,
+    ) -> HttpResponse:
+        """
+        Fetches `url`, following redirects.
+
+        Args:
+            url (str): The URL to fetch.
+            headers (dict[str, str] | None): Extra request headers.
+            cost (float): Rate limiter tokens the request takes.
+            identity (Identity | None): Identity to send the request as, the
+                current one or one picked from the pool when None.
+            timeout (float | None): Socket timeout in seconds, SETTINGS.TIMEOUT_SECONDS when None.
+
+        Returns:
+            HttpResponse: The final response.
+        """
+        headers = headers or {}
+        with identity_pool.use(identity) as identity:
+            for _ in range(SETTINGS.MAX_REDIRECTS + 1):
+                rate_limiter.acquire(url, cost, identity)
+                try:
+                    response = self._request_once(url, headers, identity, timeout)
+                except Exception:
+                    rate_limiter.record_failure(url, "request failed", identity)
+                    raise
+                rate_limiter.record_status(url, response.status, identity)
+
+                location = response.headers.get("location")
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    url = urljoin(url, location)
+                    continue
+                return response
+
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "requests": self.request_count,
+            "connections": self.connection_count,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle = {}
+
+
+# Shared so connections are reused across series and chapters
+http_client = HttpClient()
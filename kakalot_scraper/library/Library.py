@@ -0,0 +1,408 @@
+import os
+import re
+import sqlite3
+import time
+import zipfile
+from typing import Any, Optional
+
+import kakalot_scraper
+from kakalot_scraper.cbz.Naming import decode_file_name, get_cbz_path
+from kakalot_scraper.manager.Manager import MangaInfo, get_manga_name
+
+
+class SETTINGS:
+    INDEX_FILE_NAME = ".library.db"
+    SQLITE_TIMEOUT_SECONDS = 30
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    slug TEXT PRIMARY KEY,
+    url TEXT,
+    title TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    last_updated TEXT,
+    chapter_count INTEGER,
+    checked_at REAL,
+    status TEXT,
+    check_requested REAL
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    slug TEXT NOT NULL,
+    chapter_num TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL,
+    PRIMARY KEY (slug, chapter_num)
+);
+"""
+
+
+class LibraryIndex:
+    """
+    SQLite index of the downloaded library.
+
+    Series are keyed by their URL slug (`get_manga_name`), so the chapters
+    that are still missing can be worked out from a chapter list alone,
+    without first fetching MangaInfo for `get_cbz_path`.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(
+            kakalot_scraper.GLOBAL.SAVE_ROOT, SETTINGS.INDEX_FILE_NAME
+        )
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=SETTINGS.SQLITE_TIMEOUT_SECONDS)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self) -> None:
+        columns = {
+            row["name"] for row in self._conn.execute("PRAGMA table_info(series)")
+        }
+        # Added after the first release of the index
+        if "status" not in columns:
+            self._conn.execute("ALTER TABLE series ADD COLUMN status TEXT")
+        if "check_requested" not in columns:
+            self._conn.execute("ALTER TABLE series ADD COLUMN check_requested REAL")
+
+    def __enter__(self) -> "LibraryIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def get_series(self, slug: str) -> Optional[dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT * FROM series WHERE slug = ?", (slug,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def find_series(self, directory: str) -> Optional[dict[str, Any]]:
+        """
+        Returns the series stored in `directory`.
+        """
+        directory = os.path.normpath(directory)
+        for row in self._conn.execute("SELECT * FROM series"):
+            if os.path.normpath(row["directory"]) == directory:
+                return dict(row)
+        return None
+
+    def update_series(
+        self,
+        manga_info: MangaInfo,
+        chapter_count: int,
+        save_root: Optional[str] = None,
+    ) -> None:
+        """
+        Records the series as seen on the site right now.
+        """
+        save_root = save_root or kakalot_scraper.GLOBAL.SAVE_ROOT
+        self._conn.execute(
+            """
+            INSERT INTO series (slug, url, title, directory, last_updated, chapter_count, checked_at, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(slug) DO UPDATE SET
+                url = excluded.url,
+                title = excluded.title,
+                directory = excluded.directory,
+                last_updated = excluded.last_updated,
+                chapter_count = excluded.chapter_count,
+                checked_at = excluded.checked_at,
+                status = excluded.status
+            """,
+            (
+                get_manga_name(manga_info.url),
+                manga_info.url,
+                manga_info.title,
+                os.path.join(save_root, manga_info.title),
+                manga_info.last_updated,
+                chapter_count,
+                time.time(),
+                manga_info.status,
+            ),
+        )
+        self._conn.commit()
+
+    def add_chapter(self, slug: str, chapter_num: str, cbz_path: str) -> None:
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO chapters (slug, chapter_num, file_name, size, stored_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                slug,
+                chapter_num,
+                os.path.basename(cbz_path),
+                os.path.getsize(cbz_path),
+                time.time(),
+            ),
+        )
+        self._conn.commit()
+
+    def remove_chapter(self, slug: str, chapter_num: str) -> None:
+        self._conn.execute(
+            "DELETE FROM chapters WHERE slug = ? AND chapter_num = ?",
+            (slug, chapter_num),
+        )
+        self._conn.commit()
+
+    def request_check(self, slug: str) -> None:
+        """
+        Asks the running service to check a series again soon, e.g. after
+        broken chapters were taken out of it.
+        """
+        self._conn.execute(
+            "UPDATE series SET check_requested = ? WHERE slug = ?", (time.time(), slug)
+        )
+        self._conn.commit()
+
+    def check_requests(self) -> list[tuple[str, float]]:
+        """
+        URLs and request times of the series asked to be checked again that
+        were not checked since.
+        """
+        rows = self._conn.execute("""
+            SELECT url, check_requested FROM series
+            WHERE url IS NOT NULL AND check_requested > COALESCE(checked_at, 0)
+            """).fetchall()
+        return [(row["url"], row["check_requested"]) for row in rows]
+
+    def get_chapters(self, slug: str) -> dict[str, int]:
+        """
+        Returns the stored chapters of a series with their file sizes.
+        """
+        rows = self._conn.execute(
+            "SELECT chapter_num, size FROM chapters WHERE slug = ?", (slug,)
+        ).fetchall()
+        return {row["chapter_num"]: row["size"] for row in rows}
+
+    def overview(self) -> list[dict[str, Any]]:
+        """
+        Returns every series with the number and total size of its stored chapters.
+        """
+        rows = self._conn.execute("""
+            SELECT series.*, COUNT(chapters.chapter_num) AS stored, COALESCE(SUM(chapters.size), 0) AS stored_size
+            FROM series LEFT JOIN chapters ON chapters.slug = series.slug
+            GROUP BY series.slug ORDER BY series.title
+            """).fetchall()
+        return [dict(row) for row in rows]
+
+    def chapter_path(self, slug: str, chapter_num: str) -> Optional[str]:
+        """
+        Returns where the index has a chapter stored, None when it is not
+        indexed or its series was never recorded.
+        """
+        row = self._conn.execute(
+            """
+            SELECT series.directory, chapters.file_name
+            FROM chapters JOIN series ON series.slug = chapters.slug
+            WHERE chapters.slug = ? AND chapters.chapter_num = ?
+            """,
+            (slug, chapter_num),
+        ).fetchone()
+        return os.path.join(row["directory"], row["file_name"]) if row else None
+
+    def drop_deleted(self, slug: str) -> list[str]:
+        """
+        Removes the chapters of a series whose files were deleted from disk,
+        so they are downloaded again. Costs one directory listing.
+
+        Returns:
+            list[str]: The chapter numbers that were removed.
+        """
+        rows = self._conn.execute(
+            """
+            SELECT chapters.chapter_num, chapters.file_name, series.directory
+            FROM chapters JOIN series ON series.slug = chapters.slug
+            WHERE chapters.slug = ?
+            """,
+            (slug,),
+        ).fetchall()
+        if not rows:
+            return []
+        try:
+            on_disk = set(os.listdir(rows[0]["directory"]))
+        except FileNotFoundError:
+            on_disk = set()
+        except OSError as e:
+            print(f"Could not list {rows[0]['directory']}: {e}")
+            return []
+
+        deleted = [
+            row["chapter_num"] for row in rows if row["file_name"] not in on_disk
+        ]
+        if deleted:
+            self._conn.executemany(
+                "DELETE FROM chapters WHERE slug = ? AND chapter_num = ?",
+                [(slug, chapter_num) for chapter_num in deleted],
+            )
+            self._conn.commit()
+            print(
+                f"{len(deleted)} chapters of {slug} were deleted from disk, "
+                "downloading them again."
+            )
+        return deleted
+
+    def plan_missing(
+        self, url: str, chapters: list[tuple[str, str]]
+    ) -> list[tuple[str, str]]:
+        """
+        Returns the chapters of `chapters` that are not in the library yet.
+
+        Args:
+            url (str): The URL of the manga page.
+            chapters (list[tuple[str, str]]): (chapter number, chapter_url) tuples.
+
+        Returns:
+            list[tuple[str, str]]: The missing chapters, in the given order.
+        """
+        stored = self.get_chapters(get_manga_name(url))
+        return [chapter for chapter in chapters if chapter[0] not in stored]
+
+    def is_unchanged(
+        self, manga_info: MangaInfo, chapters: list[tuple[str, str]]
+    ) -> bool:
+        """
+        True when the series was already complete the last time it was seen,
+        its chapter list has not changed since and none of its chapters were
+        deleted from disk.
+        """
+        slug = get_manga_name(manga_info.url)
+        series = self.get_series(slug)
+        if series is None:
+            return False
+        if manga_info.last_updated == "Unknown":
+            return False
+        if series["last_updated"] != manga_info.last_updated:
+            return False
+        if series["chapter_count"] != len(chapters):
+            return False
+        if self.drop_deleted(slug):
+            return False
+        return not self.plan_missing(manga_info.url, chapters)
+
+    def rebuild(self, save_root: Optional[str] = None) -> dict[str, int]:
+        """
+        Rebuilds the chapter table by scanning the library on disk.
+
+        The series slug is read from the ComicInfo.xml `<Web>` tag of the
+        series' chapters, series without it keep their existing slug or
+        are skipped.
+
+        Args:
+            save_root (str | None): Library root, defaults to GLOBAL.SAVE_ROOT.
+
+        Returns:
+            dict[str, int]: Number of series and chapters indexed.
+        """
+        save_root = save_root or kakalot_scraper.GLOBAL.SAVE_ROOT
+        series_count = 0
+        chapter_count = 0
+
+        known = {
+            row["directory"]: row["slug"]
+            for row in self._conn.execute("SELECT slug, directory FROM series")
+        }
+        self._conn.execute("DELETE FROM chapters")
+
+        for entry in sorted(os.scandir(save_root), key=lambda e: e.name):
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+
+            files = sorted(
+                f.name
+                for f in os.scandir(entry.path)
+                if f.is_file() and f.name.endswith(".cbz")
+            )
+            if not files:
+                continue
+
+            directory = os.path.join(save_root, entry.name)
+            url = read_series_url(os.path.join(entry.path, files[-1]))
+            slug = get_manga_name(url) if url else known.get(directory)
+            if slug is None:
+                print(f"Could not determine the series of {entry.path}, skipping.")
+                continue
+
+            self._conn.execute(
+                """
+                INSERT INTO series (slug, url, title, directory)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(slug) DO UPDATE SET
+                    url = COALESCE(excluded.url, series.url),
+                    title = excluded.title,
+                    directory = excluded.directory
+                """,
+                (slug, url, entry.name, directory),
+            )
+            series_count += 1
+
+            for file_name in files:
+                try:
+                    _, chapter_num = decode_file_name(file_name)
+                except ValueError:
+                    print(f"Unexpected file name {file_name}, skipping.")
+                    continue
+                path = os.path.join(entry.path, file_name)
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO chapters (slug, chapter_num, file_name, size, stored_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        slug,
+                        chapter_num,
+                        file_name,
+                        os.path.getsize(path),
+                        os.path.getmtime(path),
+                    ),
+                )
+                chapter_count += 1
+
+        self._conn.commit()
+        print(f"Indexed {chapter_count} chapters of {series_count} series.")
+        return {"series": series_count, "chapters": chapter_count}
+
+
+def read_series_url(cbz_path: str) -> Optional[str]:
+    """
+    Reads the series URL from the ComicInfo.xml of a chapter.
+    """
+    try:
+        with zipfile.ZipFile(cbz_path) as cbz:
+            comic_info = cbz.read("ComicInfo.xml").decode("utf-8")
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Could not read ComicInfo.xml from {cbz_path}: {e}")
+        return None
+
+    match = re.search(r"<Web>(.*?)</Web>", comic_info)
+    return match.group(1).strip() if match else None
+
+
+def chapter_exists(
+    index: LibraryIndex, manga_info: MangaInfo, chapter_num: str, save_root: str
+) -> bool:
+    """
+    Checks the index first and falls back to the file system, chapters
+    found only on disk are added to the index. An indexed chapter whose file
+    was deleted is removed from the index, so it is downloaded again.
+    """
+    slug = get_manga_name(manga_info.url)
+    indexed_path = index.chapter_path(slug, chapter_num)
+    if indexed_path is not None:
+        if os.path.exists(indexed_path):
+            return True
+        print(f"{indexed_path} was deleted, downloading it again.")
+        index.remove_chapter(slug, chapter_num)
+
+    cbz_path = get_cbz_path(manga_info, chapter_num, save_root)
+    if os.path.exists(cbz_path):
+        index.add_chapter(slug, chapter_num, cbz_path)
+        return True
+    return False
@@ -0,0 +1,132 @@
+import fcntl
+import hashlib
+import json
+import os
+import zipfile
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from kakalot_scraper.cbz.Staging import write_atomic
+
+
+class SETTINGS:
+    FILE_NAME = ".manifest.json"
+    HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_checksum(path: str) -> str:
+    """
+    sha256 of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(SETTINGS.HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def chapter_entry(
+    cbz_path: str,
+    page_count: int,
+    dimensions: list[tuple[int, int]],
+    file_name: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Manifest entry of a written chapter.
+
+    Args:
+        cbz_path (str): The archive to describe, may still be a temp file.
+        page_count (int): Pages in the archive.
+        dimensions (list[tuple[int, int]]): Width and height of every page.
+        file_name (str | None): Final file name, the name of `cbz_path` by default.
+    """
+    return {
+        "file_name": file_name or os.path.basename(cbz_path),
+        "pages": page_count,
+        "size": os.path.getsize(cbz_path),
+        "sha256": file_checksum(cbz_path),
+        "dimensions": [list(size) for size in dimensions],
+        "written_at": round(os.path.getmtime(cbz_path), 3),
+    }
+
+
+def describe_cbz(cbz_path: str) -> dict[str, Any]:
+    """
+    Manifest entry of an existing archive, for chapters written before
+    there were manifests. Only the image headers are read.
+
+    Raises:
+        ValueError: If the archive cannot be read.
+    """
+    # Pillow is only needed here, commands that read manifests start faster without it
+    from PIL import Image
+
+    dimensions = []
+    try:
+        with zipfile.ZipFile(cbz_path) as cbz:
+            for name in sorted(cbz.namelist()):
+                if name == "ComicInfo.xml":
+                    continue
+                with cbz.open(name) as f:
+                    dimensions.append(Image.open(f).size)
+    except (OSError, zipfile.BadZipFile, Image.UnidentifiedImageError) as e:
+        raise ValueError(f"Could not read {cbz_path}: {e}")
+    return chapter_entry(cbz_path, len(dimensions), dimensions)
+
+
+class SeriesManifest:
+    """
+    Record of the chapters in a series directory, kept in `.manifest.json`
+    next to them:
+
+        {"chapters": {"0001_0": {"file_name": ..., "pages": 24,
+            "size": ..., "sha256": ..., "dimensions": [[800, 1200], ...],
+            "written_at": ...}}}
+
+    Updates are read-modify-write under a file lock, chapters of one series
+    may be written by several processes at once.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, SETTINGS.FILE_NAME)
+
+    def load(self) -> dict[str, dict[str, Any]]:
+        """
+        Returns the entries by chapter number, empty when there is no manifest.
+        """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get("chapters", {})
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Could not read manifest {self.path}: {e}")
+            return {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def update(self, changes: dict[str, Optional[dict[str, Any]]]) -> None:
+        """
+        Sets the entries of the given chapters, None removes a chapter.
+        """
+        try:
+            with self._locked():
+                chapters = self.load()
+                for chapter_num, entry in changes.items():
+                    if entry is None:
+                        chapters.pop(chapter_num, None)
+                    else:
+                        chapters[chapter_num] = entry
+                data = json.dumps({"chapters": dict(sorted(chapters.items()))})
+                write_atomic(self.path, data.encode("utf-8"))
+        except OSError as e:
+            print(f"Could not update manifest {self.path}: {e}")
@@ -0,0 +1,212 @@
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import kakalot_scraper
+from kakalot_scraper.cbz.Naming import decode_file_name
+from kakalot_scraper.library.Library import LibraryIndex
+from kakalot_scraper.library.Library import SETTINGS as LIBRARY_SETTINGS
+from kakalot_scraper.library.Manifest import SeriesManifest, describe_cbz, file_checksum
+
+
+class SETTINGS:
+    # Hashing is disk bound and testing zips CPU bound, use every core
+    WORKERS = os.cpu_count() or 1
+    # Chapters sent to a worker at once
+    CHUNK_SIZE = 4
+    # Broken chapters are renamed rather than deleted
+    QUARANTINE_SUFFIX = ".corrupt"
+    PROGRESS_INTERVAL_SECONDS = 10
+
+
+# Chapters that have to be downloaded again
+BROKEN_STATUSES = ("corrupt", "short", "missing")
+
+
+def verify_chapter(
+    cbz_path: str, entry: Optional[dict[str, Any]]
+) -> tuple[str, str, Optional[dict[str, Any]]]:
+    """
+    Checks a chapter against its manifest entry.
+
+    A chapter whose size and checksum match is intact. Anything else is
+    opened and every zip entry's CRC is tested, so a chapter that was
+    re-tagged by a reader app is not taken for a broken one.
+
+    Returns:
+        tuple[str, str, dict | None]: Status (`ok`, `modified`, `unrecorded`,
+        `corrupt`, `short` or `missing`), details and, for unrecorded
+        chapters, their new manifest entry.
+    """
+    if not os.path.exists(cbz_path):
+        return "missing", "file is gone", None
+
+    if entry is not None and entry.get("sha256"):
+        size = os.path.getsize(cbz_path)
+        if size == entry.get("size") and file_checksum(cbz_path) == entry["sha256"]:
+            return "ok", "", None
+
+    try:
+        with zipfile.ZipFile(cbz_path) as cbz:
+            bad_entry = cbz.testzip()
+            pages = len([name for name in cbz.namelist() if name != "ComicInfo.xml"])
+    except (OSError, zipfile.BadZipFile) as e:
+        return "corrupt", str(e), None
+    if bad_entry is not None:
+        return "corrupt", f"bad entry {bad_entry}", None
+    if pages == 0:
+        return "short", "no pages", None
+
+    if entry is None:
+        try:
+            return "unrecorded", f"{pages} pages", describe_cbz(cbz_path)
+        except ValueError as e:
+            return "corrupt", str(e), None
+    if pages < entry.get("pages", 0):
+        return "short", f"{pages} of {entry['pages']} pages", None
+    return "modified", "intact, but changed since it was written", None
+
+
+def _verify_job(job: tuple[str, Optional[dict[str, Any]]]) -> tuple:
+    cbz_path, entry = job
+    try:
+        return verify_chapter(cbz_path, entry)
+    except OSError as e:
+        return "corrupt", str(e), None
+
+
+def _collect_jobs(
+    save_root: str,
+) -> list[tuple[str, str, Optional[dict[str, Any]]]]:
+    """
+    Lists (series directory, chapter number, manifest entry) of every
+    chapter on disk or in a manifest.
+    """
+    jobs = []
+    for series in sorted(os.scandir(save_root), key=lambda e: e.name):
+        if not series.is_dir() or series.name.startswith("."):
+            continue
+        manifest = SeriesManifest(series.path).load()
+        on_disk = {}
+        for f in os.scandir(series.path):
+            if not f.is_file() or not f.name.endswith(".cbz"):
+                continue
+            try:
+                on_disk[decode_file_name(f.name)[1]] = f.name
+            except ValueError:
+                print(f"Unexpected file name {f.name}, skipping.")
+
+        for chapter_num in sorted(set(on_disk) | set(manifest)):
+            entry = manifest.get(chapter_num)
+            file_name = on_disk.get(chapter_num) or entry["file_name"]
+            jobs.append(
+                (series.path, chapter_num, os.path.join(series.path, file_name), entry)
+            )
+    return jobs
+
+
+def verify_library(
+    save_root: Optional[str] = None, workers: int = SETTINGS.WORKERS
+) -> dict[str, int]:
+    """
+    Verifies every chapter of the library on a process pool.
+
+    Chapters without a manifest entry are added to the manifest. Corrupt
+    and short chapters are renamed to `*.corrupt`, and together with
+    chapters missing from disk they are dropped from the manifest and the
+    library index, and their series is marked in the index to be checked
+    again, so the next scrape or the running service downloads them again.
+
+    Args:
+        save_root (str | None): Library root, defaults to GLOBAL.SAVE_ROOT.
+        workers (int): Processes to verify with.
+
+    Returns:
+        dict[str, int]: Number of chapters per status.
+    """
+    save_root = save_root or kakalot_scraper.GLOBAL.SAVE_ROOT
+    if not os.path.isdir(save_root):
+        print(f"No library at {save_root}.")
+        return {}
+
+    jobs = _collect_jobs(save_root)
+    print(f"Verifying {len(jobs)} chapters with {workers} processes...")
+    counts: dict[str, int] = {}
+    changes: dict[str, dict[str, Optional[dict[str, Any]]]] = {}
+    broken: list[tuple[str, str, str]] = []
+    verified_bytes = 0
+    start = last_progress = time.monotonic()
+
+    with ProcessPoolExecutor(
+        max(1, workers), mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        results = pool.map(
+            _verify_job,
+            [(cbz_path, entry) for _, _, cbz_path, entry in jobs],
+            chunksize=SETTINGS.CHUNK_SIZE,
+        )
+        for (directory, chapter_num, cbz_path, _), result in zip(jobs, results):
+            status, details, entry = result
+            counts[status] = counts.get(status, 0) + 1
+            if status != "missing":
+                verified_bytes += os.path.getsize(cbz_path)
+            if status == "unrecorded":
+                changes.setdefault(directory, {})[chapter_num] = entry
+            elif status in BROKEN_STATUSES:
+                print(f"{status.capitalize()}: {cbz_path} ({details})")
+                broken.append((directory, chapter_num, cbz_path))
+            elif status == "modified":
+                print(f"Modified: {cbz_path} ({details})")
+
+            if time.monotonic() - last_progress >= SETTINGS.PROGRESS_INTERVAL_SECONDS:
+                last_progress = time.monotonic()
+                print(f"Verified {sum(counts.values())}/{len(jobs)} chapters...")
+
+    elapsed = time.monotonic() - start
+    _queue_broken(broken, changes, save_root)
+    for directory, series_changes in changes.items():
+        SeriesManifest(directory).update(series_changes)
+
+    print(
+        f"Verified {len(jobs)} chapters ({verified_bytes / 1024**3:.2f} GB) in "
+        f"{elapsed:.1f}s, {verified_bytes / 1024**2 / max(elapsed, 1e-6):.0f} MB/s: "
+        f"{counts}"
+    )
+    return counts
+
+
+def _queue_broken(
+    broken: list[tuple[str, str, str]],
+    changes: dict[str, dict[str, Optional[dict[str, Any]]]],
+    save_root: str,
+) -> None:
+    """
+    Takes broken chapters out of the library so they are downloaded again.
+    """
+    if not broken:
+        return
+
+    # The running service owns the schedule, it picks the requests up from the index
+    with LibraryIndex(
+        os.path.join(save_root, LIBRARY_SETTINGS.INDEX_FILE_NAME)
+    ) as index:
+        for directory, chapter_num, cbz_path in broken:
+            if os.path.exists(cbz_path):
+                os.replace(cbz_path, cbz_path + SETTINGS.QUARANTINE_SUFFIX)
+            changes.setdefault(directory, {})[chapter_num] = None
+
+            series = index.find_series(directory)
+            if series is None:
+                print(
+                    f"{directory} is not in the library index, download it again by hand."
+                )
+                continue
+            index.remove_chapter(series["slug"], chapter_num)
+            index.request_check(series["slug"])
+    print(
+        f"Queued {len(broken)} chapters for download, broken files were renamed "
+        f"to *{SETTINGS.QUARANTINE_SUFFIX}."
+    )
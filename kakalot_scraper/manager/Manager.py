@@ -1,39 +1,46 @@
-import time
-from typing import Any
-from playwright.sync_api import sync_playwright
-from kakalot_scraper.utils.Utils import sleep_seconds
+from typing import TYPE_CHECKING, Any, Optional
 
+# MangaInfo and the page parsers are used by commands that never open a
+# browser, the browser stack is imported by the functions that need it
+if TYPE_CHECKING:
+    from kakalot_scraper.browser.Browser import BrowserSession
 
-def is_ongoing(manga: str) -> bool:
+
+class SETTINGS:
+    INFO_DIV_CLASS_NAME = "manga-info-text"
+    CHAPTERS_DIV_CLASS_NAME = "chapter-list"
+    SELECTOR_TIMEOUT = 5000
+
+
+def is_ongoing_status(status: str) -> bool:
+    """
+    Same check as is_ongoing, on the status of an already fetched MangaInfo.
+    """
+    return status.strip().lower() == "ongoing"
+
+
+def is_ongoing(manga: str, session: Optional["BrowserSession"] = None) -> bool:
     """
     Determines if the manga at the given URL is ongoing.
 
     Args:
         manga (str): The URL of the manga page.
+        session (BrowserSession | None): Shared browser session, a new browser is launched when None.
 
     Returns:
         bool: True if the manga is ongoing, False otherwise.
     """
-    div_class_name = "manga-info-text"
+    from kakalot_scraper.browser.Browser import open_page
+
+    data: dict[str, Any] = {}
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    with open_page(session) as page:
         try:
-            page.goto(manga)
-            # Wait for the element to be present to ensure the page is loaded enough
-            page.wait_for_selector(f".{div_class_name}", timeout=5000)
-
-            elements = page.locator(f".{div_class_name}").all()
-            for element in elements:
-                if "Status : Ongoing" in element.inner_text():
-                    return True
+            data = read_series_page(page, manga, [SETTINGS.INFO_DIV_CLASS_NAME])
         except Exception as e:
             print(f"Error checking status: {e}")
-        finally:
-            browser.close()
 
-    return False
+    return is_ongoing_status(build_manga_info(data, manga).status)
 
 
 def get_manga_name(url: str):
@@ -86,11 +93,41 @@ class MangaInfo:
         return True
 
 
-def get_manga_info(url: str) -> MangaInfo:
+# Collects everything the series page has to offer in a single round trip,
+# the result is turned into MangaInfo / chapter list by the build_* helpers.
+SERIES_PAGE_SCRIPT = """
+() => {
+    const data = { title: null, items: [], rating: null, chapters: [] };
+    const info = document.querySelector(".manga-info-text");
+    if (info) {
+        const h1 = info.querySelector("h1");
+        if (h1) data.title = h1.innerText;
+        info.querySelectorAll("li").forEach((li) => {
+            data.items.push({
+                text: li.innerText,
+                links: Array.from(li.querySelectorAll("a")).map((a) => a.innerText),
+            });
+        });
+        const rating = info.querySelector("#rate_row_cmd");
+        if (rating) data.rating = rating.innerText;
+    }
+    document.querySelectorAll(".chapter-list .row").forEach((row) => {
+        const link = row.querySelector("a");
+        if (link) {
+            data.chapters.push({ href: link.getAttribute("href"), text: link.innerText });
+        }
+    });
+    return data;
+}
+"""
+
+
+def build_manga_info(data: dict[str, Any], url: str) -> MangaInfo:
     """
-    Retrieves information about the manga at the given URL.
+    Builds a MangaInfo from the raw series page data.
 
     Args:
+        data (dict): Raw data as returned by SERIES_PAGE_SCRIPT.
         url (str): The URL of the manga page.
 
     Returns:
@@ -104,45 +141,25 @@ def get_manga_info(url: str) -> MangaInfo:
     genres: list[str] = []
     rating = "Unknown"
 
-    div_class_name = "manga-info-text"
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        try:
-            page.goto(url)
-            page.wait_for_selector(f".{div_class_name}", timeout=5000)
-
-            container = page.locator(f".{div_class_name}")
-
-            # Title
-            if container.locator("h1").count() > 0:
-                title = container.locator("h1").inner_text().strip()
-
-            # Iterate through li elements to find specific info
-            lis = container.locator("li").all()
-            for li in lis:
-                text = li.inner_text()
-                if "Author(s) :" in text:
-                    author = text.replace("Author(s) :", "").strip()
-                elif "Status :" in text:
-                    status = text.replace("Status :", "").strip()
-                elif "Last updated :" in text:
-                    last_updated = text.replace("Last updated :", "").strip()
-                elif "View :" in text:
-                    views = text.replace("View :", "").strip()
-                elif "Genres :" in text:
-                    genres = [a.inner_text().strip() for a in li.locator("a").all()]
-
-            # Rating
-            rating_elem = container.locator("#rate_row_cmd")
-            if rating_elem.count() > 0:
-                rating = rating_elem.inner_text().strip()
-
-        except Exception as e:
-            print(f"Error getting manga info: {e}")
-        finally:
-            browser.close()
+    if data.get("title"):
+        title = data["title"].strip()
+
+    # Iterate through li elements to find specific info
+    for item in data.get("items", []):
+        text = item["text"]
+        if "Author(s) :" in text:
+            author = text.replace("Author(s) :", "").strip()
+        elif "Status :" in text:
+            status = text.replace("Status :", "").strip()
+        elif "Last updated :" in text:
+            last_updated = text.replace("Last updated :", "").strip()
+        elif "View :" in text:
+            views = text.replace("View :", "").strip()
+        elif "Genres :" in text:
+            genres = [link.strip() for link in item["links"]]
+
+    if data.get("rating"):
+        rating = data["rating"].strip()
 
     return MangaInfo(
         title=title,
@@ -156,6 +173,138 @@ def get_manga_info(url: str) -> MangaInfo:
     )
 
 
+def build_chapters_list(data: dict[str, Any]) -> list[tuple[str, str]]:
+    """
+    Builds the chapter list from the raw series page data.
+
+    Args:
+        data (dict): Raw data as returned by SERIES_PAGE_SCRIPT.
+
+    Returns:
+        list[tuple[str, str]]: A list of tuples (chapter number, chapter_url).
+    """
+    chapter_urls: list[tuple[str, str]] = []
+    for chapter in data.get("chapters", []):
+        href = chapter.get("href")
+        # Extract chapter number, assuming format "Chapter X"
+        chapter_num = chapter_rename(chapter.get("text") or "")
+        if href:
+            chapter_urls.append((chapter_num, href))
+    return chapter_urls
+
+
+def read_series_page(page, url: str, wait_for: list[str]) -> dict[str, Any]:
+    """
+    Navigates to the series page and extracts its raw data.
+
+    Args:
+        page (Page): Page to navigate with.
+        url (str): The URL of the manga page.
+        wait_for (list[str]): Class names to wait for before extracting.
+
+    Returns:
+        dict: Raw data as returned by SERIES_PAGE_SCRIPT.
+    """
+    from kakalot_scraper.browser.Routing import RequestRouter
+    from kakalot_scraper.metrics.Metrics import metrics
+    from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+    from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RATE_LIMIT_SETTINGS
+
+    # Series pages need no images at all
+    RequestRouter(url, block_images=True).attach(page)
+
+    rate_limiter.acquire(url)
+    try:
+        with metrics.timer("navigate"):
+            response = page.goto(url)
+    except Exception:
+        rate_limiter.record_failure(url, "navigation failed")
+        raise
+
+    if (
+        response is not None
+        and response.status in RATE_LIMIT_SETTINGS.THROTTLE_STATUSES
+    ):
+        rate_limiter.record_failure(url, f"HTTP {response.status}")
+        return {}
+
+    for class_name in wait_for:
+        try:
+            page.wait_for_selector(f".{class_name}", timeout=SETTINGS.SELECTOR_TIMEOUT)
+        except Exception as e:
+            print(f"Timeout waiting for .{class_name}: {e}")
+
+    data = page.evaluate(SERIES_PAGE_SCRIPT)
+    record_series_page_outcome(url, data)
+    return data
+
+
+def record_series_page_outcome(url: str, data: dict[str, Any]) -> None:
+    """
+    Reports to the rate limiter whether the series page came back with content.
+    """
+    from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+
+    if data.get("title") or data.get("chapters"):
+        rate_limiter.record_success(url)
+    else:
+        rate_limiter.record_failure(url, "empty series page")
+
+
+def get_series_snapshot(
+    url: str, session: Optional["BrowserSession"] = None
+) -> tuple[MangaInfo, list[tuple[str, str]]]:
+    """
+    Loads the series page once and returns both its info and chapter list.
+
+    Args:
+        url (str): The URL of the manga page.
+        session (BrowserSession | None): Shared browser session, a new browser is launched when None.
+
+    Returns:
+        tuple[MangaInfo, list[tuple[str, str]]]: Manga info and (chapter number, chapter_url) tuples.
+    """
+    from kakalot_scraper.browser.Browser import open_page
+
+    data: dict[str, Any] = {}
+
+    with open_page(session) as page:
+        try:
+            data = read_series_page(
+                page,
+                url,
+                [SETTINGS.INFO_DIV_CLASS_NAME, SETTINGS.CHAPTERS_DIV_CLASS_NAME],
+            )
+        except Exception as e:
+            print(f"Error getting series snapshot: {e}")
+
+    return build_manga_info(data, url), build_chapters_list(data)
+
+
+def get_manga_info(url: str, session: Optional["BrowserSession"] = None) -> MangaInfo:
+    """
+    Retrieves information about the manga at the given URL.
+
+    Args:
+        url (str): The URL of the manga page.
+        session (BrowserSession | None): Shared browser session, a new browser is launched when None.
+
+    Returns:
+        MangaInfo: An object containing manga information.
+    """
+    from kakalot_scraper.browser.Browser import open_page
+
+    data: dict[str, Any] = {}
+
+    with open_page(session) as page:
+        try:
+            data = read_series_page(page, url, [SETTINGS.INFO_DIV_CLASS_NAME])
+        except Exception as e:
+            print(f"Error getting manga info: {e}")
+
+    return build_manga_info(data, url)
+
+
 def chapter_rename(chapter_text: str) -> str:
     chapter = chapter_text.lower().replace("chapter", "").strip()
 
@@ -176,58 +325,39 @@ def chapter_rename(chapter_text: str) -> str:
     return chapter.replace(" ", "_")
 
 
-def get_chapters_list(url: str) -> list[tuple[str, str]]:
+def get_chapters_list(
+    url: str, session: Optional["BrowserSession"] = None
+) -> list[tuple[str, str]]:
     """
     Retrieves the list of chapter URLs for the manga at the given URL.
 
     Args:
         url (str): The URL of the manga page.
+        session (BrowserSession | None): Shared browser session, a new browser is launched when None.
 
     Returns:
         list[tuple[str, str]]: A list of tuples (chapter number, chapter_url).
     """
-    chapter_urls: list[tuple[str, str]] = []
-    div_class_name = "chapter-list"
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        try:
-            page.goto(url)
-            page.wait_for_selector(f".{div_class_name}", timeout=5000)
+    from kakalot_scraper.browser.Browser import open_page
 
-            rows = page.locator(f".{div_class_name} .row").all()
-
-            for row in rows:
-                link = row.locator("a").first
-                if link.count() > 0:
-                    href = link.get_attribute("href")
-                    text = link.inner_text()
-
-                    # Extract chapter number, assuming format "Chapter X"
-                    chapter_num = chapter_rename(text)
-
-                    if href:
-                        chapter_urls.append((chapter_num, href))
+    data: dict[str, Any] = {}
 
+    with open_page(session) as page:
+        try:
+            data = read_series_page(page, url, [SETTINGS.CHAPTERS_DIV_CLASS_NAME])
         except Exception as e:
             print(f"Error getting chapters: {e}")
-        finally:
-            browser.close()
 
-    return chapter_urls
+    return build_chapters_list(data)
 
 
 if __name__ == "__main__":
     test_url = "https://www.mangakakalot.gg/manga/akuyaku-no-goreisoku-no-dounika-shitai-nichijou"
 
-    manga_info = get_manga_info(test_url)
-    print(f"Manga Information:")
+    manga_info, chapters = get_series_snapshot(test_url)
+    print("Manga Information:")
     print(manga_info)
-    print("Waiting before fetching chapters...")
-    sleep_seconds(5)
 
-    chapters = get_chapters_list(test_url)
     print(f"Found {len(chapters)} chapters:")
     for chapter_num, chapter_url in chapters:
         print(f"Chapter {chapter_num}: {chapter_url}")
@@ -0,0 +1,168 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from kakalot_scraper.metrics.Metrics import SETTINGS, metrics
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/stats.json":
+            body = json.dumps(metrics.snapshot()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the scraper output
+        pass
+
+
+class MetricsExporter:
+    """
+    Writes the stats file periodically and optionally serves `/metrics`
+    (Prometheus) and `/stats.json` on localhost, both from daemon threads.
+
+    Usage:
+        exporter = MetricsExporter(port=9464)
+        exporter.start()
+        ...
+        exporter.stop()
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = SETTINGS.STATS_FILE_PATH,
+        host: str = SETTINGS.HTTP_HOST,
+        port: int = SETTINGS.HTTP_PORT,
+        interval: float = SETTINGS.WRITE_INTERVAL_SECONDS,
+    ):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            metrics.write(self.path)
+
+    def start(self) -> None:
+        if self.path:
+            metrics.write(self.path)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        if self.port:
+            try:
+                self._server = ThreadingHTTPServer(
+                    (self.host, self.port), _MetricsRequestHandler
+                )
+            except OSError as e:
+                print(f"Could not serve metrics on {self.host}:{self.port}: {e}")
+                return
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            print(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.path:
+            metrics.write(self.path)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class MetricsReporter:
+    """
+    Ships the metrics of a worker process to its parent over `queue` every
+    `interval` seconds, the parent adds them with a MetricsCollector.
+
+    Usage:
+        reporter = MetricsReporter(queue, "worker-1")
+        reporter.start()
+        ...
+        reporter.stop()
+    """
+
+    def __init__(
+        self,
+        queue: Any,
+        name: str,
+        interval: float = SETTINGS.REPORT_INTERVAL_SECONDS,
+    ):
+        self.queue = queue
+        self.name = name
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.queue.put((self.name, metrics.drain()))
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.queue.put((self.name, metrics.drain()))
+
+
+class MetricsCollector:
+    """
+    Merges what the MetricsReporter of every worker sends into the metrics
+    of this process, so the stats file and `/metrics` cover all workers.
+
+    Usage:
+        collector = MetricsCollector(queue)
+        collector.start()
+        ...
+        collector.stop()
+    """
+
+    def __init__(self, queue: Any):
+        self.queue = queue
+        self.sources: set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            name, delta = item
+            self.sources.add(name)
+            metrics.merge(delta, source=name)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Merges what is left in the queue, call once the workers exited.
+        """
+        self.queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+        for name in self.sources:
+            metrics.forget(name)
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+class SETTINGS:
+    STATS_FILE_PATH = "./stats.json"
+    WRITE_INTERVAL_SECONDS = 30
+    # How often a worker process ships its metrics to the parent
+    REPORT_INTERVAL_SECONDS = 5
+    # The endpoint only listens on localhost, port 0 disables it
+    HTTP_HOST = "127.0.0.1"
+    HTTP_PORT = 0
+    PREFIX = "kakalot"
+    # Counters that mean work got done, the healthcheck watches these
+    PROGRESS_COUNTERS = ("pages", "chapters")
+
+
+class Metrics:
+    """
+    Thread-safe counters and per-stage timings of the scraper.
+
+    Stages are timed with `timer`, counters are bumped with `inc`. Whenever
+    a progress counter grows `last_progress` is updated, and `busy` marks
+    the time a scrape is running, so a healthcheck can tell a stuck scrape
+    from an idle service.
+
+    Worker processes ship their metrics with `drain`, the parent adds them
+    with `merge`. A worker merged under a `source` name counts as busy in
+    the snapshot of the parent until it reports otherwise.
+
+    Usage:
+        with metrics.timer("navigate"):
+            page.goto(url)
+        metrics.inc("bytes_downloaded", len(body))
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters: dict[str, float] = {}
+        # stage -> [count, total seconds, max seconds]
+        self.timings: dict[str, list[float]] = {}
+        self.last_progress: Optional[float] = None
+        self.busy_since: Optional[float] = None
+        self._busy_count = 0
+        # source -> busy_since of the worker processes merged into this one
+        self._sources: dict[str, Optional[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if value > 0 and name in SETTINGS.PROGRESS_COUNTERS:
+                self.last_progress = time.time()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            timing = self.timings.setdefault(stage, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        Times the block as `stage`, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def busy(self) -> Iterator[None]:
+        """
+        Marks a scrape as running for the duration of the block.
+        """
+        with self._lock:
+            self._busy_count += 1
+            if self.busy_since is None:
+                self.busy_since = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._busy_count -= 1
+                if self._busy_count == 0:
+                    self.busy_since = None
+
+    def drain(self) -> dict[str, Any]:
+        """
+        Returns the counters and timings collected so far and resets them,
+        used to ship the metrics of a worker process to its parent.
+        """
+        with self._lock:
+            delta = {
+                "counters": self.counters,
+                "timings": self.timings,
+                "busy_since": self.busy_since,
+                "last_progress": self.last_progress,
+            }
+            self.counters, self.timings = {}, {}
+        return delta
+
+    def merge(self, delta: dict[str, Any], source: Optional[str] = None) -> None:
+        """
+        Adds the metrics drained from a worker, `source` names a long-running
+        worker whose busy state is tracked as well.
+        """
+        for name, value in delta.get("counters", {}).items():
+            self.inc(name, value)
+        with self._lock:
+            for stage, (count, total, longest) in delta.get("timings", {}).items():
+                timing = self.timings.setdefault(stage, [0, 0.0, 0.0])
+                timing[0] += count
+                timing[1] += total
+                timing[2] = max(timing[2], longest)
+            if source is not None:
+                self._sources[source] = delta.get("busy_since")
+                if delta.get("last_progress"):
+                    self.last_progress = max(
+                        self.last_progress or 0, delta["last_progress"]
+                    )
+
+    def forget(self, source: str) -> None:
+        """
+        Stops tracking the busy state of a worker that exited.
+        """
+        with self._lock:
+            self._sources.pop(source, None)
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            busy = [self.busy_since, *self._sources.values()]
+            busy_since = min(
+                (since for since in busy if since is not None), default=None
+            )
+            return {
+                "time": now,
+                "uptime_seconds": round(now - self.started, 1),
+                "busy_since": busy_since,
+                "last_progress": self.last_progress,
+                "counters": dict(self.counters),
+                "stages": {
+                    stage: {
+                        "count": int(count),
+                        "total_seconds": round(total, 3),
+                        "max_seconds": round(longest, 3),
+                        "mean_seconds": round(total / count, 3) if count else 0.0,
+                    }
+                    for stage, (count, total, longest) in self.timings.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """
+        Renders the snapshot in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        prefix = SETTINGS.PREFIX
+        lines = []
+
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+
+        lines.append(f"# TYPE {prefix}_stage_seconds summary")
+        for stage, timing in sorted(snapshot["stages"].items()):
+            labels = f'{{stage="{stage}"}}'
+            lines.append(f"{prefix}_stage_seconds_count{labels} {timing['count']}")
+            lines.append(
+                f"{prefix}_stage_seconds_sum{labels} {timing['total_seconds']}"
+            )
+        lines.append(f"# TYPE {prefix}_stage_max_seconds gauge")
+        for stage, timing in sorted(snapshot["stages"].items()):
+            lines.append(
+                f'{prefix}_stage_max_seconds{{stage="{stage}"}} {timing["max_seconds"]}'
+            )
+
+        gauges = {
+            "uptime_seconds": snapshot["uptime_seconds"],
+            "busy": int(snapshot["busy_since"] is not None),
+            "last_progress_timestamp_seconds": snapshot["last_progress"] or 0,
+        }
+        for name, value in gauges.items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str = SETTINGS.STATS_FILE_PATH) -> None:
+        """
+        Writes the snapshot as JSON, replacing the file atomically.
+        """
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write stats to {path}: {e}")
+
+
+metrics = Metrics()
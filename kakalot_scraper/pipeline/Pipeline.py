@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Optional
+
+from kakalot_scraper.cbz.Encoding import get_profile
+from kakalot_scraper.cbz.Generator import generate_cbz
+from kakalot_scraper.cbz.Staging import ChapterStaging
+from kakalot_scraper.manager.Manager import MangaInfo
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.scrape.PageImage import PageImage
+
+
+class SETTINGS:
+    WORKERS = max(1, (os.cpu_count() or 2) - 1)
+    # Chapters waiting for / being encoded before submit() blocks
+    MAX_PENDING_CHAPTERS = 4
+
+
+def _encode_chapter(
+    manga_info: MangaInfo,
+    chapter_num: str,
+    images: list[PageImage],
+    save_root: str,
+    profile_name: str,
+) -> tuple[str, dict]:
+    """
+    Runs generate_cbz in a worker and returns the metrics it recorded, the
+    worker's own counters never reach the stats of the main process.
+    """
+    profile = get_profile(profile_name)
+    cbz_path = generate_cbz(manga_info, chapter_num, images, save_root, profile)
+    return cbz_path, metrics.drain()
+
+
+class ChapterPipeline:
+    """
+    Encodes and zips chapters in a process pool while the caller keeps
+    browsing.
+
+    `submit` hands a scraped chapter to the pool and returns right away
+    unless `max_pending` chapters are already in flight, in which case it
+    waits for the oldest one. Results are always reported in submission
+    order, and each CBZ is written atomically by generate_cbz. The staging
+    area passed with a chapter is cleared once its CBZ is written.
+    `on_written(manga_info, chapter_num, cbz_path)` is called in the
+    caller's process for every chapter that was written.
+
+    Usage:
+        with ChapterPipeline() as pipeline:
+            pipeline.submit(manga_info, chapter_num, images, save_root)
+    """
+
+    def __init__(
+        self,
+        workers: int = SETTINGS.WORKERS,
+        max_pending: int = SETTINGS.MAX_PENDING_CHAPTERS,
+        on_written: Optional[Callable[[MangaInfo, str, str], None]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.on_written = on_written
+        self.max_pending = max(1, max_pending)
+        self.completed: list[str] = []
+        self.failed: list[str] = []
+        self._pending: deque[
+            tuple[MangaInfo, str, Optional[ChapterStaging], Future]
+        ] = deque()
+        # spawn, forking a process that drives Playwright is not safe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def __enter__(self) -> "ChapterPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def submit(
+        self,
+        manga_info: MangaInfo,
+        chapter_num: str,
+        images: list[PageImage],
+        save_root: str,
+        staging: Optional[ChapterStaging] = None,
+    ) -> None:
+        while len(self._pending) >= self.max_pending:
+            self._collect_oldest()
+
+        future = self._executor.submit(
+            _encode_chapter,
+            manga_info,
+            chapter_num,
+            images,
+            save_root,
+            # Workers are spawned with the default settings, pass the profile on
+            get_profile().name,
+        )
+        self._pending.append((manga_info, chapter_num, staging, future))
+        print(
+            f"Queued {manga_info.title} chapter {chapter_num} for encoding "
+            f"({len(self._pending)} pending)."
+        )
+
+    def _collect_oldest(self) -> Optional[str]:
+        manga_info, chapter_num, staging, future = self._pending.popleft()
+        label = f"{manga_info.title} chapter {chapter_num}"
+        try:
+            cbz_path, worker_metrics = future.result()
+        except Exception as e:
+            print(f"Encoding {label} failed: {e}")
+            self.failed.append(label)
+            return None
+        metrics.merge(worker_metrics)
+        self.completed.append(cbz_path)
+        if staging is not None:
+            staging.clear()
+        if self.on_written is not None:
+            self.on_written(manga_info, chapter_num, cbz_path)
+        return cbz_path
+
+    def drain(self) -> None:
+        """
+        Waits for every queued chapter to be written.
+        """
+        while self._pending:
+            self._collect_oldest()
+
+    def close(self) -> None:
+        try:
+            self.drain()
+        finally:
+            self._executor.shutdown(wait=True)
+        print(
+            f"Encoding pipeline finished: {len(self.completed)} written, "
+            f"{len(self.failed)} failed."
+        )
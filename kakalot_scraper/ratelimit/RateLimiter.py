@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import kakalot_scraper
+from kakalot_scraper.identity.Identity import Identity, current_identity, identity_pool
+from kakalot_scraper.metrics.Metrics import metrics
+
+
+class SETTINGS:
+    STATE_FILE_NAME = ".rate_limits.json"
+    # Requests per second
+    INITIAL_RATE = 0.2
+    MIN_RATE = 0.02
+    MAX_RATE = 2.0
+    BURST = 2.0
+    # AIMD: add this much per healthy response, multiply by the factor on trouble
+    ADDITIVE_INCREASE = 0.02
+    MULTIPLICATIVE_DECREASE = 0.5
+    THROTTLE_STATUSES = (429, 503)
+    # Image downloads are far cheaper for the site than page navigations
+    IMAGE_REQUEST_COST = 0.1
+    SAVE_INTERVAL_SECONDS = 60
+    # Processes sharing the budget of every host, each gets this share of it
+    SHARE = 1
+    # Whether this process writes the learned rates, only one of the
+    # processes sharing a library does
+    SAVE_STATE = True
+
+
+class HostBucket:
+    """
+    Token bucket of a single host, the rate is adjusted with AIMD.
+    """
+
+    def __init__(self, rate: float = SETTINGS.INITIAL_RATE):
+        self.rate = rate
+        self.tokens = SETTINGS.BURST / max(1, SETTINGS.SHARE)
+        self.updated = time.monotonic()
+        self.successes = 0
+        self.failures = 0
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens and returns how long the caller has to wait for them.
+
+        Tokens may go negative, so concurrent callers queue up behind each
+        other instead of all waking up at the same moment.
+        """
+        # `rate` is what the host allows, this process only gets its share
+        share = max(1, SETTINGS.SHARE)
+        rate = self.rate / share
+        now = time.monotonic()
+        self.tokens = min(
+            SETTINGS.BURST / share, self.tokens + (now - self.updated) * rate
+        )
+        self.updated = now
+        self.tokens -= cost
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / rate
+
+    def increase(self) -> None:
+        self.successes += 1
+        self.rate = min(SETTINGS.MAX_RATE, self.rate + SETTINGS.ADDITIVE_INCREASE)
+
+    def decrease(self) -> None:
+        self.failures += 1
+        self.rate = max(SETTINGS.MIN_RATE, self.rate * SETTINGS.MULTIPLICATIVE_DECREASE)
+        # Drop any saved up burst so the slowdown is felt right away
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    """
+    Per-host adaptive rate limiter.
+
+    Call `acquire` (or `acquire_async`) before every request and report the
+    outcome with `record_success` / `record_failure` / `record_status`. The
+    learned rates are saved to `state_path` and reloaded on the next run.
+
+    Requests through a proxy identity draw from a budget of their own, the
+    identity defaults to the current one of the calling code. Outcomes are
+    also passed on to the identity pool as health of the identity.
+
+    Worker processes scraping the same site split every budget with
+    `SETTINGS.SHARE`, the rates learned and saved stay those of the host.
+    """
+
+    def __init__(self, state_path: Optional[str] = None):
+        self.state_path = state_path
+        self._buckets: dict[str, HostBucket] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_save = time.monotonic()
+
+    def _get_state_path(self) -> str:
+        return self.state_path or os.path.join(
+            kakalot_scraper.GLOBAL.SAVE_ROOT, SETTINGS.STATE_FILE_NAME
+        )
+
+    def _key(self, url: str, identity: Optional[Identity]) -> str:
+        host = urlparse(url).netloc or url
+        # Direct identities share the IP, and with it the budget of the host
+        if identity is None or not identity.proxy:
+            return host
+        return f"{host}@{identity.name}"
+
+    def _bucket(self, url: str, identity: Optional[Identity] = None) -> HostBucket:
+        if not self._loaded:
+            self.load()
+        key = self._key(url, identity)
+        if key not in self._buckets:
+            self._buckets[key] = HostBucket(SETTINGS.INITIAL_RATE)
+        return self._buckets[key]
+
+    def reserve(
+        self, url: str, cost: float = 1.0, identity: Optional[Identity] = None
+    ) -> float:
+        identity = identity or current_identity()
+        with self._lock:
+            return self._bucket(url, identity).reserve(cost)
+
+    def acquire(
+        self, url: str, cost: float = 1.0, identity: Optional[Identity] = None
+    ) -> None:
+        identity = identity or current_identity()
+        wait = self.reserve(url, cost, identity)
+        if wait > 0:
+            print(f"Rate limiting {self._key(url, identity)}, waiting {wait:.1f}s...")
+            metrics.inc("rate_limit_wait_seconds", wait)
+            time.sleep(wait)
+
+    async def acquire_async(
+        self, url: str, cost: float = 1.0, identity: Optional[Identity] = None
+    ) -> None:
+        identity = identity or current_identity()
+        wait = self.reserve(url, cost, identity)
+        if wait > 0:
+            print(f"Rate limiting {self._key(url, identity)}, waiting {wait:.1f}s...")
+            metrics.inc("rate_limit_wait_seconds", wait)
+            await asyncio.sleep(wait)
+
+    def record_success(self, url: str, identity: Optional[Identity] = None) -> None:
+        identity = identity or current_identity()
+        with self._lock:
+            self._bucket(url, identity).increase()
+        if identity is not None:
+            identity_pool.record(identity, True)
+        self._maybe_save()
+
+    def record_failure(
+        self, url: str, reason: str = "", identity: Optional[Identity] = None
+    ) -> None:
+        identity = identity or current_identity()
+        with self._lock:
+            bucket = self._bucket(url, identity)
+            bucket.decrease()
+            rate = bucket.rate
+        if identity is not None:
+            identity_pool.record(identity, False)
+        metrics.inc("rate_limit_backoffs")
+        print(
+            f"Backing off {self._key(url, identity)} to {rate:.3f} req/s"
+            + (f" ({reason})" if reason else "")
+        )
+        self._maybe_save()
+
+    def record_status(
+        self, url: str, status: int, identity: Optional[Identity] = None
+    ) -> None:
+        if status in SETTINGS.THROTTLE_STATUSES:
+            self.record_failure(url, f"HTTP {status}", identity)
+        elif 200 <= status < 400:
+            self.record_success(url, identity)
+
+    def load(self) -> None:
+        self._loaded = True
+        path = self._get_state_path()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load rate limiter state from {path}: {e}")
+            return
+
+        for host, rate in state.items():
+            rate = min(SETTINGS.MAX_RATE, max(SETTINGS.MIN_RATE, float(rate)))
+            self._buckets[host] = HostBucket(rate)
+
+    def save(self) -> None:
+        if not SETTINGS.SAVE_STATE:
+            return
+        path = self._get_state_path()
+        with self._lock:
+            state = {host: bucket.rate for host, bucket in self._buckets.items()}
+        if not state:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save rate limiter state to {path}: {e}")
+        self._last_save = time.monotonic()
+
+    def _maybe_save(self) -> None:
+        if time.monotonic() - self._last_save >= SETTINGS.SAVE_INTERVAL_SECONDS:
+            self.save()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                host: {
+                    "rate": round(bucket.rate, 4),
+                    "successes": bucket.successes,
+                    "failures": bucket.failures,
+                }
+                for host, bucket in self._buckets.items()
+            }
+
+
+# Shared by every module so all requests to a host draw from one budget
+rate_limiter = RateLimiter()
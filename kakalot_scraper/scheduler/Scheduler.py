@@ -0,0 +1,349 @@
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+import kakalot_scraper
+from kakalot_scraper.library.Library import LibraryIndex
+from kakalot_scraper.manager.Manager import get_manga_name, is_ongoing_status
+
+
+class SETTINGS:
+    STATE_FILE_NAME = ".schedule.json"
+    MIN_INTERVAL_HOURS = 1
+    MAX_INTERVAL_HOURS = 72
+    DEFAULT_INTERVAL_HOURS = 6
+    COMPLETED_INTERVAL_HOURS = 24 * 7
+    RETRY_INTERVAL_HOURS = 1
+    # An ongoing series is checked this many times per expected release gap
+    CHECKS_PER_RELEASE = 4
+    # Weight of the newest gap in the smoothed release cadence
+    CADENCE_SMOOTHING = 0.3
+    # Formats the site has used for "Last updated :"
+    LAST_UPDATED_FORMATS = [
+        "%b-%d-%Y %I:%M:%S %p",
+        "%b %d,%Y - %I:%M %p",
+        "%b %d,%Y %H:%M",
+        "%b-%d-%Y %H:%M",
+        "%Y-%m-%d %H:%M:%S",
+    ]
+    HEARTBEAT_PATH = "./heartbeat"
+    HEARTBEAT_INTERVAL_SECONDS = 60
+    # Whether this process writes the schedule, only one of the processes
+    # sharing a library does
+    SAVE_STATE = True
+    # How often the library index is polled for series to check again
+    CHECK_REQUEST_POLL_SECONDS = 300
+
+
+def parse_last_updated(last_updated: str) -> Optional[float]:
+    """
+    Parses the "Last updated" text of a series page into a timestamp.
+    """
+    for fmt in SETTINGS.LAST_UPDATED_FORMATS:
+        try:
+            return datetime.strptime(last_updated.strip(), fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+class SeriesSchedule:
+    """
+    When a series is checked next and what is known about its releases.
+    """
+
+    def __init__(self, url: str, next_check: float):
+        self.url = url
+        self.next_check = next_check
+        self.interval = SETTINGS.DEFAULT_INTERVAL_HOURS * 3600
+        self.status = "Unknown"
+        self.chapter_count: Optional[int] = None
+        # Time of the last observed new chapter and the smoothed gap between them
+        self.last_release: Optional[float] = None
+        self.cadence: Optional[float] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "SeriesSchedule":
+        entry = cls(data["url"], float(data["next_check"]))
+        for key, value in data.items():
+            if hasattr(entry, key):
+                setattr(entry, key, value)
+        return entry
+
+
+class SeriesScheduler:
+    """
+    Persistent per-series schedule for self-service mode.
+
+    Every series gets its own next check time based on its status, its
+    `last_updated` date and the release cadence observed so far. Due series
+    are kept in a heap, so the caller can sleep exactly until the next one.
+
+    Usage:
+        scheduler.sync(urls)
+        while True:
+            due = scheduler.pop_due()
+            ...
+            scheduler.record_results(index, due, started)
+            wait(scheduler.seconds_until_next())
+    """
+
+    def __init__(self, state_path: Optional[str] = None):
+        self.state_path = state_path or os.path.join(
+            kakalot_scraper.GLOBAL.SAVE_ROOT, SETTINGS.STATE_FILE_NAME
+        )
+        self.series: dict[str, SeriesSchedule] = {}
+        self._heap: list[tuple[float, str]] = []
+        # url -> time of the last check request that was scheduled
+        self._requested: dict[str, float] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            entries = [SeriesSchedule.from_dict(data) for data in state]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not load schedule from {self.state_path}: {e}")
+            return
+
+        for entry in entries:
+            self.series[entry.url] = entry
+            heapq.heappush(self._heap, (entry.next_check, entry.url))
+
+    def save(self) -> None:
+        if not SETTINGS.SAVE_STATE:
+            return
+        state = [entry.to_dict() for entry in self.series.values()]
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"Could not save schedule to {self.state_path}: {e}")
+
+    def _push(self, entry: SeriesSchedule) -> None:
+        heapq.heappush(self._heap, (entry.next_check, entry.url))
+
+    def add(self, url: str, when: Optional[float] = None) -> None:
+        """
+        Schedules a series, by default right away. Known series keep their
+        schedule unless `when` is earlier.
+        """
+        when = time.time() if when is None else when
+        entry = self.series.get(url)
+        if entry is None:
+            entry = SeriesSchedule(url, when)
+            self.series[url] = entry
+        elif when < entry.next_check:
+            entry.next_check = when
+        else:
+            return
+        self._push(entry)
+
+    def remove(self, url: str) -> None:
+        # The heap entry is skipped lazily by pop_due
+        self.series.pop(url, None)
+
+    def sync(self, urls: list[str]) -> tuple[list[str], list[str]]:
+        """
+        Makes the schedule match the configured URLs. Unknown series are due
+        right away, series no longer configured are dropped.
+
+        Returns:
+            tuple[list[str], list[str]]: The added and the removed URLs.
+        """
+        configured = set(urls)
+        added = [url for url in urls if url not in self.series]
+        removed = [url for url in self.series if url not in configured]
+        for url in added:
+            self.add(url)
+        for url in removed:
+            self.remove(url)
+        if added or removed:
+            print(f"Schedule updated: {len(added)} added, {len(removed)} removed.")
+        return added, removed
+
+    def take_requests(self, index: LibraryIndex) -> list[str]:
+        """
+        Schedules right away the configured series that were asked to be
+        checked again through the library index, e.g. by `--verify`.
+
+        Returns:
+            list[str]: The URLs that were scheduled.
+        """
+        scheduled = []
+        for url, requested in index.check_requests():
+            if url not in self.series or requested <= self._requested.get(url, 0):
+                continue
+            self._requested[url] = requested
+            self.add(url)
+            scheduled.append(url)
+        if scheduled:
+            print(f"{len(scheduled)} series were asked to be checked again.")
+        return scheduled
+
+    def _is_current(self, next_check: float, url: str) -> bool:
+        entry = self.series.get(url)
+        return entry is not None and entry.next_check == next_check
+
+    def pop_due(self, now: Optional[float] = None) -> list[str]:
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            next_check, url = heapq.heappop(self._heap)
+            if self._is_current(next_check, url) and url not in due:
+                due.append(url)
+        return due
+
+    def seconds_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds until the next series is due, None when nothing is scheduled.
+        """
+        now = time.time() if now is None else now
+        while self._heap and not self._is_current(*self._heap[0]):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - now)
+
+    def _interval(self, entry: SeriesSchedule, now: float) -> float:
+        if entry.status.strip().lower() == "completed":
+            return SETTINGS.COMPLETED_INTERVAL_HOURS * 3600
+
+        if entry.cadence:
+            interval = entry.cadence / SETTINGS.CHECKS_PER_RELEASE
+        elif entry.last_release and is_ongoing_status(entry.status):
+            # No cadence yet, a series that updated recently is checked more often
+            interval = (now - entry.last_release) / SETTINGS.CHECKS_PER_RELEASE
+        else:
+            interval = SETTINGS.DEFAULT_INTERVAL_HOURS * 3600
+
+        return min(
+            SETTINGS.MAX_INTERVAL_HOURS * 3600,
+            max(SETTINGS.MIN_INTERVAL_HOURS * 3600, interval),
+        )
+
+    def record_check(
+        self,
+        url: str,
+        status: str,
+        last_updated: str,
+        chapter_count: Optional[int],
+        now: Optional[float] = None,
+    ) -> None:
+        """
+        Reschedules a series after a successful check.
+        """
+        entry = self.series.get(url)
+        if entry is None:
+            return
+        now = time.time() if now is None else now
+
+        released = parse_last_updated(last_updated)
+        if (
+            entry.chapter_count is not None
+            and chapter_count is not None
+            and chapter_count > entry.chapter_count
+        ):
+            if entry.last_release is not None:
+                gap = now - entry.last_release
+                entry.cadence = (
+                    gap
+                    if entry.cadence is None
+                    else SETTINGS.CADENCE_SMOOTHING * gap
+                    + (1 - SETTINGS.CADENCE_SMOOTHING) * entry.cadence
+                )
+            entry.last_release = now
+        elif released is not None and released <= now:
+            entry.last_release = max(entry.last_release or 0.0, released)
+
+        entry.status = status
+        entry.chapter_count = chapter_count
+        entry.interval = self._interval(entry, now)
+        entry.next_check = now + entry.interval
+        self._push(entry)
+
+    def record_failure(self, url: str, now: Optional[float] = None) -> None:
+        entry = self.series.get(url)
+        if entry is None:
+            return
+        now = time.time() if now is None else now
+        entry.next_check = now + SETTINGS.RETRY_INTERVAL_HOURS * 3600
+        self._push(entry)
+
+    def record_results(
+        self, index: LibraryIndex, urls: list[str], started: float
+    ) -> None:
+        """
+        Reschedules `urls` from what the library index recorded for them
+        since `started`, series that were not checked are retried soon.
+        """
+        for url in urls:
+            series = index.get_series(get_manga_name(url))
+            if series is None or (series["checked_at"] or 0) < started:
+                self.record_failure(url)
+                continue
+            self.record_check(
+                url,
+                series["status"] or "Unknown",
+                series["last_updated"] or "",
+                series["chapter_count"],
+            )
+        self.save()
+
+    def stats(self) -> dict[str, Any]:
+        wait = self.seconds_until_next()
+        return {
+            "series": len(self.series),
+            "next_check_in": None if wait is None else round(wait),
+        }
+
+
+class Heartbeat:
+    """
+    Touches the heartbeat file from a background thread, so the container
+    healthcheck keeps passing while a long scrape or a long wait is running.
+    """
+
+    def __init__(
+        self,
+        path: str = SETTINGS.HEARTBEAT_PATH,
+        interval: float = SETTINGS.HEARTBEAT_INTERVAL_SECONDS,
+    ):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def beat(self) -> None:
+        try:
+            with open(self.path, "w") as f:
+                f.write(str(time.time()))
+        except OSError as e:
+            print(f"Could not write heartbeat to {self.path}: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.beat()
+
+    def start(self) -> None:
+        self.beat()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
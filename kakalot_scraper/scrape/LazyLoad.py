@@ -0,0 +1,285 @@
+import os
+import time
+
+from PIL import Image
+
+from kakalot_scraper.metrics.Metrics import metrics
+
+
+class SETTINGS:
+    # "eager" promotes lazy attributes and waits for every image to settle,
+    # "scroll" is the old 100px / 100ms scroll to the bottom of the page
+    STRATEGY = "eager"
+    # Upper bound for the images of a chapter to load or fail
+    TIMEOUT_MS = 30000
+    # Attributes lazy loaders keep the real image URL in
+    LAZY_SRC_ATTRIBUTES = ["data-src", "data-original", "data-lazy-src"]
+
+
+# Scrolls to the bottom of the page in small steps to trigger lazy loading
+SCROLL_SCRIPT = """
+async () => {
+    await new Promise((resolve) => {
+        let totalHeight = 0;
+        const distance = 100;
+        const timer = setInterval(() => {
+            const scrollHeight = document.body.scrollHeight;
+            window.scrollBy(0, distance);
+            totalHeight += distance;
+
+            if(totalHeight >= scrollHeight){
+                clearInterval(timer);
+                resolve();
+            }
+        }, 100);
+    });
+}
+"""
+
+# Makes every image of the container load right away and resolves once each
+# one has loaded or failed. Images a lazy loader script still holds back are
+# brought into view one by one, a frame apart so IntersectionObservers see them.
+EAGER_LOAD_SCRIPT = """
+async ({ selector, timeout, attributes }) => {
+    const started = performance.now();
+    const container = document.querySelector(selector);
+    if (!container) {
+        return { images: 0, pending: 0, elapsed: 0 };
+    }
+    const images = Array.from(container.querySelectorAll("img"));
+
+    const promote = () => {
+        for (const img of images) {
+            for (const attribute of attributes) {
+                const value = img.getAttribute(attribute);
+                if (value && img.getAttribute("src") !== value) {
+                    img.setAttribute("src", value);
+                    break;
+                }
+            }
+            if (img.loading === "lazy") {
+                img.loading = "eager";
+            }
+        }
+    };
+    const nextFrame = () => new Promise((resolve) => requestAnimationFrame(() => resolve()));
+    const settled = (img) => img.complete ? Promise.resolve() : new Promise((resolve) => {
+        img.addEventListener("load", resolve, { once: true });
+        img.addEventListener("error", resolve, { once: true });
+    });
+
+    promote();
+    await nextFrame();
+    for (const img of images) {
+        if (!img.complete) {
+            img.scrollIntoView({ block: "center" });
+            await nextFrame();
+        }
+    }
+    // A lazy loader may have swapped attributes while we were jumping around
+    promote();
+
+    const remaining = Math.max(0, timeout - (performance.now() - started));
+    await Promise.race([
+        Promise.all(images.map(settled)),
+        new Promise((resolve) => setTimeout(resolve, remaining)),
+    ]);
+    return {
+        images: images.length,
+        pending: images.filter((img) => !img.complete).length,
+        elapsed: performance.now() - started,
+    };
+}
+"""
+
+
+# Absolute URLs an image of the container shows now or after lazy loading
+READER_SOURCES_SCRIPT = """
+(imgs, attributes) => imgs.flatMap((img) =>
+    ["src", ...attributes]
+        .map((attribute) => img.getAttribute(attribute))
+        .filter(Boolean)
+        .map((value) => new URL(value, document.baseURI).href)
+)
+"""
+
+
+# The `src` of every image of the container, in reading order
+IMAGE_SOURCES_SCRIPT = """
+(imgs) => imgs.map((img) => img.getAttribute("src")).filter(Boolean)
+"""
+
+
+def read_image_sources(page, selector: str) -> list[str]:
+    """
+    Returns the `src` of every image of the container at `selector` in one
+    round trip, in page order.
+    """
+    return page.eval_on_selector_all(f"{selector} img", IMAGE_SOURCES_SCRIPT)
+
+
+async def read_image_sources_async(page, selector: str) -> list[str]:
+    return await page.eval_on_selector_all(f"{selector} img", IMAGE_SOURCES_SCRIPT)
+
+
+def read_reader_sources(page, selector: str) -> set[str]:
+    """
+    Returns every image URL the container at `selector` will load.
+    """
+    return set(
+        page.eval_on_selector_all(
+            f"{selector} img", READER_SOURCES_SCRIPT, SETTINGS.LAZY_SRC_ATTRIBUTES
+        )
+    )
+
+
+async def read_reader_sources_async(page, selector: str) -> set[str]:
+    return set(
+        await page.eval_on_selector_all(
+            f"{selector} img", READER_SOURCES_SCRIPT, SETTINGS.LAZY_SRC_ATTRIBUTES
+        )
+    )
+
+
+def _eager_arguments(selector: str) -> dict:
+    return {
+        "selector": selector,
+        "timeout": SETTINGS.TIMEOUT_MS,
+        "attributes": SETTINGS.LAZY_SRC_ATTRIBUTES,
+    }
+
+
+def _report(result: dict, elapsed: float) -> None:
+    metrics.observe("lazy_load", elapsed)
+    print(
+        f"Lazy loading took {elapsed:.2f}s for {result.get('images', 0)} images"
+        + (f", {result['pending']} still pending" if result.get("pending") else "")
+    )
+
+
+def trigger_lazy_loading(page, selector: str) -> float:
+    """
+    Makes the images inside `selector` load and waits for them.
+
+    Args:
+        page (Page): Playwright page with the chapter loaded.
+        selector (str): CSS selector of the image container.
+
+    Returns:
+        float: Seconds spent loading.
+    """
+    start = time.perf_counter()
+    if SETTINGS.STRATEGY == "scroll":
+        page.evaluate(SCROLL_SCRIPT)
+        try:
+            page.wait_for_load_state("networkidle", timeout=10000)
+        except Exception:
+            pass
+        result = {"images": page.locator(f"{selector} img").count()}
+    else:
+        result = page.evaluate(EAGER_LOAD_SCRIPT, _eager_arguments(selector))
+    elapsed = time.perf_counter() - start
+    _report(result, elapsed)
+    return elapsed
+
+
+async def trigger_lazy_loading_async(page, selector: str) -> float:
+    """
+    Async counterpart of `trigger_lazy_loading`.
+    """
+    start = time.perf_counter()
+    if SETTINGS.STRATEGY == "scroll":
+        await page.evaluate(SCROLL_SCRIPT)
+        try:
+            await page.wait_for_load_state("networkidle", timeout=10000)
+        except Exception:
+            pass
+        result = {"images": await page.locator(f"{selector} img").count()}
+    else:
+        result = await page.evaluate(EAGER_LOAD_SCRIPT, _eager_arguments(selector))
+    elapsed = time.perf_counter() - start
+    _report(result, elapsed)
+    return elapsed
+
+
+def write_fixture(directory: str, images: int = 100, height: int = 600) -> str:
+    """
+    Writes a chapter page with `images` lazy images to `directory`.
+
+    Half of the images use `loading="lazy"`, the other half keep their URL
+    in `data-src` and are swapped in by an IntersectionObserver, the way
+    the site's reader does it.
+
+    Returns:
+        str: Path of the HTML file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for i in range(images):
+        Image.new("RGB", (800, height), (i % 256, 80, 160)).save(
+            os.path.join(directory, f"{i:03d}.jpg"), quality=60
+        )
+
+    tags = []
+    for i in range(images):
+        if i % 2:
+            tags.append(f'<img loading="lazy" src="{i:03d}.jpg" height="{height}">')
+        else:
+            tags.append(f'<img class="lazy" data-src="{i:03d}.jpg" height="{height}">')
+
+    html = f"""<!DOCTYPE html>
+<html><body>
+<div class="container-chapter-reader">
+{chr(10).join(tags)}
+</div>
+<script>
+const observer = new IntersectionObserver((entries) => {{
+    for (const entry of entries) {{
+        if (entry.isIntersecting) {{
+            entry.target.src = entry.target.dataset.src;
+            observer.unobserve(entry.target);
+        }}
+    }}
+}});
+document.querySelectorAll("img.lazy").forEach((img) => observer.observe(img));
+</script>
+</body></html>
+"""
+    path = os.path.join(directory, "chapter.html")
+    with open(path, "w") as f:
+        f.write(html)
+    return path
+
+
+if __name__ == "__main__":
+    # Scroll time per chapter of both strategies on a local 100 image page
+    import functools
+    import tempfile
+    import threading
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    from kakalot_scraper.browser.Browser import BrowserSession
+
+    directory = tempfile.mkdtemp(prefix="lazy-fixture-")
+    write_fixture(directory)
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/chapter.html"
+
+    with BrowserSession() as session:
+        for strategy in ["scroll", "eager"]:
+            SETTINGS.STRATEGY = strategy
+            with session.page() as page:
+                page.goto(url, wait_until="domcontentloaded")
+                elapsed = trigger_lazy_loading(page, ".container-chapter-reader")
+                loaded = page.eval_on_selector_all(
+                    ".container-chapter-reader img",
+                    "(imgs) => imgs.filter((img) => img.naturalWidth > 0).length",
+                )
+            print(f"{strategy}: {elapsed:.2f}s, {loaded}/100 images loaded")
+
+    server.shutdown()
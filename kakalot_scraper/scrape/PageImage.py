@@ -0,0 +1,85 @@
+from io import BytesIO
+from typing import Optional
+from PIL import Image
+
+
+class SETTINGS:
+    # PIL format name -> file extension used inside the CBZ
+    EXTENSIONS = {
+        "JPEG": "jpg",
+        "PNG": "png",
+        "WEBP": "webp",
+        "GIF": "gif",
+        "BMP": "bmp",
+        "AVIF": "avif",
+    }
+    DEFAULT_EXTENSION = "jpg"
+
+
+class PageImage:
+    """
+    A single chapter page.
+
+    Downloaded pages keep their original encoded bytes, only the header is
+    read to learn the format and dimensions. Pixels are decoded lazily by
+    `decode()`, which is only needed for pages that get merged or
+    re-encoded.
+    """
+
+    def __init__(
+        self,
+        data: Optional[bytes],
+        src: str = "",
+        image: Optional[Image.Image] = None,
+    ):
+        self.data = data
+        self.src = src
+        self._image = image
+
+        if image is not None:
+            self.format = image.format
+            self.width, self.height = image.size
+        else:
+            # Image.open only parses the header, pixels are not decoded here
+            probe = Image.open(BytesIO(data))
+            self.format = probe.format
+            self.width, self.height = probe.size
+
+    @classmethod
+    def from_image(cls, image: Image.Image, src: str = "") -> "PageImage":
+        """
+        Wraps an already decoded image, e.g. the result of a merge.
+        """
+        return cls(None, src, image)
+
+    @property
+    def has_original(self) -> bool:
+        return self.data is not None
+
+    @property
+    def extension(self) -> str:
+        return SETTINGS.EXTENSIONS.get(self.format or "", SETTINGS.DEFAULT_EXTENSION)
+
+    def decode(self) -> Image.Image:
+        if self._image is None:
+            self._image = Image.open(BytesIO(self.data))
+            self._image.load()
+        return self._image
+
+    def release(self) -> None:
+        """
+        Drops the decoded pixels, the original bytes are kept.
+        """
+        if self.data is not None:
+            self._image = None
+
+    def discard(self) -> None:
+        """
+        Drops the original bytes and the pixels of a page that was already
+        written out, only its format, size and source are kept.
+        """
+        self.data = None
+        self._image = None
+
+    def __repr__(self):
+        return f"PageImage({self.src}, {self.format}, {self.width}x{self.height})"
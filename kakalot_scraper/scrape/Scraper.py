@@ -1,32 +1,63 @@
-from PIL import Image
-from io import BytesIO
-from playwright.sync_api import sync_playwright
-from playwright.sync_api._generated import Page
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlsplit
 from kakalot_scraper import GLOBAL
+from kakalot_scraper.browser.Browser import BrowserSession, open_page
+from kakalot_scraper.browser.Routing import RequestRouter
+from kakalot_scraper.cache.ImageCache import image_cache
+from kakalot_scraper.cbz.Staging import ChapterStaging
+from kakalot_scraper.fastpath.HttpClient import http_client
+from kakalot_scraper.identity.Identity import SETTINGS as IDENTITY_SETTINGS
+from kakalot_scraper.identity.Identity import Identity, current_identity
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.scrape.LazyLoad import (
+    read_image_sources,
+    read_reader_sources,
+    trigger_lazy_loading,
+)
+from kakalot_scraper.scrape.PageImage import PageImage
+from kakalot_scraper.scrape.Stitcher import stitch_pages
+from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RATE_LIMIT_SETTINGS
 
 
 class SETTINGS:
     MINIMUM_IMAGE_WIDTH = 200
     MINIMUM_IMAGE_HEIGHT = 300
     DIV_CLASS_NAME = "container-chapter-reader"
-
-
-def scrape_manga(manga: str, ignore_url_issues: bool = False) -> list[Image.Image]:
+    # User agents come from the identities, this is the one of the default identity
+    USER_AGENT = IDENTITY_SETTINGS.DEFAULT_USER_AGENT
+    # Images the page did not load are downloaded on this many threads,
+    # shared by every chapter, over pooled keep-alive connections
+    FALLBACK_WORKERS = 4
+    FALLBACK_TIMEOUT_SECONDS = 15
+    FALLBACK_RETRIES = 2
+    FALLBACK_RETRY_DELAY_SECONDS = 1.0
+    # Statuses a retry will not change
+    PERMANENT_STATUSES = (401, 403, 404, 410)
+    # Fallback downloads running or waiting ahead of the image being added,
+    # sinks with an in-flight budget of their own use that instead
+    FALLBACK_WINDOW = 16
+
+
+def parse_chapter_url(manga: str, ignore_url_issues: bool = False) -> Optional[str]:
     """
-    Docstring for scrape_manga
+    Validates a chapter URL and extracts the manga name from it.
 
-    :param manga: Description
-    :type manga: str
-    :param ignore_url_issues: Description
-    :type ignore_url_issues: bool
-    :return: Description
-    :rtype: list[Image]
-    """
+    Args:
+        manga (str): The chapter URL.
+        ignore_url_issues (bool): Accept URLs that do not look like a chapter.
 
+    Returns:
+        str | None: The manga name, None when the URL is invalid.
+    """
     parts = manga.split("/")
     if len(parts) < 3 and not ignore_url_issues:
         print(f"Invalid URL: {manga}")
-        return []
+        return None
 
     domain, tmp, manga_name, chapter_id = parts[2:6]
 
@@ -41,39 +72,367 @@ def scrape_manga(manga: str, ignore_url_issues: bool = False) -> list[Image.Imag
 
     if (not manga_name or not chapter_id) and not ignore_url_issues:
         print(f"Invalid manga URL: {manga}")
-        return []
+        return None
 
     if not manga.startswith("http") and not ignore_url_issues:
         print(f"Invalid URL: {manga}")
-        return []
+        return None
+
+    return manga_name
+
+
+def check_image(src: str, image_data: Optional[bytes]) -> Optional[PageImage]:
+    """
+    Probes a downloaded page and applies the minimum size filter.
+
+    Only the image header is read, the pixels are not decoded.
+
+    Args:
+        src (str): Source URL of the image, used for logging.
+        image_data (bytes | None): Raw image bytes.
+
+    Returns:
+        PageImage | None: The page, None when it is missing or too small.
+    """
+    if not image_data:
+        print(f"Could not retrieve data for {src}")
+        return None
+
+    image = PageImage(image_data, src)
+
+    if (
+        image.width >= SETTINGS.MINIMUM_IMAGE_WIDTH
+        and image.height >= SETTINGS.MINIMUM_IMAGE_HEIGHT
+    ) or GLOBAL.TRY_MERGING_SMALLER_IMAGES:
+        return image
+
+    print(f"Image {src} is too small: {image.width}x{image.height}")
+    return None
+
+
+def finalize_images(
+    valid_images: list[tuple[PageImage, str]], manga_name: str
+) -> list[PageImage]:
+    """
+    Merges sliced pages and drops images that do not belong to the manga.
+
+    Args:
+        valid_images (list[tuple[PageImage, str]]): Pages in reading order with their source URL.
+        manga_name (str): Manga name from the chapter URL.
+
+    Returns:
+        list[PageImage]: The final pages of the chapter.
+    """
+    if GLOBAL.TRY_MERGING_SMALLER_IMAGES:
+        if len(valid_images) == 0:
+            print("No valid images found to merge.")
+            return []
+
+        valid_images = stitch_pages(valid_images, SETTINGS.MINIMUM_IMAGE_HEIGHT)
+
+    for i, (img, src) in enumerate(valid_images):
+        print(f"Valid image {i+1}: {src} ({img.width}x{img.height})")
+
+    filtered_images: list[PageImage] = []
+
+    for img, src in valid_images:
+        if manga_name in src:
+            filtered_images.append(img)
+
+    return (
+        filtered_images
+        if len(filtered_images) > 0
+        else [img for img, _ in valid_images]
+    )
+
+
+class PageCollector:
+    """
+    Receives the validated images of a chapter in reading order and turns
+    them into its final pages.
+
+    Every scrape path feeds its images through a collector, this one keeps
+    them until `finish` and then runs finalize_images. See
+    cbz.Stream.ChapterStream for the streaming variant.
+    """
+
+    def __init__(self):
+        self.manga_name = ""
+        self.images: list[tuple[PageImage, str]] = []
+        # Images fetched ahead of the one being added, None leaves it to the fetcher
+        self.max_in_flight: Optional[int] = None
+
+    def begin(self, manga_name: str, sources: list[str]) -> None:
+        """
+        Starts the chapter over, called once its image sources are known.
+        """
+        self.manga_name = manga_name
+        self.images = []
+
+    def add(self, image: PageImage, src: str) -> None:
+        self.images.append((image, src))
+
+    def finish(self) -> list[PageImage]:
+        images, self.images = self.images, []
+        return finalize_images(images, self.manga_name)
+
+
+_fallback_pool: Optional[ThreadPoolExecutor] = None
+_fallback_pool_lock = threading.Lock()
+
+
+def fallback_pool() -> ThreadPoolExecutor:
+    """
+    Thread pool for fallback image downloads, shared by every chapter of the process.
+    """
+    global _fallback_pool
+    with _fallback_pool_lock:
+        if _fallback_pool is None:
+            _fallback_pool = ThreadPoolExecutor(
+                max_workers=SETTINGS.FALLBACK_WORKERS, thread_name_prefix="fallback"
+            )
+        return _fallback_pool
+
+
+def fetch_fallback_image(
+    src: str, headers: dict[str, str], identity: Optional[Identity]
+) -> Optional[bytes]:
+    """
+    Downloads an image the page did not load, retrying timeouts, throttling
+    and server errors.
+
+    Args:
+        src (str): The image URL.
+        headers (dict[str, str]): Referer and cookies of the page.
+        identity (Identity | None): Identity of the page. Pool threads do not
+            see the identity of the caller, so it is passed along.
+
+    Returns:
+        bytes | None: The image, None when every attempt failed.
+    """
+    for attempt in range(SETTINGS.FALLBACK_RETRIES + 1):
+        if attempt:
+            metrics.inc("retries")
+            time.sleep(SETTINGS.FALLBACK_RETRY_DELAY_SECONDS * attempt)
+        try:
+            with metrics.timer("image_fetch"):
+                response = http_client.get(
+                    src,
+                    headers=headers,
+                    cost=RATE_LIMIT_SETTINGS.IMAGE_REQUEST_COST,
+                    identity=identity,
+                    timeout=SETTINGS.FALLBACK_TIMEOUT_SECONDS,
+                )
+        except Exception as e:
+            print(f"Fallback fetch of {src} failed: {e}")
+            continue
+
+        if response.status == 200:
+            image_cache.put(src, response.body)
+            return response.body
+        print(f"Fallback fetch of {src} got HTTP {response.status}.")
+        if response.status in SETTINGS.PERMANENT_STATUSES:
+            break
+    return None
+
+
+class FallbackFetches:
+    """
+    Downloads the images a page did not load on the fallback pool, in page
+    order and at most `window` ahead of the image being processed. Finished
+    downloads wait for `result`, so without the window a chapter whose
+    images were mostly not captured would sit in memory at once.
+
+    The requests carry the cookies the browser context holds for each image
+    host, read in one call per host.
 
-    valid_images: list[tuple[Image.Image, str]] = []
+    Usage:
+        fetches = FallbackFetches(page, missing, referer, identity, window)
+        try:
+            for src in sources:
+                image_data = fetches.result(src) if src in fetches else None
+                ...
+        finally:
+            fetches.cancel()
+    """
 
-    with sync_playwright() as p:
-        # Launch browser (headless=True is faster, but False is better for debugging/stealth)
-        browser = p.chromium.launch(headless=True)
+    def __init__(
+        self,
+        page,
+        sources: list[str],
+        referer: str,
+        identity: Optional[Identity],
+        window: int,
+    ):
+        self.page = page
+        self.referer = referer
+        self.identity = identity
+        self.window = max(1, window)
+        self._queued = deque(dict.fromkeys(sources))
+        self._running: dict[str, Future] = {}
+        self._headers_by_origin: dict[str, dict[str, str]] = {}
+        self._fill()
+
+    def __contains__(self, src: str) -> bool:
+        return src in self._running or src in self._queued
+
+    def _headers(self, src: str) -> dict[str, str]:
+        parts = urlsplit(src)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        headers = self._headers_by_origin.get(origin)
+        if headers is None:
+            headers = {"Referer": self.referer}
+            try:
+                cookies = self.page.context.cookies(origin)
+            except Exception:
+                cookies = []
+            if cookies:
+                headers["Cookie"] = "; ".join(
+                    f"{cookie['name']}={cookie['value']}" for cookie in cookies
+                )
+            self._headers_by_origin[origin] = headers
+        return headers
 
-        # Create a context with a real user agent
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    def _submit(self, src: str) -> Future:
+        return fallback_pool().submit(
+            fetch_fallback_image, src, self._headers(src), self.identity
         )
-        page: Page = context.new_page()
 
-        # Store intercepted image data
+    def _fill(self) -> None:
+        while self._queued and len(self._running) < self.window:
+            src = self._queued.popleft()
+            self._running[src] = self._submit(src)
+
+    def result(self, src: str) -> Optional[bytes]:
+        """
+        Waits for the download of `src` and starts the next one.
+        """
+        future = self._running.pop(src, None)
+        if future is None:
+            self._queued.remove(src)
+            future = self._submit(src)
+        try:
+            return future.result()
+        finally:
+            self._fill()
+
+    def drop(self, src: str) -> None:
+        """
+        Gives up on `src` when it was found elsewhere in the meantime.
+        """
+        future = self._running.pop(src, None)
+        if future is not None:
+            future.cancel()
+        elif src in self._queued:
+            self._queued.remove(src)
+        self._fill()
+
+    def cancel(self) -> None:
+        self._queued.clear()
+        for future in self._running.values():
+            future.cancel()
+        self._running = {}
+
+
+def fetch_with_page(page, src: str) -> Optional[bytes]:
+    """
+    Downloads an image through the browser context, the last resort for
+    images the fallback pool could not get.
+    """
+    rate_limiter.acquire(src, RATE_LIMIT_SETTINGS.IMAGE_REQUEST_COST)
+    with metrics.timer("image_fetch"):
+        response = page.request.get(
+            src, timeout=SETTINGS.FALLBACK_TIMEOUT_SECONDS * 1000
+        )
+    rate_limiter.record_status(src, response.status)
+    if response.status != 200:
+        return None
+    image_data = response.body()
+    metrics.inc("bytes_downloaded", len(image_data))
+    image_cache.put(src, image_data)
+    return image_data
+
+
+def scrape_manga(
+    manga: str,
+    ignore_url_issues: bool = False,
+    session: Optional[BrowserSession] = None,
+    staging: Optional[ChapterStaging] = None,
+    sink: Optional[PageCollector] = None,
+) -> list[PageImage]:
+    """
+    Docstring for scrape_manga
+
+    :param manga: Description
+    :type manga: str
+    :param ignore_url_issues: Description
+    :type ignore_url_issues: bool
+    :param session: Shared browser session, a new browser is launched when None
+    :type session: BrowserSession | None
+    :param staging: Checkpoint of the chapter, staged pages are not fetched again
+    :type staging: ChapterStaging | None
+    :param sink: Receives the validated images, a PageCollector when None
+    :type sink: PageCollector | None
+    :return: Description
+    :rtype: list[PageImage]
+    """
+
+    manga_name = parse_chapter_url(manga, ignore_url_issues)
+    if manga_name is None:
+        return []
+
+    sink = sink or PageCollector()
+
+    # The context gets the user agent and proxy of an identity
+    with open_page(session) as page:
+        # Response callbacks do not run in the context the identity is set in
+        identity = current_identity()
+
+        # Store intercepted image data, once the reader container is known
+        # only the bodies of its images are kept
         captured_images = {}
+        reader_sources: Optional[set[str]] = None
 
         def handle_response(response):
             try:
                 if response.request.resource_type == "image":
-                    captured_images[response.url] = response.body()
+                    if response.status in RATE_LIMIT_SETTINGS.THROTTLE_STATUSES:
+                        rate_limiter.record_status(
+                            response.url, response.status, identity
+                        )
+                        return
+                    if (
+                        reader_sources is not None
+                        and response.url not in reader_sources
+                    ):
+                        return
+                    body = response.body()
+                    metrics.inc("bytes_downloaded", len(body))
+                    # Spooled to the disk cache, bodies only stay in memory
+                    # when the cache is off
+                    if response.status == 200 and image_cache.put(response.url, body):
+                        return
+                    captured_images[response.url] = body
             except Exception:
                 pass
 
         page.on("response", handle_response)
 
+        # Drop ads, trackers, fonts etc. and account for what is left
+        router = RequestRouter(manga, cache=image_cache)
+        router.attach(page)
+
         try:
+            rate_limiter.acquire(manga)
             print(f"Navigating to {manga}...")
-            page.goto(manga, wait_until="domcontentloaded")
+            with metrics.timer("navigate"):
+                response = page.goto(manga, wait_until="domcontentloaded")
+            if (
+                response is not None
+                and response.status in RATE_LIMIT_SETTINGS.THROTTLE_STATUSES
+            ):
+                rate_limiter.record_failure(manga, f"HTTP {response.status}")
+                return []
 
             # Wait for the container to appear (handles JS loading)
             try:
@@ -82,135 +441,89 @@ def scrape_manga(manga: str, ignore_url_issues: bool = False) -> list[Image.Imag
                 print(
                     "Timeout waiting for content container. The page might not have loaded correctly or the class name changed."
                 )
-                browser.close()
+                rate_limiter.record_failure(manga, "container timeout")
                 return []
 
-            # Scroll to bottom to trigger lazy loading
-            print("Scrolling to load images...")
-            page.evaluate(
-                """
-                async () => {
-                    await new Promise((resolve) => {
-                        let totalHeight = 0;
-                        const distance = 100;
-                        const timer = setInterval(() => {
-                            const scrollHeight = document.body.scrollHeight;
-                            window.scrollBy(0, distance);
-                            totalHeight += distance;
-
-                            if(totalHeight >= scrollHeight){
-                                clearInterval(timer);
-                                resolve();
-                            }
-                        }, 100);
-                    });
-                }
-            """
+            reader_sources = read_reader_sources(page, f".{SETTINGS.DIV_CLASS_NAME}")
+            for url in list(captured_images):
+                if url not in reader_sources:
+                    del captured_images[url]
+
+            # Make the lazy images load and wait until each one settled
+            print("Loading images...")
+            trigger_lazy_loading(page, f".{SETTINGS.DIV_CLASS_NAME}")
+
+            # All sources in one round trip instead of one per image
+            sources = read_image_sources(page, f".{SETTINGS.DIV_CLASS_NAME}")
+
+            print(f"Found {len(sources)} potential images.")
+            if staging is not None:
+                staging.set_sources(sources)
+            sink.begin(manga_name, sources)
+
+            # Images that are not staged, captured or cached are downloaded
+            # concurrently while the others are processed in page order
+            missing = [
+                src
+                for src in dict.fromkeys(sources)
+                if not (staging is not None and staging.has_page(src))
+                and src not in captured_images
+                and not image_cache.contains(src)
+            ]
+            if missing:
+                print(
+                    f"{len(missing)} images not found in captured responses, "
+                    "fetching them..."
+                )
+            fetches = FallbackFetches(
+                page,
+                missing,
+                manga,
+                identity,
+                sink.max_in_flight or SETTINGS.FALLBACK_WINDOW,
             )
 
-            # Wait for network to settle
             try:
-                page.wait_for_load_state("networkidle", timeout=10000)
-            except:
-                pass
-
-            # Find all images in the container
-            container = page.locator(f".{SETTINGS.DIV_CLASS_NAME}")
-            images = container.locator("img").all()
-
-            print(f"Found {len(images)} potential images.")
-
-            for img in images:
-                src = img.get_attribute("src")
-                if not src:
-                    continue
-
-                try:
-                    # Try to get from captured responses first
-                    image_data = captured_images.get(src)
-
-                    if not image_data:
-                        print(
-                            f"Image {src} not found in captured responses, trying fallback..."
-                        )
-                        # Fallback: Try to fetch using page context if not captured
-                        response = page.request.get(src)
-                        if response.status == 200:
-                            image_data = response.body()
-
-                    if image_data:
-                        image = Image.open(BytesIO(image_data))
-
-                        if (
-                            image.width >= SETTINGS.MINIMUM_IMAGE_WIDTH
-                            and image.height >= SETTINGS.MINIMUM_IMAGE_HEIGHT
-                        ) or GLOBAL.TRY_MERGING_SMALLER_IMAGES:
-                            valid_images.append((image, src))
-
-                        else:
-                            print(
-                                f"Image {src} is too small: {image.width}x{image.height}"
-                            )
-
-                    else:
-                        print(f"Could not retrieve data for {src}")
-
-                except Exception as e:
-                    print(f"Error processing image {src}: {e}")
-                    continue
+                for src in sources:
+                    try:
+                        # Checkpoint and captured responses first, then the
+                        # fallback download, the cache and the page itself
+                        staged_data = staging.load_page(src) if staging else None
+                        image_data = staged_data or captured_images.pop(src, None)
+                        if src in fetches:
+                            if image_data:
+                                fetches.drop(src)
+                            else:
+                                image_data = fetches.result(src)
+                        if not image_data:
+                            image_data = image_cache.get(src)
+                        if not image_data:
+                            image_data = fetch_with_page(page, src)
+
+                        if staging is not None and image_data and not staged_data:
+                            staging.save_page(src, image_data)
+
+                        image = check_image(src, image_data)
+                        if image is not None:
+                            sink.add(image, src)
+
+                    except Exception as e:
+                        print(f"Error processing image {src}: {e}")
+                        continue
+            finally:
+                fetches.cancel()
 
         except Exception as e:
             print(f"An error occurred: {e}")
         finally:
-            browser.close()
+            router.report(manga)
 
-    if GLOBAL.TRY_MERGING_SMALLER_IMAGES:
-        if len(valid_images) == 0:
-            print("No valid images found to merge.")
-            return []
-
-        merge_count = 0
-        i = 1
-        while i < len(valid_images):
-            img, src = valid_images[i]
-            prev_img, prev_src = valid_images[i - 1]
-
-            if img.height < SETTINGS.MINIMUM_IMAGE_HEIGHT:
-                if img.width == prev_img.width:
-                    print(
-                        f"Merging image {src}, into previous image due to small height."
-                    )
-                    new_height = prev_img.height + img.height
-                    merged_img = Image.new("RGB", (img.width, new_height))
-                    merged_img.paste(prev_img, (0, 0))
-                    merged_img.paste(img, (0, prev_img.height))
-                    valid_images[i - 1] = (merged_img, prev_src)
-                    valid_images.pop(i)
-                    merge_count += 1
-                else:
-                    print(
-                        f"Cannot merge image, {src}, due to width mismatch. Skipping."
-                    )
-                    valid_images.pop(i)
-                continue
-            i += 1
-
-        print(f"Merged {merge_count} images due to small sizes.")
-
-    for i, (img, src) in enumerate(valid_images):
-        print(f"Valid image {i+1}: {src} ({img.width}x{img.height})")
-
-    filtered_images: list[Image.Image] = []
-
-    for img, src in valid_images:
-        if manga_name in src:
-            filtered_images.append(img)
-
-    return (
-        filtered_images
-        if len(filtered_images) > 0
-        else [img for img, _ in valid_images]
-    )
+    pages = sink.finish()
+    if pages:
+        rate_limiter.record_success(manga, identity)
+    else:
+        rate_limiter.record_failure(manga, "no images", identity)
+    return pages
 
 
 if __name__ == "__main__":
@@ -220,7 +533,7 @@ if __name__ == "__main__":
 
     for i, img in enumerate(images):
         print(f"Showing image {i+1}")
-        img.show()
+        img.decode().show()
         a = input("Press Enter to continue or 'q' to quit: ")
         if a == "q":
             break
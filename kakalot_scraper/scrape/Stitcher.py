@@ -0,0 +1,235 @@
+from typing import Callable, Optional
+from PIL import Image
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.scrape.PageImage import PageImage
+
+
+class SETTINGS:
+    # Stitched pages are split once they would grow past this height, None disables the cap
+    MAX_STITCHED_HEIGHT: Optional[int] = 12000
+
+
+def _resolve_max_height(max_height: Optional[int]) -> Optional[int]:
+    """
+    SETTINGS.MAX_STITCHED_HEIGHT when `max_height` is None, read at call time
+    so changes made after import apply. 0 disables the cap.
+    """
+    if max_height is None:
+        max_height = SETTINGS.MAX_STITCHED_HEIGHT
+    return max_height or None
+
+
+def group_slices(
+    pages: list[tuple[PageImage, str]],
+    min_height: int,
+    max_height: Optional[int] = None,
+) -> list[list[tuple[PageImage, str]]]:
+    """
+    Groups sliced pages into runs that should be stitched together.
+
+    A run starts at any page and takes every following slice shorter than
+    `min_height` with the same width. Slices of a different width are
+    dropped, a slice that would push the run past `max_height` starts a new
+    run instead.
+
+    Args:
+        pages (list[tuple[PageImage, str]]): Pages in reading order with their source URL.
+        min_height (int): Pages shorter than this are treated as slices.
+        max_height (int | None): Maximum height of a stitched page,
+            SETTINGS.MAX_STITCHED_HEIGHT when None, 0 disables the cap.
+
+    Returns:
+        list[list[tuple[PageImage, str]]]: The runs, in reading order.
+    """
+    max_height = _resolve_max_height(max_height)
+    groups: list[list[tuple[PageImage, str]]] = []
+    group_height = 0
+
+    for page, src in pages:
+        if groups and page.height < min_height:
+            head, _ = groups[-1][0]
+            if page.width != head.width:
+                print(f"Cannot merge image, {src}, due to width mismatch. Skipping.")
+                continue
+            if max_height is None or group_height + page.height <= max_height:
+                groups[-1].append((page, src))
+                group_height += page.height
+                continue
+
+        groups.append([(page, src)])
+        group_height = page.height
+
+    return groups
+
+
+def stitch_group(group: list[tuple[PageImage, str]]) -> tuple[PageImage, str]:
+    """
+    Stitches a run of slices into a single page.
+
+    The output canvas is allocated once at its final size, single page runs
+    are returned untouched so they are never decoded.
+    """
+    head, head_src = group[0]
+    if len(group) == 1:
+        return head, head_src
+
+    with metrics.timer("decode_merge"):
+        total_height = sum(page.height for page, _ in group)
+        canvas = Image.new("RGB", (head.width, total_height))
+
+        offset = 0
+        for page, _ in group:
+            canvas.paste(page.decode(), (0, offset))
+            offset += page.height
+            page.release()
+
+    return PageImage.from_image(canvas, head_src), head_src
+
+
+def stitch_pages(
+    pages: list[tuple[PageImage, str]],
+    min_height: int,
+    max_height: Optional[int] = None,
+) -> list[tuple[PageImage, str]]:
+    """
+    Stitches consecutive slices of a chapter in a single pass.
+
+    Args:
+        pages (list[tuple[PageImage, str]]): Pages in reading order with their source URL.
+        min_height (int): Pages shorter than this are treated as slices.
+        max_height (int | None): Maximum height of a stitched page,
+            SETTINGS.MAX_STITCHED_HEIGHT when None, 0 disables the cap.
+
+    Returns:
+        list[tuple[PageImage, str]]: The stitched pages with the source URL of their first slice.
+    """
+    groups = group_slices(pages, min_height, max_height)
+    merge_count = sum(len(group) - 1 for group in groups)
+    print(f"Merged {merge_count} images due to small sizes.")
+    return [stitch_group(group) for group in groups]
+
+
+class SliceStitcher:
+    """
+    Incremental stitch_pages for streaming.
+
+    Pages are fed in reading order with `add`, a finished page is handed to
+    `on_page(page, src, slice_count)` as soon as the next page cannot extend
+    it. At most `max_pages` slices are held at a time, a longer run is split.
+    """
+
+    def __init__(
+        self,
+        on_page: Callable[[PageImage, str, int], None],
+        min_height: int,
+        max_height: Optional[int] = None,
+        max_pages: Optional[int] = None,
+    ):
+        self.on_page = on_page
+        self.min_height = min_height
+        self.max_height = _resolve_max_height(max_height)
+        self.max_pages = max_pages
+        self.merge_count = 0
+        self._group: list[tuple[PageImage, str]] = []
+        self._group_height = 0
+
+    @property
+    def held(self) -> int:
+        """
+        Slices held for the page that is being stitched.
+        """
+        return len(self._group)
+
+    def add(self, page: PageImage, src: str) -> None:
+        if self._group and page.height < self.min_height:
+            head, _ = self._group[0]
+            if page.width != head.width:
+                print(f"Cannot merge image, {src}, due to width mismatch. Skipping.")
+                return
+            fits = (
+                self.max_height is None
+                or self._group_height + page.height <= self.max_height
+            )
+            if fits and (self.max_pages is None or len(self._group) < self.max_pages):
+                self._group.append((page, src))
+                self._group_height += page.height
+                self.merge_count += 1
+                return
+
+        self.flush()
+        self._group = [(page, src)]
+        self._group_height = page.height
+
+    def flush(self) -> None:
+        """
+        Hands the page that is still being stitched to `on_page`.
+        """
+        if not self._group:
+            return
+        group = self._group
+        self._group = []
+        self._group_height = 0
+        self.on_page(*stitch_group(group), len(group))
+
+
+def _pairwise_merge(
+    pages: list[tuple[Image.Image, str]], min_height: int
+) -> list[tuple[Image.Image, str]]:
+    """
+    The previous merge loop, kept for the benchmark below.
+    """
+    pages = list(pages)
+    i = 1
+    while i < len(pages):
+        img, src = pages[i]
+        prev_img, prev_src = pages[i - 1]
+        if img.height < min_height:
+            if img.width == prev_img.width:
+                merged_img = Image.new("RGB", (img.width, prev_img.height + img.height))
+                merged_img.paste(prev_img, (0, 0))
+                merged_img.paste(img, (0, prev_img.height))
+                pages[i - 1] = (merged_img, prev_src)
+            pages.pop(i)
+            continue
+        i += 1
+    return pages
+
+
+if __name__ == "__main__":
+    import time
+    from io import BytesIO
+
+    STRIP_COUNT = 80
+    STRIP_WIDTH = 800
+    STRIP_HEIGHT = 250
+    MIN_HEIGHT = 300
+
+    def make_strip(i: int) -> bytes:
+        buffer = BytesIO()
+        Image.new("RGB", (STRIP_WIDTH, STRIP_HEIGHT), (i * 3 % 256, 0, 0)).save(
+            buffer, format="JPEG"
+        )
+        return buffer.getvalue()
+
+    strips = [make_strip(i) for i in range(STRIP_COUNT)]
+    print(f"{STRIP_COUNT} strips of {STRIP_WIDTH}x{STRIP_HEIGHT}")
+
+    decoded = [
+        (PageImage(data, str(i)).decode(), str(i)) for i, data in enumerate(strips)
+    ]
+    start = time.perf_counter()
+    result = _pairwise_merge(decoded, MIN_HEIGHT)
+    legacy = time.perf_counter() - start
+    print(f"Pairwise merge: {legacy * 1000:.1f} ms, {len(result)} page(s)")
+
+    for max_height in (0, SETTINGS.MAX_STITCHED_HEIGHT):
+        pages = [(PageImage(data, str(i)), str(i)) for i, data in enumerate(strips)]
+        for page, _ in pages:
+            page.decode()
+        start = time.perf_counter()
+        result = stitch_pages(pages, MIN_HEIGHT, max_height)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Single pass (max height {max_height}): {elapsed * 1000:.1f} ms, "
+            f"{len(result)} page(s), {legacy / elapsed:.1f}x faster"
+        )
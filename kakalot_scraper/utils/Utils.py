@@ -2,10 +2,11 @@ import os
 import kakalot_scraper
 from urllib.parse import urlparse
 import time
-import tqdm as tqdm
 
 
 def sleep_seconds(seconds: int) -> None:
+    import tqdm
+
     for _ in tqdm.tqdm(range(seconds), desc="Waiting", unit="s"):
         time.sleep(1)
 
@@ -36,11 +37,13 @@ def load_urls_from_file(file_path: str) -> list[str]:
 
     with open(file_path, "r") as f:
         lines = [line.strip() for line in f if line.strip()]
-    lines = list(set(lines))  # Remove duplicates
+    lines = list(dict.fromkeys(lines))  # Remove duplicates, keep the file order
 
+    urls = []
     for line in lines:
         if not is_valid_url(line):
             print(f"Invalid URL in list, skipping: {line}")
-            lines.remove(line)
+            continue
+        urls.append(line)
 
-    return lines
+    return urls
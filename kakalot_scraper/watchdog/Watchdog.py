@@ -1,37 +1,120 @@
 from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+from typing import Optional
+from kakalot_scraper.utils.Utils import load_urls_from_file
 import kakalot_scraper
 import threading
 import os
 
+
+class SETTINGS:
+    # Editors often write a file several times per save, wait for quiet
+    DEBOUNCE_SECONDS = 2.0
+    # Poll instead of inotify, e.g. for files bind-mounted from another OS
+    USE_POLLING = False
+
+
 wake_up_event = threading.Event()
 
 
 class Handler(FileSystemEventHandler):
+    """
+    Watches the URL list and works out which series were added or removed.
+
+    Bursts of events are debounced, then the file is reloaded and compared
+    with the last known URLs. The difference is collected until
+    `pop_changes` is called and `wake_up_event` is set.
+    """
+
+    def __init__(self, urls: Optional[list[str]] = None):
+        super().__init__()
+        self.known = set(urls or [])
+        self._added: set[str] = set()
+        self._removed: set[str] = set()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
     def trigger_scrape(self):
-        print("File change detected, triggering scrape...")
-        global wake_up_event
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(SETTINGS.DEBOUNCE_SECONDS, self.reload)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self) -> None:
+        """
+        Drops a pending reload, once the observer has stopped.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def reload(self) -> None:
+        urls = set(load_urls_from_file(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH))
+        with self._lock:
+            added = urls - self.known
+            removed = self.known - urls
+            self.known = urls
+            # A URL removed and added back before the changes were picked up cancels out
+            self._added = (self._added - removed) | added
+            self._removed = (self._removed - added) | removed
+            changed = bool(added or removed)
+
+        if not changed:
+            print("URL list saved without changes.")
+            return
+        print(
+            f"URL list changed: {len(added)} added, {len(removed)} removed, "
+            "triggering scrape..."
+        )
         wake_up_event.set()
 
+    def pop_changes(self) -> tuple[list[str], list[str]]:
+        """
+        Returns and forgets the URLs added and removed since the last call.
+        """
+        with self._lock:
+            added, removed = sorted(self._added), sorted(self._removed)
+            self._added, self._removed = set(), set()
+        return added, removed
+
     def _is_target_file(self, path):
         # Normalize paths to ensure accurate comparison
-        print(f"Detected file event on: {path}")
         target_path = os.path.abspath(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
         event_path = os.path.abspath(path)
         return event_path == target_path
 
     def on_created(self, event):
-        print(f"File created: {event.src_path}")
         if self._is_target_file(event.src_path):
+            print(f"File created: {event.src_path}")
             self.trigger_scrape()
 
     def on_modified(self, event):
-        print(f"File modified: {event.src_path}")
         if self._is_target_file(event.src_path):
+            print(f"File modified: {event.src_path}")
             self.trigger_scrape()
 
     def on_moved(self, event):
-        print(f"File moved: {event.src_path} to {event.dest_path}")
         if self._is_target_file(event.src_path) or self._is_target_file(
             event.dest_path
         ):
+            print(f"File moved: {event.src_path} to {event.dest_path}")
             self.trigger_scrape()
+
+
+def make_observer(handler: Handler):
+    """
+    Schedules `handler` on the directory of the URL list.
+
+    Uses the native observer of the platform (inotify on Linux), which
+    watchdog replaces with polling itself where none is available.
+    """
+    observer = PollingObserver() if SETTINGS.USE_POLLING else Observer()
+    directory = os.path.dirname(
+        os.path.abspath(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
+    )
+    observer.schedule(handler, path=directory, recursive=False)
+    return observer
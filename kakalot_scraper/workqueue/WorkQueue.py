@@ -0,0 +1,255 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import kakalot_scraper
+from kakalot_scraper.metrics.Metrics import metrics
+
+
+class SETTINGS:
+    QUEUE_FILE_NAME = ".work_queue.db"
+    # A lease that is not renewed for this long belongs to a dead worker
+    LEASE_SECONDS = 300
+    HEARTBEAT_INTERVAL_SECONDS = 60
+    SQLITE_TIMEOUT_SECONDS = 30
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    series TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    claimed_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    PRIMARY KEY (series, chapter)
+);
+"""
+
+
+def worker_id() -> str:
+    """
+    Name of this worker, unique across the containers sharing a volume.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Chapter leases shared by every worker scraping into the same library.
+
+    Before a worker scrapes a chapter it claims `(series, chapter)`, a claim
+    fails while another worker holds a live lease on it. Leases are renewed
+    by a heartbeat thread and released once the chapter is saved or given
+    up on. A worker that dies stops renewing, and after `lease_seconds` its
+    chapters can be claimed again.
+
+    The queue lives in SQLite next to the library, so it works for worker
+    processes and for containers sharing the volume, but not over NFS.
+    Claims are no-ops that always succeed unless GLOBAL.USE_WORK_QUEUE is set.
+
+    Usage:
+        if work_queue.claim(slug, chapter_num):
+            try:
+                ...
+            finally:
+                work_queue.release(slug, chapter_num)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        owner: Optional[str] = None,
+        lease_seconds: float = SETTINGS.LEASE_SECONDS,
+    ):
+        self.path = path
+        self.owner = owner or worker_id()
+        self.lease_seconds = lease_seconds
+        self.claimed = 0
+        self.reclaimed = 0
+        self.skipped = 0
+        self._owned: set[tuple[str, str]] = set()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keeper: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return kakalot_scraper.GLOBAL.USE_WORK_QUEUE
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            path = self.path or os.path.join(
+                kakalot_scraper.GLOBAL.SAVE_ROOT, SETTINGS.QUEUE_FILE_NAME
+            )
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Transactions are opened explicitly, claims need BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(
+                path,
+                timeout=SETTINGS.SQLITE_TIMEOUT_SECONDS,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _start_keeper(self) -> None:
+        if self._keeper is None:
+            self._stop.clear()
+            self._keeper = threading.Thread(target=self._keep, daemon=True)
+            self._keeper.start()
+
+    def _keep(self) -> None:
+        while not self._stop.wait(SETTINGS.HEARTBEAT_INTERVAL_SECONDS):
+            self.renew()
+
+    def claim(self, series: str, chapter: str) -> bool:
+        """
+        Takes the lease on a chapter, False when another worker holds it.
+        """
+        if not self.enabled:
+            return True
+
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT owner, expires, attempts FROM leases WHERE series = ? AND chapter = ?",
+                    (series, chapter),
+                ).fetchone()
+                if row is not None and row[0] != self.owner and row[1] > now:
+                    conn.execute("ROLLBACK")
+                    self.skipped += 1
+                    return False
+
+                attempts = 1
+                if row is not None and row[0] != self.owner:
+                    attempts = row[2] + 1
+                    print(
+                        f"Reclaiming {series} chapter {chapter} from {row[0]}, "
+                        "its lease expired."
+                    )
+                    self.reclaimed += 1
+                    metrics.inc("leases_reclaimed")
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases "
+                    "(series, chapter, owner, expires, claimed_at, attempts) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        series,
+                        chapter,
+                        self.owner,
+                        now + self.lease_seconds,
+                        now,
+                        attempts,
+                    ),
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                print(f"Could not claim {series} chapter {chapter}: {e}")
+                return False
+
+            self._owned.add((series, chapter))
+            self.claimed += 1
+            self._start_keeper()
+        return True
+
+    def release(self, series: str, chapter: str) -> None:
+        """
+        Drops the lease on a chapter, once it is saved or given up on.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._owned.discard((series, chapter))
+            try:
+                self._connect().execute(
+                    "DELETE FROM leases WHERE series = ? AND chapter = ? AND owner = ?",
+                    (series, chapter, self.owner),
+                )
+            except sqlite3.Error as e:
+                # The lease runs out on its own
+                print(f"Could not release {series} chapter {chapter}: {e}")
+
+    def release_all(self) -> None:
+        for series, chapter in list(self._owned):
+            self.release(series, chapter)
+
+    def renew(self) -> None:
+        """
+        Extends every lease of this worker, the heartbeat calls this.
+        """
+        with self._lock:
+            if not self._owned:
+                return
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "UPDATE leases SET expires = ? WHERE owner = ?",
+                    (time.time() + self.lease_seconds, self.owner),
+                )
+                held = set(
+                    conn.execute(
+                        "SELECT series, chapter FROM leases WHERE owner = ?",
+                        (self.owner,),
+                    ).fetchall()
+                )
+            except sqlite3.Error as e:
+                print(f"Could not renew leases: {e}")
+                return
+
+            # Taken over after a missed heartbeat, the other worker writes
+            # the same file so the chapter is finished anyway
+            for series, chapter in self._owned - held:
+                print(f"Lost the lease on {series} chapter {chapter}.")
+            self._owned &= held
+
+    def active(self, series: str) -> int:
+        """
+        Number of live leases on chapters of `series`, by any worker.
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            try:
+                return (
+                    self._connect()
+                    .execute(
+                        "SELECT COUNT(*) FROM leases WHERE series = ? AND expires > ?",
+                        (series, time.time()),
+                    )
+                    .fetchone()[0]
+                )
+            except sqlite3.Error as e:
+                print(f"Could not read leases of {series}: {e}")
+                return 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "claimed": self.claimed,
+            "reclaimed": self.reclaimed,
+            "skipped": self.skipped,
+            "held": len(self._owned),
+        }
+
+    def close(self) -> None:
+        self.release_all()
+        self._stop.set()
+        if self._keeper is not None:
+            self._keeper.join()
+            self._keeper = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+work_queue = WorkQueue()
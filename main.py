@@ -1,30 +1,51 @@
 import kakalot_scraper
-from kakalot_scraper.manager.Manager import MangaInfo
-from kakalot_scraper.scrape.Scraper import scrape_manga
-from kakalot_scraper.cbz.Generator import *
-from kakalot_scraper.manager.Manager import *
-from kakalot_scraper.utils.Utils import *
-
-from kakalot_scraper.watchdog.Watchdog import Handler, wake_up_event
-from watchdog.observers.polling import PollingObserver as Observer
+from kakalot_scraper.manager.Manager import MangaInfo, get_manga_name
+from kakalot_scraper.utils.Utils import check_paths, load_urls_from_file
+from kakalot_scraper.library.Library import LibraryIndex, chapter_exists
+from kakalot_scraper.cbz.Naming import get_cbz_path
+from kakalot_scraper.cbz.Staging import ChapterStaging, sweep_stale_files
+from kakalot_scraper.cli.Commands import run_command
+from kakalot_scraper.cli.Commands import SETTINGS as CommandSettings
+from kakalot_scraper.identity.Identity import identity_pool
+from kakalot_scraper.identity.Identity import SETTINGS as IdentitySettings
+from kakalot_scraper.scheduler.Scheduler import Heartbeat, SeriesScheduler
+from kakalot_scraper.scheduler.Scheduler import SETTINGS as SchedulerSettings
+from kakalot_scraper.metrics.Metrics import metrics
+from kakalot_scraper.metrics.Metrics import SETTINGS as MetricsSettings
+from kakalot_scraper.workqueue.WorkQueue import work_queue
 
 import time
 import argparse
 import os
+import sys
+from typing import TYPE_CHECKING
+
+# Playwright, Pillow and watchdog are imported by the functions that scrape
+# or encode, so the subcommands and --help start without them
+if TYPE_CHECKING:
+    from kakalot_scraper.browser.Browser import BrowserSession
+    from kakalot_scraper.pipeline.Pipeline import ChapterPipeline
+
+
+def scrape_manga_and_save(
+    url: str,
+    full_reset: bool = False,
+    session: "BrowserSession | None" = None,
+    pipeline: "ChapterPipeline | None" = None,
+    index: LibraryIndex | None = None,
+):
+    from kakalot_scraper.cbz.Generator import CbzWriter, generate_cbz
+    from kakalot_scraper.cbz.Stream import ChapterStream
+    from kakalot_scraper.dedupe.Dedupe import page_hashes
+    from kakalot_scraper.fastpath.FastPath import (
+        load_chapter_images,
+        load_series_snapshot,
+    )
 
-
-def scrape_manga_and_save(url: str, full_reset: bool = False):
     print(f"Scraping manga from URL: {url}")
-    chapters: list[tuple[str, str]] = get_chapters_list(url=url)
-    chapters.reverse()
-    print(f"Found {len(chapters)} chapters.")
-    for chapter_num, chapter_url in chapters:
-        print(f"Chapter {chapter_num}: {chapter_url}")
-    print("Waiting before fetching manga info...")
-    sleep_seconds(5)
     fail_count = 0
     while True:
-        manga_info: MangaInfo = get_manga_info(url=url)
+        manga_info, chapters = load_series_snapshot(url=url, session=session)
         print("Fetched manga info, performing healthcheck...")
         if manga_info.healthcheck():
             break
@@ -32,13 +53,28 @@ def scrape_manga_and_save(url: str, full_reset: bool = False):
         if fail_count >= 3:
             print("Maximum retries reached. Exiting.")
             return
-        print("Manga info healthcheck failed, retrying in 20 seconds...")
-        sleep_seconds(20)
+        # The rate limiter has already backed off, so the retry is paced by it
+        metrics.inc("retries")
+        print("Manga info healthcheck failed, retrying...")
 
-    print(f"Manga Information:")
+    chapters.reverse()
+    print(f"Found {len(chapters)} chapters.")
+    for chapter_num, chapter_url in chapters:
+        print(f"Chapter {chapter_num}: {chapter_url}")
+
+    print("Manga Information:")
     print(manga_info)
-    print("Waiting before processing chapters...")
-    sleep_seconds(10)
+
+    save_root = kakalot_scraper.GLOBAL.SAVE_ROOT
+    slug = get_manga_name(url)
+    if index is not None:
+        unchanged = not full_reset and index.is_unchanged(manga_info, chapters)
+        # Also records when the series was checked, for the scheduler
+        index.update_series(manga_info, len(chapters), save_root)
+        # Other workers may have recorded the series while still scraping it
+        if unchanged and not work_queue.active(slug):
+            print(f"{manga_info.title} has not changed since the last check, skipping.")
+            return
 
     full_reset = False
     ret_count = 0
@@ -46,88 +82,341 @@ def scrape_manga_and_save(url: str, full_reset: bool = False):
     while i < len(chapters):
         (chapter_num, chapter_url) = chapters[i]
 
-        cbz_path = get_cbz_path(
-            manga_info, chapter_num, kakalot_scraper.GLOBAL.SAVE_ROOT
-        )
-        if os.path.exists(cbz_path) and not full_reset:
+        if index is not None:
+            exists = chapter_exists(index, manga_info, chapter_num, save_root)
+        else:
+            exists = os.path.exists(get_cbz_path(manga_info, chapter_num, save_root))
+        if exists and not full_reset:
+            print(f"Chapter {chapter_num} already exists, skipping...")
+            i += 1
+            continue
+
+        if not work_queue.claim(slug, chapter_num):
+            print(f"Chapter {chapter_num} is claimed by another worker, skipping...")
+            i += 1
+            continue
+        # Another worker may have saved it between the check and the claim
+        if work_queue.enabled and os.path.exists(
+            get_cbz_path(manga_info, chapter_num, save_root)
+        ):
+            work_queue.release(slug, chapter_num)
             print(f"Chapter {chapter_num} already exists, skipping...")
             i += 1
             continue
 
         print(f"Chapter {chapter_num}: {chapter_url}")
-        images = scrape_manga(chapter_url)
+        staging = ChapterStaging(chapter_url, save_root)
+        dedupe = page_hashes.for_chapter(manga_info, chapter_num, save_root)
+        stream = None
+        if kakalot_scraper.GLOBAL.STREAM_CHAPTERS and pipeline is None:
+            stream = ChapterStream(
+                CbzWriter(manga_info, chapter_num, save_root), dedupe=dedupe
+            )
+        images = load_chapter_images(
+            chapter_url, session=session, staging=staging, sink=stream
+        )
         if not images:
+            if stream is not None:
+                stream.abort()
             print(
                 f"No valid images found for Chapter {chapter_num}, assuming rate limit."
             )
-            print("Waiting 15 seconds before retrying...")
-            sleep_seconds(15)
             ret_count += 1
+            metrics.inc("retries")
             if ret_count >= 3:
                 print("Maximum retries reached. Exiting.")
+                work_queue.release(slug, chapter_num)
                 break
             i -= 1
             continue
 
         print(f"Scraped {len(images)} valid images for Chapter {chapter_num}.")
-        generate_cbz(manga_info, chapter_num, images, kakalot_scraper.GLOBAL.SAVE_ROOT)
+        if dedupe is not None:
+            if stream is None:
+                images = dedupe.filter(images)
+            dedupe.commit()
+        if pipeline is not None:
+            pipeline.submit(manga_info, chapter_num, images, save_root, staging)
+        else:
+            if stream is not None:
+                cbz_path = stream.commit()
+            else:
+                cbz_path = generate_cbz(manga_info, chapter_num, images, save_root)
+            staging.clear()
+            if index is not None:
+                index.add_chapter(slug, chapter_num, cbz_path)
+            work_queue.release(slug, chapter_num)
 
         ret_count = 0
         i += 1
 
-        print("Waiting 15 seconds before next chapter...")
-        sleep_seconds(15)
 
+def make_pipeline(encode_workers: int, index: LibraryIndex) -> "ChapterPipeline | None":
+    if encode_workers <= 0:
+        return None
+    from kakalot_scraper.pipeline.Pipeline import ChapterPipeline
 
-def scrape_all(full_reset: bool = False) -> None:
-    urls = load_urls_from_file(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
+    def on_written(manga_info: MangaInfo, chapter_num: str, cbz_path: str) -> None:
+        slug = get_manga_name(manga_info.url)
+        index.add_chapter(slug, chapter_num, cbz_path)
+        work_queue.release(slug, chapter_num)
+
+    return ChapterPipeline(encode_workers, on_written=on_written)
+
+
+def scrape_all(
+    full_reset: bool = False,
+    concurrency: int | None = None,
+    per_host_concurrency: int | None = None,
+    encode_workers: int = 0,
+    urls: list[str] | None = None,
+) -> None:
+    from kakalot_scraper.browser.Browser import BrowserSession
+    from kakalot_scraper.cache.ImageCache import image_cache
+    from kakalot_scraper.engine.Engine import run_engine
+    from kakalot_scraper.engine.Engine import SETTINGS as EngineSettings
+    from kakalot_scraper.fastpath.FastPath import http_client
+    from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+
+    if urls is None:
+        urls = load_urls_from_file(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
     print(f"Loaded {len(urls)} URLs to process.")
     if not urls or len(urls) == 0:
         print("No valid URLs to process.")
         return
 
-    for url in urls:
-        print(f"Processing Manga: {url}")
-        scrape_manga_and_save(url, full_reset)
-
+    if concurrency:
+        with metrics.busy():
+            run_engine(
+                urls,
+                concurrency,
+                per_host_concurrency or EngineSettings.PER_HOST_CONCURRENCY,
+                full_reset,
+            )
+        return
 
-def self_service_mode() -> None:
+    start = time.monotonic()
+    with metrics.busy(), LibraryIndex() as index:
+        pipeline = make_pipeline(encode_workers, index)
+        try:
+            with BrowserSession() as session:
+                for url in urls:
+                    print(f"Processing Manga: {url}")
+                    scrape_manga_and_save(url, full_reset, session, pipeline, index)
+                print(f"Browser usage: {session.stats()}")
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+            # Chapters that failed to encode can be picked up by other workers
+            work_queue.release_all()
+    rate_limiter.save()
+    print(f"Rate limits: {rate_limiter.stats()}")
+    print(f"HTTP fast path usage: {http_client.stats()}")
+    print(f"Identities: {identity_pool.stats()}")
+    print(f"Image cache: {image_cache.stats()}")
+    print(f"Counters: {metrics.snapshot()['counters']}")
+    if work_queue.enabled:
+        print(f"Work queue: {work_queue.stats()}")
+
+    hours = (time.monotonic() - start) / 3600
+    if hours:
+        print(f"Serial run: {len(urls) / hours:.2f} series/hour")
+
+
+def self_service_mode(
+    concurrency: int | None = None,
+    per_host_concurrency: int | None = None,
+    encode_workers: int = 0,
+) -> None:
+    from kakalot_scraper.watchdog.Watchdog import Handler, make_observer, wake_up_event
 
-    global wake_up_event
-    observer = Observer()
-    observer.schedule(Handler(), path=".", recursive=False)
+    urls = load_urls_from_file(kakalot_scraper.GLOBAL.URL_LIST_FILE_PATH)
+    handler = Handler(urls)
+    observer = make_observer(handler)
     observer.start()
 
     print("Self-service mode started. Watching for changes in configuration file.")
 
-    # Create heartbeat immediately so healthcheck passes
-    with open("./heartbeat", "w") as f:
-        f.write(str(time.time()))
+    # Runs on its own thread so healthcheck passes during long scrapes and waits
+    heartbeat = Heartbeat()
+    heartbeat.start()
+
+    scheduler = SeriesScheduler()
+    scheduler.sync(urls)
 
     try:
         while True:
-            scrape_all()
-            print("Scrape cycle complete. Waiting for next trigger or timeout...")
-            # Wait for 1 hour or until wake_up_event is set
-            # We check every 10 minutes to update heartbeat
-            for _ in range(6):
-                if wake_up_event.wait(timeout=600):
-                    print("Wake up event received!")
-                    wake_up_event.clear()
-                    break
-
-                # Update heartbeat
-                with open("./heartbeat", "w") as f:
-                    f.write(str(time.time()))
-
-            # If we exited the loop because of the event, we loop back to scrape_all immediately
-            # If we exited because the range finished (1 hour passed), we also loop back to scrape_all
+            with LibraryIndex() as index:
+                scheduler.take_requests(index)
+            due = scheduler.pop_due()
+            if due:
+                print(f"{len(due)} of {len(scheduler.series)} series are due.")
+                started = time.time()
+                scrape_all(
+                    concurrency=concurrency,
+                    per_host_concurrency=per_host_concurrency,
+                    encode_workers=encode_workers,
+                    urls=due,
+                )
+                with LibraryIndex() as index:
+                    scheduler.record_results(index, due, started)
+                continue
+
+            wait = scheduler.seconds_until_next()
+            if wait is None:
+                print("Nothing scheduled. Waiting for a configuration change...")
+            else:
+                print(f"Next series is due in {wait / 60:.1f} minutes.")
+
+            # Sleep until the next series is due or the configuration changes,
+            # waking up now and then for check requests from other processes
+            poll = SchedulerSettings.CHECK_REQUEST_POLL_SECONDS
+            if wake_up_event.wait(timeout=poll if wait is None else min(wait, poll)):
+                print("Wake up event received!")
+                wake_up_event.clear()
+                # Only new series become due, the rest keep their schedule
+                added, removed = handler.pop_changes()
+                for url in removed:
+                    scheduler.remove(url)
+                for url in added:
+                    scheduler.add(url)
+                print(f"Queued {len(added)} new series, dropped {len(removed)}.")
 
     except KeyboardInterrupt:
         print("Stopping self-service mode...")
     finally:
+        scheduler.save()
+        heartbeat.stop()
         observer.stop()
         observer.join()
+        handler.cancel()
+
+
+def run(args: argparse.Namespace) -> None:
+    from kakalot_scraper.browser.Browser import BrowserSession
+    from kakalot_scraper.cache.ImageCache import image_cache
+    from kakalot_scraper.engine.Engine import run_engine
+    from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+
+    if args.self_service:
+        self_service_mode(
+            args.concurrency, args.per_host_concurrency, args.encode_workers
+        )
+        return
+
+    if args.url and args.concurrency:
+        with metrics.busy():
+            run_engine(
+                [args.url],
+                args.concurrency,
+                args.per_host_concurrency,
+                args.full_reset,
+            )
+        return
+
+    if args.url:
+        with metrics.busy(), LibraryIndex() as index:
+            pipeline = make_pipeline(args.encode_workers, index)
+            try:
+                with BrowserSession() as session:
+                    scrape_manga_and_save(
+                        args.url, args.full_reset, session, pipeline, index
+                    )
+                    print(f"Browser usage: {session.stats()}")
+            finally:
+                if pipeline is not None:
+                    pipeline.close()
+        rate_limiter.save()
+        print(f"Identities: {identity_pool.stats()}")
+        print(f"Image cache: {image_cache.stats()}")
+        return
+
+    print("No URL provided, proceeding to scrape all URLs from the list.")
+    scrape_all(
+        args.full_reset,
+        args.concurrency,
+        args.per_host_concurrency,
+        args.encode_workers,
+    )
+
+
+def configure(args: argparse.Namespace) -> None:
+    """
+    Applies the command line options to the settings of this process.
+    """
+    if args.profile:
+        kakalot_scraper.GLOBAL.OUTPUT_PROFILE = args.profile
+    if args.stream:
+        kakalot_scraper.GLOBAL.STREAM_CHAPTERS = True
+    if args.dedupe:
+        from kakalot_scraper.dedupe.Dedupe import page_hashes
+
+        page_hashes.default_policy = args.dedupe
+    if args.work_queue or args.workers:
+        kakalot_scraper.GLOBAL.USE_WORK_QUEUE = True
+    identity_pool.path = args.identities
+
+
+def run_worker(args: argparse.Namespace, metrics_queue, number: int) -> None:
+    """
+    Entry point of a worker process started by --workers.
+    """
+    import multiprocessing
+    from kakalot_scraper.metrics.Exporter import MetricsReporter
+    from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RateLimitSettings
+
+    # Spawned processes start from the default settings
+    configure(args)
+    # The workers hit the same site, together they keep to one budget
+    RateLimitSettings.SHARE = args.workers
+    if number > 1:
+        # The first worker keeps the rate limits and the schedule
+        RateLimitSettings.SAVE_STATE = False
+        SchedulerSettings.SAVE_STATE = False
+    # Only the parent writes the stats file, it gets the metrics from here
+    reporter = MetricsReporter(metrics_queue, multiprocessing.current_process().name)
+    reporter.start()
+    try:
+        run(args)
+    finally:
+        reporter.stop()
+        work_queue.close()
+
+
+def run_workers(args: argparse.Namespace) -> None:
+    """
+    Runs `args.workers` processes that split the chapters through the work queue.
+    """
+    import multiprocessing
+    from kakalot_scraper.metrics.Exporter import MetricsCollector
+
+    context = multiprocessing.get_context("spawn")
+    metrics_queue = context.Queue()
+    collector = MetricsCollector(metrics_queue)
+    collector.start()
+    workers = [
+        context.Process(
+            target=run_worker,
+            args=(args, metrics_queue, n + 1),
+            name=f"worker-{n + 1}",
+        )
+        for n in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"Started {len(workers)} workers.")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # The workers got the interrupt as well, let them release their leases
+        for worker in workers:
+            worker.join()
+    finally:
+        collector.stop()
+    failed = [worker.name for worker in workers if worker.exitcode]
+    if failed:
+        print(f"Workers exited with an error: {', '.join(failed)}")
 
 
 def main() -> None:
@@ -143,24 +432,147 @@ def main() -> None:
     parser.add_argument(
         "--self-service", action="store_true", help="Enable self-service mode"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Scrape with the async engine using this many pages at once",
+    )
+    parser.add_argument(
+        "--per-host-concurrency",
+        type=int,
+        default=None,
+        help="Maximum pages open at once per host when --concurrency is set, the engine's SETTINGS.PER_HOST_CONCURRENCY by default",
+    )
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=0,
+        help="Encode and zip chapters in this many background processes while scraping continues",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write pages into the CBZ as soon as they are downloaded to bound memory use",
+    )
+    parser.add_argument(
+        "--dedupe",
+        default=None,
+        help="What to do with pages that recur across chapters: keep, drop or store_once, overrides the default of the policy file",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="Output encoding profile: original, jpeg, webp, webp-lossless, gray, or jpeg:<quality>, webp:<quality>, gray:<quality>",
+    )
+    parser.add_argument(
+        "--identities",
+        default=IdentitySettings.POOL_FILE_PATH,
+        help="JSON file with the proxies, user agents and viewports to spread requests over",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=MetricsSettings.HTTP_PORT,
+        help="Serve Prometheus metrics on this localhost port, 0 to disable",
+    )
+    parser.add_argument(
+        "--work-queue",
+        action="store_true",
+        help="Claim chapters through the shared work queue, for several containers on one library",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Scrape with this many processes that split the chapters through the work queue",
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Rebuild the library index by scanning the manga directory, then exit",
+    )
+    parser.add_argument(
+        "--verify",
+        nargs="?",
+        type=int,
+        const=0,
+        metavar="WORKERS",
+        help="Check every chapter against its series manifest on WORKERS processes, one per core by default, re-queue broken ones, then exit",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    for name, description in zip(
+        CommandSettings.NAMES,
+        [
+            "List the configured series and what the library holds of them",
+            "Show the heartbeat, scrape progress, schedule and library totals",
+            "Show when each series is checked next",
+        ],
+    ):
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--json", action="store_true", help="Print JSON")
     args = parser.parse_args()
 
+    # Read-only commands, they return before anything heavy is imported
+    if args.command:
+        sys.exit(run_command(args.command, args.json))
+
+    print("Kakalot Scraper started.")
+    from kakalot_scraper.cbz.Encoding import get_profile
+    from kakalot_scraper.dedupe.Dedupe import SETTINGS as DedupeSettings
+    from kakalot_scraper.engine.Engine import SETTINGS as EngineSettings
+    from kakalot_scraper.metrics.Exporter import MetricsExporter
+
+    if args.profile:
+        try:
+            get_profile(args.profile)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.dedupe and args.dedupe not in DedupeSettings.POLICIES:
+        parser.error(
+            f"--dedupe must be one of {', '.join(DedupeSettings.POLICIES)}, got {args.dedupe}"
+        )
+    if args.per_host_concurrency is None:
+        args.per_host_concurrency = EngineSettings.PER_HOST_CONCURRENCY
+
     check_paths()
+    sweep_stale_files()
 
-    if args.self_service:
-        self_service_mode()
+    if args.stream and args.encode_workers:
+        print("--stream writes chapters while scraping, ignoring --encode-workers.")
+        args.encode_workers = 0
+
+    configure(args)
+    try:
+        identity_pool.load()
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.rebuild_index:
+        with LibraryIndex() as index:
+            index.rebuild()
         return
 
-    if args.url:
-        scrape_manga_and_save(args.url, args.full_reset)
+    if args.verify is not None:
+        from kakalot_scraper.library.Verify import verify_library
+        from kakalot_scraper.library.Verify import SETTINGS as VerifySettings
+
+        verify_library(workers=args.verify or VerifySettings.WORKERS)
         return
 
-    print("No URL provided, proceeding to scrape all URLs from the list.")
-    scrape_all(args.full_reset)
+    exporter = MetricsExporter(port=args.metrics_port)
+    exporter.start()
+    try:
+        if args.workers > 1:
+            run_workers(args)
+        else:
+            run(args)
+    finally:
+        exporter.stop()
+        work_queue.close()
 
 
 if __name__ == "__main__":
-    print("Kakalot Scraper started.")
     try:
         main()
     except Exception as e:
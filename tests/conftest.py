@@ -0,0 +1,29 @@
+import pytest
+
+import kakalot_scraper
+from kakalot_scraper.benchmark.StandIn import StandInConfig, StandInServer
+from kakalot_scraper.cache.ImageCache import SETTINGS as CACHE_SETTINGS
+from kakalot_scraper.ratelimit.RateLimiter import SETTINGS as RATE_LIMIT_SETTINGS
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """
+    Empty library with the image cache off and the rate limiter lifted.
+    """
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "SAVE_ROOT", str(tmp_path))
+    monkeypatch.setattr(CACHE_SETTINGS, "ENABLED", False)
+    monkeypatch.setattr(RATE_LIMIT_SETTINGS, "INITIAL_RATE", 10000.0)
+    monkeypatch.setattr(RATE_LIMIT_SETTINGS, "MAX_RATE", 10000.0)
+    monkeypatch.setattr(RATE_LIMIT_SETTINGS, "BURST", 10000.0)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def site(library):
+    """
+    Small stand-in of the site, pages are just above the minimum size.
+    """
+    config = StandInConfig(chapters=3, pages=4, page_width=200, page_height=300)
+    with StandInServer(config) as server:
+        yield server
@@ -0,0 +1,106 @@
+import asyncio
+
+from kakalot_scraper.browser.Browser import AsyncBrowserSession
+
+
+class FakeContext:
+    async def new_page(self):
+        return object()
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self, fail_context=None):
+        self.fail_context = fail_context
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def new_context(self, **options):
+        if self.fail_context is not None:
+            # Fails once the recycle is pending
+            await self.fail_context.wait()
+            raise RuntimeError("context failed")
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePlaywright:
+    def __init__(self, browsers):
+        self.browsers = browsers
+        self.chromium = self
+
+    async def launch(self, **options):
+        return self.browsers.pop(0)
+
+    async def stop(self):
+        pass
+
+
+def test_context_failure_during_recycle():
+    async def run():
+        fail_context = asyncio.Event()
+        session = AsyncBrowserSession(max_pages=1)
+        session._playwright = FakePlaywright(
+            [FakeBrowser(fail_context), FakeBrowser(), FakeBrowser()]
+        )
+
+        async def open_page():
+            async with session.page():
+                pass
+
+        failing = asyncio.ensure_future(open_page())
+        await asyncio.sleep(0.01)
+        # The first page used up the browser, this one waits for the recycle
+        waiting = asyncio.ensure_future(open_page())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        fail_context.set()
+
+        await asyncio.wait_for(asyncio.gather(failing, waiting), timeout=5)
+        return session
+
+    session = asyncio.run(run())
+
+    assert session._open_pages == 0
+    assert session.page_count == 2
+    # The relaunch after the failed context is the recycle
+    assert session.restart_count == 1
+
+
+def test_recycle_waits_for_open_pages():
+    async def run():
+        session = AsyncBrowserSession(max_pages=2)
+        session._playwright = FakePlaywright([FakeBrowser(), FakeBrowser()])
+        release = asyncio.Event()
+        order = []
+
+        async def hold(name):
+            async with session.page():
+                order.append(f"{name} open")
+                await release.wait()
+            order.append(f"{name} closed")
+
+        async def late():
+            async with session.page():
+                order.append("late open")
+
+        tasks = [asyncio.ensure_future(hold("a")), asyncio.ensure_future(hold("b"))]
+        await asyncio.sleep(0.01)
+        waiting = asyncio.ensure_future(late())
+        await asyncio.sleep(0.01)
+        assert "late open" not in order
+        release.set()
+        await asyncio.wait_for(asyncio.gather(*tasks, waiting), timeout=5)
+        return session, order
+
+    session, order = asyncio.run(run())
+
+    assert order[-1] == "late open"
+    assert session.launch_count == 2
+    assert session.restart_count == 1
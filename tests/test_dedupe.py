@@ -0,0 +1,120 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from kakalot_scraper.cbz.Generator import CbzWriter
+from kakalot_scraper.cbz.Stream import ChapterStream
+from kakalot_scraper.dedupe.Dedupe import (
+    ChapterDedupe,
+    PageHashIndex,
+    SeriesHashes,
+    page_hash,
+)
+from kakalot_scraper.manager.Manager import MangaInfo
+from kakalot_scraper.scrape.PageImage import PageImage
+
+MANGA_INFO = MangaInfo(
+    "Test Manga", "", "Ongoing", "", "", [], "", "https://example.com/manga/test"
+)
+
+
+def _page_data() -> bytes:
+    buffer = BytesIO()
+    Image.effect_noise((200, 300), 64).convert("RGB").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pages():
+    # Noise pages, each hashes to a different value
+    return [_page_data() for _ in range(4)]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = PageHashIndex(str(tmp_path / "hashes.db"))
+    yield index
+    index.close()
+
+
+def _page(data, i):
+    return PageImage(data, f"https://example.com/img/test/{i}.jpg")
+
+
+def _dedupe(index, tmp_path, chapter="3"):
+    return ChapterDedupe(index, "test", chapter, "drop", str(tmp_path / "recurring"))
+
+
+def _record(index, chapters, data):
+    for chapter in chapters:
+        index.record("test", chapter, {page_hash(_page(data, 0))})
+
+
+def test_series_hashes_near():
+    hashes = SeriesHashes()
+    value = 0x0123456789ABCDEF
+    hashes.add(value, "1")
+    # Flipped bits spread over every band
+    close = value ^ 0x8000100002000040
+    far = value ^ 0x00FF00FF00000000
+
+    assert hashes.near(value) == {"1"}
+    assert hashes.near(close) == {"1"}
+    assert hashes.near(far) == set()
+
+
+def test_single_other_chapter_is_kept(index, tmp_path, pages):
+    _record(index, ["1"], pages[0])
+    dedupe = _dedupe(index, tmp_path)
+
+    assert dedupe.keep(_page(pages[0], 0))
+    assert dedupe.dropped == 0
+
+
+def test_recurring_page_is_dropped(index, tmp_path, pages):
+    _record(index, ["1", "2"], pages[0])
+    dedupe = _dedupe(index, tmp_path)
+    chapter = [_page(data, i) for i, data in enumerate(pages)]
+
+    assert dedupe.filter(chapter) == chapter[1:]
+    assert dedupe.dropped == 1
+
+
+def test_filter_keeps_chapter_of_recurring_pages(index, tmp_path, pages):
+    for data in pages:
+        _record(index, ["1", "2"], data)
+    dedupe = _dedupe(index, tmp_path)
+
+    assert len(dedupe.filter([_page(data, i) for i, data in enumerate(pages)])) == 4
+    assert dedupe.dropped == 0
+
+
+def _stream(index, tmp_path, pages, max_in_flight=16):
+    stream = ChapterStream(
+        CbzWriter(MANGA_INFO, "3", str(tmp_path)),
+        max_in_flight=max_in_flight,
+        dedupe=_dedupe(index, tmp_path),
+    )
+    sources = [_page(data, i).src for i, data in enumerate(pages)]
+    stream.begin("test", sources)
+    for i, data in enumerate(pages):
+        stream.add(_page(data, i), sources[i])
+    written = stream.finish()
+    stream.abort()
+    return written
+
+
+def test_stream_drops_recurring_page(index, tmp_path, pages):
+    _record(index, ["1", "2"], pages[0])
+
+    assert len(_stream(index, tmp_path, pages)) == 3
+
+
+def test_stream_keeps_chapter_of_recurring_pages(index, tmp_path, pages):
+    for data in pages:
+        _record(index, ["1", "2"], data)
+
+    assert len(_stream(index, tmp_path, pages)) == 4
+    # Also when the held pages fill the budget before the chapter ends
+    assert len(_stream(index, tmp_path, pages, max_in_flight=2)) == 4
@@ -0,0 +1,81 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import kakalot_scraper
+from kakalot_scraper.cbz.Encoding import (
+    EncodeReport,
+    encode_page,
+    get_profile,
+    submit_encode,
+)
+from kakalot_scraper.scrape.PageImage import PageImage
+
+
+def _page(format="PNG") -> PageImage:
+    buffer = BytesIO()
+    Image.effect_noise((200, 300), 40).convert("RGB").save(buffer, format=format)
+    return PageImage(buffer.getvalue(), f"https://example.com/1.{format.lower()}")
+
+
+def test_profile_names(monkeypatch):
+    assert get_profile("webp:70").quality == 70
+    assert get_profile("jpeg:500").quality == 100
+    assert get_profile("gray:60").grayscale
+    with pytest.raises(ValueError):
+        get_profile("png")
+    with pytest.raises(ValueError):
+        get_profile("webp-lossless:70")
+
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "OUTPUT_PROFILE", None)
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "PASSTHROUGH_IMAGES", True)
+    assert get_profile().name == "original"
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "OUTPUT_PROFILE", "webp")
+    assert get_profile().name == "webp"
+
+
+def test_original_profile_stores_downloaded_bytes():
+    page = _page()
+
+    assert encode_page(page, get_profile("original")) == ("png", page.data)
+    # Merged pages have no downloaded bytes and are stored as JPEG
+    extension, data = encode_page(page.decode(), get_profile("original"))
+    assert extension == "jpg"
+    assert Image.open(BytesIO(data)).format == "JPEG"
+
+
+def test_profiles_encode_to_their_format():
+    page = _page()
+
+    extension, data = encode_page(page, get_profile("gray"))
+    assert extension == "jpg"
+    assert Image.open(BytesIO(data)).mode == "L"
+
+    extension, data = encode_page(page, get_profile("webp"))
+    assert extension == "webp"
+    assert Image.open(BytesIO(data)).size == (200, 300)
+
+
+def test_keep_smaller_keeps_the_download():
+    # Noise stored as JPEG only grows as lossless WebP
+    page = _page("JPEG")
+
+    assert encode_page(page, get_profile("webp-lossless")) == ("jpg", page.data)
+
+
+def test_pool_discards_pages_and_reports_sizes():
+    pages = [_page() for _ in range(3)]
+    sizes = [len(page.data) for page in pages]
+    profile = get_profile("jpeg")
+    report = EncodeReport(profile)
+
+    for future in [submit_encode(page, profile, discard=True) for page in pages]:
+        encoded = future.result()
+        assert encoded.dimensions == (200, 300)
+        report.add(encoded)
+
+    assert all(page.data is None for page in pages)
+    assert report.pages == 3
+    assert report.original_bytes == sum(sizes)
+    assert report.bytes_saved == report.original_bytes - report.stored_bytes
@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from kakalot_scraper.engine.Engine import AsyncScrapeEngine
+from kakalot_scraper.library.Library import LibraryIndex
+from kakalot_scraper.manager.Manager import MangaInfo
+
+URL = "https://example.com/manga/some-manga"
+
+
+class FakeEngine(AsyncScrapeEngine):
+    def __init__(self, chapters, **options):
+        super().__init__(**options)
+        self.chapters = chapters
+        self.done = []
+        self.most_tasks = 0
+
+    async def _get_series_snapshot(self, url):
+        info = MangaInfo("Some Manga", "Author", "Ongoing", "", "", [], "", url)
+        chapters = [(str(n), f"{url}/chapter-{n}") for n in range(self.chapters)]
+        return info, list(reversed(chapters))
+
+    async def _process_chapter(self, manga_info, chapter_num, chapter_url):
+        self.most_tasks = max(self.most_tasks, len(asyncio.all_tasks()))
+        await asyncio.sleep(0)
+        if chapter_num == "3":
+            raise RuntimeError("broken chapter")
+        self.done.append(chapter_num)
+        return True
+
+
+async def process(engine, url):
+    engine._index_thread = ThreadPoolExecutor(1)
+    engine.index = await engine._in_index(LibraryIndex)
+    try:
+        await engine._process_series(url)
+    finally:
+        await engine._in_index(engine.index.close)
+        engine._index_thread.shutdown()
+
+
+def test_chapters_are_fed_through_bounded_workers(library):
+    engine = FakeEngine(200, concurrency=3)
+    asyncio.run(process(engine, URL))
+
+    # The series task and three workers, not one task per chapter
+    assert engine.most_tasks <= 4
+    assert sorted(engine.done, key=int) == [str(n) for n in range(200) if n != 3]
+    assert engine.chapters_failed == 1
+    assert engine.series_done == 1
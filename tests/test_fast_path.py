@@ -0,0 +1,162 @@
+from kakalot_scraper.benchmark.StandIn import StandInConfig, StandInServer
+from kakalot_scraper.cbz.Staging import ChapterStaging
+from kakalot_scraper.fastpath.FastPath import (
+    ChapterPageParser,
+    SeriesPageParser,
+    fetch_chapter_images,
+    fetch_series_snapshot,
+    resume_chapter_images,
+)
+from kakalot_scraper.manager.Manager import SETTINGS as MANAGER_SETTINGS
+from kakalot_scraper.scrape.Scraper import SETTINGS as SCRAPER_SETTINGS
+
+CONFIG = StandInConfig(chapters=3, pages=4, page_width=200, page_height=300)
+
+SERIES_PAGE = f"""
+<div class="{MANAGER_SETTINGS.INFO_DIV_CLASS_NAME}"><ul>
+<li><h1>Some <b>Manga</b></h1></li>
+<li>Author(s) : <a href="#">First</a>, <a href="#">Second</a></li>
+<li><em id="rate_row_cmd">4.5 / 5</em></li>
+</ul></div>
+<h1>Not the title</h1>
+<div class="{MANAGER_SETTINGS.CHAPTERS_DIV_CLASS_NAME}">
+<div class="row"><span><a href="/chapter-2">Chapter 2</a></span>
+<span><a href="/ignored">Second link</a></span></div>
+<div class="row"><div class="row"><a href="/chapter-1">Chapter
+  1</a></div></div>
+</div>
+<a href="/outside">Outside</a>
+"""
+
+CHAPTER_PAGE = f"""
+<img src="/logo.png">
+<div class="{SCRAPER_SETTINGS.DIV_CLASS_NAME}">
+<img src="/placeholder.gif" data-src="/img/1.jpg">
+<p><img src="/img/2.jpg"></p>
+<img alt="no source">
+</div>
+<img src="/footer.png">
+"""
+
+
+class PatchedServer(StandInServer):
+    """
+    Stand-in that answers images from `fail_from` on with HTTP 404 and
+    serves the pages in `overrides` instead of the generated ones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_from = None
+        self.overrides = {}
+
+    def respond(self, path):
+        if path in self.overrides:
+            return 200, "text/html; charset=utf-8", self.overrides[path].encode()
+        if self.fail_from is not None and path.startswith("/img/"):
+            index = path.rsplit("/", 1)[-1].split(".")[0]
+            if index.isdigit() and int(index) >= self.fail_from:
+                return 404, "text/plain", b"Not Found"
+        return super().respond(path)
+
+
+def _parse(parser, html):
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def test_series_page_parser():
+    data = _parse(SeriesPageParser(), SERIES_PAGE).data
+
+    assert data["title"] == "Some Manga"
+    assert data["rating"] == "4.5 / 5"
+    assert data["items"][1] == {
+        "text": "Author(s) : First, Second",
+        "links": ["First", "Second"],
+    }
+    # Only the first link of every row, nested rows included
+    assert data["chapters"] == [
+        {"href": "/chapter-2", "text": "Chapter 2"},
+        {"href": "/chapter-1", "text": "Chapter 1"},
+    ]
+
+
+def test_chapter_page_parser():
+    parser = _parse(ChapterPageParser(), CHAPTER_PAGE)
+
+    assert parser.found_container
+    # data-src wins over the placeholder of lazy images
+    assert parser.sources == ["/img/1.jpg", "/img/2.jpg"]
+
+
+def test_chapter_page_parser_without_container():
+    parser = _parse(ChapterPageParser(), '<img src="/img/1.jpg">')
+
+    assert not parser.found_container
+    assert parser.sources == []
+
+
+def test_fetch_series_snapshot(site):
+    manga_info, chapters = fetch_series_snapshot(site.series_url())
+
+    assert manga_info.healthcheck()
+    assert manga_info.title == "Benchmark Manga"
+    assert len(chapters) == site.config.chapters
+    assert site.chapter_url(1) in [url for _, url in chapters]
+
+
+def test_fetch_series_snapshot_falls_back(site):
+    # Unknown paths are answered with HTTP 404
+    assert fetch_series_snapshot(f"{site.base_url}/missing") is None
+    # A chapter page has no series data
+    assert fetch_series_snapshot(site.chapter_url(1)) is None
+
+
+def test_fetch_chapter_images(site, library):
+    staging = ChapterStaging(site.chapter_url(1), library)
+    pages = fetch_chapter_images(site.chapter_url(1), staging=staging)
+
+    assert len(pages) == site.config.pages
+    assert all(page.width == 200 and page.height == 300 for page in pages)
+    assert len(staging.sources) == site.config.pages
+    assert staging.staged_count() == site.config.pages
+
+
+def test_fetch_chapter_images_falls_back(library):
+    with PatchedServer(CONFIG) as server:
+        server.overrides["/manga/bench-manga/chapter-2"] = SERIES_PAGE
+
+        # Chapter out of range, HTTP 404
+        assert fetch_chapter_images(server.chapter_url(99)) is None
+        # No reader container
+        assert fetch_chapter_images(server.chapter_url(2)) is None
+        assert server.requests.get("image", 0) == 0
+
+
+def test_fetch_and_resume_chapter_images(library):
+    with PatchedServer(CONFIG) as server:
+        server.fail_from = 2
+        chapter_url = server.chapter_url(1)
+
+        staging = ChapterStaging(chapter_url, library)
+        assert fetch_chapter_images(chapter_url, staging=staging) is None
+        # The pages before the failure are checkpointed
+        assert len(staging.sources) == 4
+        assert staging.staged_count() == 2
+
+        server.fail_from = None
+        requests = dict(server.requests)
+        staging = ChapterStaging(chapter_url, library)
+        pages = resume_chapter_images(chapter_url, staging)
+
+        assert len(pages) == 4
+        # Only the missing pages are fetched, the chapter page is not loaded again
+        assert server.requests["image"] - requests["image"] == 2
+        assert server.requests["chapter"] == requests["chapter"]
+
+
+def test_resume_chapter_images_without_staging(site, library):
+    staging = ChapterStaging(site.chapter_url(1), library)
+
+    assert resume_chapter_images(site.chapter_url(1), staging) is None
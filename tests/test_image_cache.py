@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import pytest
+
+from kakalot_scraper.browser.Routing import RequestRouter
+from kakalot_scraper.cache.ImageCache import SETTINGS, ImageCache
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "ENABLED", True)
+
+
+def _body(i: int, size: int = 1000) -> bytes:
+    return i.to_bytes(4, "big") * (size // 4)
+
+
+def test_put_and_get(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    digest = cache.put("https://example.com/1.jpg", _body(1))
+
+    assert cache.get("https://example.com/1.jpg") == _body(1)
+    assert cache.lookup("https://example.com/1.jpg") == digest
+    assert cache.read(digest) == _body(1)
+    assert cache.get("https://example.com/2.jpg") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_shared_cache_stays_under_max_size(tmp_path):
+    # Two workers on one cache directory, each alone stays under the limit
+    first = ImageCache(str(tmp_path), max_size=10000)
+    second = ImageCache(str(tmp_path), max_size=10000)
+    for i in range(8):
+        first.put(f"https://example.com/a{i}.jpg", _body(i))
+        second.put(f"https://example.com/b{i}.jpg", _body(100 + i))
+
+    stored = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(tmp_path)
+        for name in names
+        if name != "index.db"
+    )
+    assert stored <= 10000
+    assert first.evictions + second.evictions >= 6
+    assert second.stats()["size"] == stored
+    first.close()
+    second.close()
+
+
+class FakeRequest:
+    url = "https://example.com/1.jpg"
+    resource_type = "image"
+
+
+class FakeRoute:
+    request = FakeRequest()
+
+    def __init__(self):
+        self.fulfilled = None
+
+    async def fulfill(self, status, body):
+        self.fulfilled = (status, body)
+
+    async def continue_(self):
+        self.fulfilled = False
+
+
+def test_async_route_served_from_cache(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    cache.put(FakeRequest.url, _body(1))
+    router = RequestRouter("https://example.com/manga/test", cache=cache)
+    route = FakeRoute()
+
+    asyncio.run(router.handle_async(route))
+
+    assert route.fulfilled == (200, _body(1))
+    assert router.cached == 1
+    cache.close()
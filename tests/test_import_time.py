@@ -0,0 +1,42 @@
+import pytest
+
+from kakalot_scraper.benchmark.ImportTime import (
+    is_forbidden,
+    measure,
+    parse_importtime,
+)
+
+
+@pytest.mark.parametrize("command", [["list"], ["status"], ["plan"]])
+def test_fast_command_imports(command):
+    # The time budget depends on the machine, it is checked by running
+    # python -m kakalot_scraper.benchmark.ImportTime
+    result = measure(command)
+
+    assert result["exit_code"] == 0
+    assert result["modules"] > 0
+    assert result["forbidden"] == []
+
+
+def test_forbidden_modules():
+    assert is_forbidden("playwright.sync_api")
+    assert is_forbidden("PIL.Image")
+    assert is_forbidden("kakalot_scraper.scrape.Scraper")
+    assert is_forbidden("kakalot_scraper.cbz.Generator")
+    assert not is_forbidden("kakalot_scraper.cbz.Naming")
+    assert not is_forbidden("kakalot_scraper.scheduler.Scheduler")
+
+
+def test_parse_importtime():
+    output = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   _io",
+            "import time:       300 |        420 | kakalot_scraper",
+        ]
+    )
+
+    assert parse_importtime(output) == [
+        ("_io", 120.0, 120.0, 1),
+        ("kakalot_scraper", 300.0, 420.0, 0),
+    ]
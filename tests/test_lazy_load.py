@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+from kakalot_scraper.scrape import LazyLoad
+
+SELECTOR = ".container-chapter-reader"
+
+
+class FakePage:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def evaluate(self, script, argument=None):
+        self.calls.append((script, argument))
+        return self.result
+
+
+class FakeAsyncPage(FakePage):
+    async def evaluate(self, script, argument=None):
+        return super().evaluate(script, argument)
+
+
+def test_eager_strategy_loads_in_one_round_trip(monkeypatch):
+    monkeypatch.setattr(LazyLoad.SETTINGS, "STRATEGY", "eager")
+    page = FakePage({"images": 10, "pending": 1, "elapsed": 5})
+
+    LazyLoad.trigger_lazy_loading(page, SELECTOR)
+
+    assert page.calls == [
+        (
+            LazyLoad.EAGER_LOAD_SCRIPT,
+            {
+                "selector": SELECTOR,
+                "timeout": LazyLoad.SETTINGS.TIMEOUT_MS,
+                "attributes": LazyLoad.SETTINGS.LAZY_SRC_ATTRIBUTES,
+            },
+        )
+    ]
+
+
+def test_async_eager_strategy(monkeypatch):
+    monkeypatch.setattr(LazyLoad.SETTINGS, "STRATEGY", "eager")
+    page = FakeAsyncPage({"images": 0, "pending": 0, "elapsed": 0})
+
+    elapsed = asyncio.run(LazyLoad.trigger_lazy_loading_async(page, SELECTOR))
+
+    assert elapsed >= 0
+    assert [script for script, _ in page.calls] == [LazyLoad.EAGER_LOAD_SCRIPT]
+
+
+def test_fixture_mixes_both_lazy_loaders(tmp_path):
+    path = LazyLoad.write_fixture(str(tmp_path), images=4, height=10)
+
+    with open(path) as f:
+        html = f.read()
+    assert html.count('loading="lazy"') == 2
+    assert html.count('data-src="') == 2
+    assert sorted(os.listdir(tmp_path)) == [
+        "000.jpg",
+        "001.jpg",
+        "002.jpg",
+        "003.jpg",
+        "chapter.html",
+    ]
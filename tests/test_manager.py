@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from kakalot_scraper.manager import Manager
+from kakalot_scraper.ratelimit.RateLimiter import rate_limiter
+
+URL = "https://example.com/manga/some-manga"
+
+
+class FakePage:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+        self.selectors = []
+
+    def route(self, pattern, handler):
+        pass
+
+    def on(self, event, handler):
+        pass
+
+    def goto(self, url):
+        return SimpleNamespace(status=self.status)
+
+    def wait_for_selector(self, selector, timeout):
+        self.selectors.append((selector, timeout))
+
+    def evaluate(self, script):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, page):
+        self._page = page
+
+    @contextmanager
+    def page(self, **context_options):
+        yield self._page
+
+
+def record_outcomes(monkeypatch):
+    outcomes = []
+    monkeypatch.setattr(rate_limiter, "acquire", lambda url: None)
+    monkeypatch.setattr(
+        rate_limiter, "record_success", lambda url: outcomes.append("success")
+    )
+    monkeypatch.setattr(
+        rate_limiter,
+        "record_failure",
+        lambda url, reason="": outcomes.append(reason),
+    )
+    return outcomes
+
+
+def test_is_ongoing_records_success(monkeypatch):
+    outcomes = record_outcomes(monkeypatch)
+    data = {"title": "Some Manga", "items": [{"text": "Status : Ongoing"}]}
+    page = FakePage(200, data)
+
+    assert Manager.is_ongoing(URL, FakeSession(page))
+    assert outcomes == ["success"]
+    assert page.selectors == [
+        (
+            f".{Manager.SETTINGS.INFO_DIV_CLASS_NAME}",
+            Manager.SETTINGS.SELECTOR_TIMEOUT,
+        )
+    ]
+
+
+def test_is_ongoing_records_throttling(monkeypatch):
+    outcomes = record_outcomes(monkeypatch)
+    page = FakePage(429, {})
+
+    assert not Manager.is_ongoing(URL, FakeSession(page))
+    assert outcomes == ["HTTP 429"]
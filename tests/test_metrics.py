@@ -0,0 +1,60 @@
+import queue
+
+from kakalot_scraper.metrics.Exporter import MetricsCollector, MetricsReporter
+from kakalot_scraper.metrics.Metrics import Metrics, metrics
+
+
+def test_merge_tracks_busy_workers():
+    parent = Metrics()
+    worker = Metrics()
+
+    with worker.busy():
+        worker.inc("chapters")
+        parent.merge(worker.drain(), source="worker-1")
+        snapshot = parent.snapshot()
+
+        assert snapshot["busy_since"] == worker.busy_since
+        assert snapshot["last_progress"] >= worker.last_progress
+        assert snapshot["counters"] == {"chapters": 1}
+
+    parent.merge(worker.drain(), source="worker-1")
+    assert parent.snapshot()["busy_since"] is None
+
+
+def test_forget_worker():
+    parent = Metrics()
+    worker = Metrics()
+
+    with worker.busy():
+        parent.merge(worker.drain(), source="worker-1")
+    parent.forget("worker-1")
+
+    assert parent.snapshot()["busy_since"] is None
+
+
+def test_merge_without_source_ignores_busy():
+    parent = Metrics()
+    worker = Metrics()
+
+    with worker.busy():
+        parent.merge(worker.drain())
+
+    assert parent.snapshot()["busy_since"] is None
+
+
+def test_reporter_and_collector():
+    metrics_queue = queue.Queue()
+    collector = MetricsCollector(metrics_queue)
+    collector.start()
+    before = metrics.snapshot()["counters"].get("pages", 0)
+
+    # The reporter drains the global metrics, what it ships is merged back
+    reporter = MetricsReporter(metrics_queue, "worker-1", interval=0.01)
+    reporter.start()
+    metrics.inc("pages", 3)
+    reporter.stop()
+    collector.stop()
+
+    assert metrics.snapshot()["counters"].get("pages", 0) == before + 3
+    assert collector.sources == {"worker-1"}
+    assert metrics.snapshot()["busy_since"] is None
@@ -0,0 +1,48 @@
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from kakalot_scraper.cbz.Staging import ChapterStaging
+from kakalot_scraper.manager.Manager import MangaInfo
+from kakalot_scraper.pipeline.Pipeline import ChapterPipeline
+from kakalot_scraper.scrape.PageImage import PageImage
+
+MANGA_INFO = MangaInfo(
+    "Test Manga", "", "Ongoing", "", "", [], "", "https://example.com/manga/test"
+)
+
+
+def _pages(count: int) -> list[PageImage]:
+    pages = []
+    for i in range(count):
+        buffer = BytesIO()
+        Image.new("RGB", (200, 300), (i, 0, 0)).save(buffer, format="JPEG")
+        pages.append(PageImage(buffer.getvalue(), f"https://example.com/{i}.jpg"))
+    return pages
+
+
+def test_chapters_are_written_in_submission_order(library):
+    staging = ChapterStaging("https://example.com/manga/test/chapter-2", library)
+    staging.set_sources(["https://example.com/0.jpg"])
+    blocked = os.path.join(library, "not-a-directory")
+    with open(blocked, "w") as f:
+        f.write("")
+    written = []
+
+    with ChapterPipeline(
+        workers=2,
+        max_pending=1,
+        on_written=lambda info, chapter_num, path: written.append(chapter_num),
+    ) as pipeline:
+        pipeline.submit(MANGA_INFO, "0001_0", _pages(2), library)
+        pipeline.submit(MANGA_INFO, "0002_0", _pages(3), library, staging)
+        # The CBZ cannot be created under a file
+        pipeline.submit(MANGA_INFO, "0003_0", _pages(1), blocked)
+        pipeline.submit(MANGA_INFO, "0004_0", _pages(1), library)
+
+    assert written == ["0001_0", "0002_0", "0004_0"]
+    assert len(pipeline.completed) == 3
+    assert all(os.path.exists(path) for path in pipeline.completed)
+    assert pipeline.failed == ["Test Manga chapter 0003_0"]
+    assert not os.path.exists(staging.directory)
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from kakalot_scraper.ratelimit import RateLimiter as rate_limiter_module
+from kakalot_scraper.ratelimit.RateLimiter import SETTINGS, HostBucket, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", clock)
+    monkeypatch.setattr(SETTINGS, "BURST", 2.0)
+    return clock
+
+
+def test_share_splits_budget(clock, monkeypatch):
+    monkeypatch.setattr(SETTINGS, "SHARE", 4)
+    bucket = HostBucket(1.0)
+
+    # A quarter of the burst and of the rate
+    assert bucket.reserve() == pytest.approx(2.0)
+    clock.now += 4.0
+    assert bucket.reserve(0.5) == 0.0
+
+
+def test_bucket_refills_at_rate(clock):
+    bucket = HostBucket(0.5)
+
+    # The burst is free, then each token takes 1 / rate seconds
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(2.0)
+    clock.now += 6.0
+    assert bucket.reserve() == 0.0
+    # Refilling stops at the burst
+    clock.now += 100.0
+    bucket.reserve(0.0)
+    assert bucket.tokens == pytest.approx(SETTINGS.BURST)
+
+
+def test_throttle_statuses_back_off(clock, tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rates.json"))
+    url = "https://example.com/manga/some-manga"
+    limiter.reserve(url, identity=None)
+
+    limiter.record_status(url, 429)
+    assert limiter.stats()["example.com"]["rate"] == pytest.approx(
+        SETTINGS.INITIAL_RATE * SETTINGS.MULTIPLICATIVE_DECREASE
+    )
+    # The saved up burst is gone, the next request waits
+    assert limiter.reserve(url, identity=None) > 0
+
+    for _ in range(20):
+        limiter.record_status(url, 503)
+    assert limiter.stats()["example.com"]["rate"] == SETTINGS.MIN_RATE
+    assert limiter.stats()["example.com"]["failures"] == 21
+
+
+def test_successes_recover_additively(clock, tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rates.json"))
+    url = "https://example.com/manga/some-manga"
+
+    for _ in range(5):
+        limiter.record_status(url, 200)
+    assert limiter.stats()["example.com"]["rate"] == pytest.approx(
+        SETTINGS.INITIAL_RATE + 5 * SETTINGS.ADDITIVE_INCREASE
+    )
+
+    for _ in range(1000):
+        limiter.record_success(url)
+    assert limiter.stats()["example.com"]["rate"] == SETTINGS.MAX_RATE
+
+
+def test_learned_rates_are_persisted(clock, tmp_path):
+    path = tmp_path / "rates.json"
+    limiter = RateLimiter(str(path))
+    limiter.record_failure("https://slow.example.com/a")
+    limiter.record_success("https://fast.example.com/b")
+    limiter.save()
+
+    reloaded = RateLimiter(str(path))
+    reloaded.load()
+    assert reloaded.stats()["slow.example.com"]["rate"] == pytest.approx(
+        SETTINGS.INITIAL_RATE * SETTINGS.MULTIPLICATIVE_DECREASE
+    )
+    assert reloaded.stats()["fast.example.com"]["rate"] == pytest.approx(
+        SETTINGS.INITIAL_RATE + SETTINGS.ADDITIVE_INCREASE
+    )
+
+    # Rates outside the limits, e.g. from older settings, are clamped
+    path.write_text(json.dumps({"a.example.com": 100.0, "b.example.com": 0.0}))
+    clamped = RateLimiter(str(path))
+    clamped.load()
+    assert clamped.stats()["a.example.com"]["rate"] == SETTINGS.MAX_RATE
+    assert clamped.stats()["b.example.com"]["rate"] == SETTINGS.MIN_RATE
+
+
+def test_followers_do_not_save(clock, tmp_path, monkeypatch):
+    monkeypatch.setattr(SETTINGS, "SAVE_STATE", False)
+    path = tmp_path / "rates.json"
+    limiter = RateLimiter(str(path))
+    limiter.record_success("https://example.com/a")
+    limiter.save()
+
+    assert not path.exists()
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+
+from kakalot_scraper.scheduler.Scheduler import SETTINGS, SeriesScheduler
+
+URL = "https://example.com/manga/some-manga"
+HOUR = 3600
+NOW = 1_800_000_000.0
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = SeriesScheduler(str(tmp_path / "schedule.json"))
+    scheduler.add(URL, NOW)
+    return scheduler
+
+
+def test_new_chapters_learn_the_release_cadence(scheduler):
+    scheduler.record_check(URL, "Ongoing", "", 10, now=NOW)
+    entry = scheduler.series[URL]
+    assert entry.interval == SETTINGS.DEFAULT_INTERVAL_HOURS * HOUR
+
+    # A new chapter a day later, then another one three days after that
+    scheduler.record_check(URL, "Ongoing", "", 11, now=NOW + 24 * HOUR)
+    assert entry.cadence is None
+    scheduler.record_check(URL, "Ongoing", "", 12, now=NOW + 96 * HOUR)
+    assert entry.cadence == 72 * HOUR
+    assert entry.interval == 72 * HOUR / SETTINGS.CHECKS_PER_RELEASE
+    assert entry.next_check == NOW + 96 * HOUR + entry.interval
+
+    scheduler.record_check(URL, "Ongoing", "", 13, now=NOW + 120 * HOUR)
+    smoothing = SETTINGS.CADENCE_SMOOTHING
+    assert entry.cadence == pytest.approx(
+        smoothing * 24 * HOUR + (1 - smoothing) * 72 * HOUR
+    )
+
+
+def test_intervals_are_clamped(scheduler):
+    entry = scheduler.series[URL]
+
+    entry.cadence = 60.0
+    scheduler.record_check(URL, "Ongoing", "", None, now=NOW)
+    assert entry.interval == SETTINGS.MIN_INTERVAL_HOURS * HOUR
+
+    entry.cadence = 1000 * HOUR
+    scheduler.record_check(URL, "Ongoing", "", None, now=NOW)
+    assert entry.interval == SETTINGS.MAX_INTERVAL_HOURS * HOUR
+
+    scheduler.record_check(URL, "Completed", "", None, now=NOW)
+    assert entry.interval == SETTINGS.COMPLETED_INTERVAL_HOURS * HOUR
+
+
+def test_recent_update_without_cadence(scheduler):
+    # Updated eight hours ago according to the series page
+    updated = datetime.fromtimestamp(NOW - 8 * HOUR).strftime("%Y-%m-%d %H:%M:%S")
+    scheduler.record_check(URL, "Ongoing", updated, None, now=NOW)
+    entry = scheduler.series[URL]
+    assert entry.last_release == NOW - 8 * HOUR
+    assert entry.interval == 8 * HOUR / SETTINGS.CHECKS_PER_RELEASE
+
+
+def test_due_series_and_persistence(scheduler, tmp_path):
+    other = "https://example.com/manga/other-manga"
+    scheduler.add(other, NOW + HOUR)
+    assert scheduler.pop_due(NOW) == [URL]
+    assert scheduler.seconds_until_next(NOW) == HOUR
+
+    scheduler.record_failure(URL, now=NOW)
+    scheduler.save()
+    reloaded = SeriesScheduler(scheduler.state_path)
+    assert sorted(reloaded.pop_due(NOW + HOUR)) == [other, URL]
+    assert reloaded.series[URL].next_check == NOW + SETTINGS.RETRY_INTERVAL_HOURS * HOUR
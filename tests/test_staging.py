@@ -0,0 +1,82 @@
+import os
+import time
+import zipfile
+
+import pytest
+
+from kakalot_scraper.cbz.Generator import validate_cbz
+from kakalot_scraper.cbz.Staging import SETTINGS, ChapterStaging, sweep_stale_files
+
+CHAPTER_URL = "https://example.com/manga/some-manga/chapter-1"
+SOURCES = ["https://img.example.com/1.jpg", "https://img.example.com/2.jpg"]
+
+
+def test_staged_pages_survive_a_restart(library):
+    staging = ChapterStaging(CHAPTER_URL, library)
+    staging.set_sources(SOURCES)
+    staging.save_page(SOURCES[0], b"first page")
+
+    resumed = ChapterStaging(CHAPTER_URL, library)
+    assert resumed.sources == SOURCES
+    assert resumed.staged_count() == 1
+    assert resumed.load_page(SOURCES[0]) == b"first page"
+    assert resumed.load_page(SOURCES[1]) is None
+
+    # A reload that found no images keeps the checkpoint
+    resumed.set_sources([])
+    assert resumed.staged_count() == 1
+
+
+def test_changed_chapter_drops_staged_pages(library):
+    staging = ChapterStaging(CHAPTER_URL, library)
+    staging.set_sources(SOURCES)
+    staging.save_page(SOURCES[0], b"first page")
+
+    staging.set_sources(["https://img.example.com/other.jpg"])
+    assert staging.staged_count() == 0
+    assert ChapterStaging(CHAPTER_URL, library).sources == [
+        "https://img.example.com/other.jpg"
+    ]
+
+    staging.clear()
+    assert not os.path.exists(staging.directory)
+    assert ChapterStaging(CHAPTER_URL, library).sources == []
+
+
+def test_sweep_removes_only_stale_files(library):
+    old = time.time() - SETTINGS.STALE_STAGING_DAYS * 86400 - 60
+    stale_tmp = os.path.join(library, "Some Manga", "chapter.cbz.tmp")
+    fresh_tmp = os.path.join(library, "Other Manga", "chapter.cbz.tmp")
+    for path in [stale_tmp, fresh_tmp]:
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"partial")
+    os.utime(stale_tmp, (old, old))
+
+    abandoned = ChapterStaging(CHAPTER_URL, library)
+    abandoned.set_sources(SOURCES)
+    os.utime(abandoned.directory, (old, old))
+    current = ChapterStaging(f"{CHAPTER_URL[:-1]}2", library)
+    current.set_sources(SOURCES)
+
+    assert sweep_stale_files(library) == {"temp_files": 1, "staging": 1}
+    assert not os.path.exists(stale_tmp)
+    assert os.path.exists(fresh_tmp)
+    assert not os.path.exists(abandoned.directory)
+    assert os.path.exists(current.directory)
+
+
+def test_validate_cbz_rejects_missing_pages(tmp_path):
+    path = str(tmp_path / "chapter.cbz")
+    with zipfile.ZipFile(path, "w") as cbz:
+        cbz.writestr("0001.jpg", b"page")
+        cbz.writestr("ComicInfo.xml", "<ComicInfo/>")
+
+    validate_cbz(path, 1)
+    with pytest.raises(ValueError):
+        validate_cbz(path, 2)
+
+    with open(path, "wb") as f:
+        f.write(b"not a zip")
+    with pytest.raises(ValueError):
+        validate_cbz(path, 1)
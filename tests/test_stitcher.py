@@ -0,0 +1,76 @@
+from io import BytesIO
+
+from PIL import Image
+
+from kakalot_scraper.scrape.PageImage import PageImage
+from kakalot_scraper.scrape.Stitcher import SliceStitcher, stitch_pages
+
+
+def make_page(width, height, color, src):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return PageImage(buffer.getvalue(), src), src
+
+
+def test_slices_are_stitched_in_one_pass():
+    tall = make_page(100, 500, (255, 255, 255), "tall")
+    pages = [
+        tall,
+        make_page(100, 50, (255, 0, 0), "red"),
+        make_page(100, 30, (0, 255, 0), "green"),
+        make_page(80, 40, (0, 0, 0), "narrow"),
+        make_page(100, 20, (0, 0, 255), "blue"),
+    ]
+
+    stitched = stitch_pages(pages, min_height=100, max_height=0)
+
+    assert len(stitched) == 1
+    page, src = stitched[0]
+    assert src == "tall"
+    # The narrow slice is dropped
+    assert (page.width, page.height) == (100, 600)
+    image = page.decode()
+    assert image.getpixel((0, 0)) == (255, 255, 255)
+    assert image.getpixel((0, 500)) == (255, 0, 0)
+    assert image.getpixel((0, 550)) == (0, 255, 0)
+    assert image.getpixel((0, 580)) == (0, 0, 255)
+
+
+def test_pages_without_slices_are_not_decoded():
+    pages = [make_page(100, 500, "white", f"page-{n}") for n in range(3)]
+
+    stitched = stitch_pages(pages, min_height=100)
+
+    assert [page for page, _ in stitched] == [page for page, _ in pages]
+    assert all(page.has_original for page, _ in stitched)
+
+
+def test_height_cap_starts_a_new_page():
+    pages = [make_page(100, 60, "white", f"slice-{n}") for n in range(5)]
+
+    stitched = stitch_pages(pages, min_height=100, max_height=130)
+
+    assert [(page.height, src) for page, src in stitched] == [
+        (120, "slice-0"),
+        (120, "slice-2"),
+        (60, "slice-4"),
+    ]
+
+
+def test_slice_stitcher_streams_the_same_pages():
+    pages = [make_page(100, 60, "white", f"slice-{n}") for n in range(5)]
+    out = []
+    stitcher = SliceStitcher(
+        lambda page, src, count: out.append((page.height, src, count)),
+        min_height=100,
+        max_height=0,
+        max_pages=2,
+    )
+
+    for page, src in pages:
+        stitcher.add(page, src)
+        assert stitcher.held <= 2
+    stitcher.flush()
+
+    assert out == [(120, "slice-0", 2), (120, "slice-2", 2), (60, "slice-4", 1)]
+    assert stitcher.merge_count == 2
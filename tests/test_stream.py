@@ -0,0 +1,60 @@
+import os
+import zipfile
+from io import BytesIO
+
+from PIL import Image
+
+import kakalot_scraper
+from kakalot_scraper.cbz.Generator import CbzWriter
+from kakalot_scraper.cbz.Stream import ChapterStream
+from kakalot_scraper.manager.Manager import MangaInfo
+from kakalot_scraper.scrape.PageImage import PageImage
+
+MANGA_INFO = MangaInfo(
+    "Test Manga", "", "Ongoing", "", "", [], "", "https://example.com/manga/test"
+)
+
+
+def _slice(i: int) -> PageImage:
+    buffer = BytesIO()
+    Image.new("RGB", (200, 100), (i, 0, 0)).save(buffer, format="JPEG")
+    return PageImage(buffer.getvalue(), f"https://example.com/test/{i}.jpg")
+
+
+def test_stream_holds_at_most_the_budget(library, monkeypatch):
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "TRY_MERGING_SMALLER_IMAGES", True)
+    slices = [_slice(i) for i in range(40)]
+    stream = ChapterStream(CbzWriter(MANGA_INFO, "1", library), max_in_flight=4)
+    stream.begin("test", [page.src for page in slices])
+
+    for page in slices:
+        stream.add(page, page.src)
+        assert stream.writer.pending_weight + stream._stitcher.held <= 4
+    pages = stream.finish()
+    cbz_path = stream.commit()
+
+    # Runs of slices are split to fit the budget with the next slice
+    assert [page.height for page in pages] == [300] * 13 + [100]
+    assert all(page.data is None for page in pages)
+    with zipfile.ZipFile(cbz_path) as cbz:
+        assert len(cbz.namelist()) == 15
+    assert not os.path.exists(f"{cbz_path}.tmp")
+
+
+def test_aborted_writer_leaves_no_file(library):
+    writer = CbzWriter(MANGA_INFO, "1", library)
+    for i in range(3):
+        writer.add_page(_slice(i))
+    writer.flush()
+    assert os.path.exists(writer.tmp_path)
+
+    writer.abort()
+    assert not os.path.exists(writer.tmp_path)
+    assert not os.path.exists(writer.cbz_path)
+
+    # Leaving the block without a commit aborts too
+    with CbzWriter(MANGA_INFO, "1", library) as writer:
+        writer.add_page(_slice(0))
+        writer.flush()
+    assert not os.path.exists(writer.tmp_path)
+    assert not os.path.exists(writer.cbz_path)
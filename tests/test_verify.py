@@ -0,0 +1,64 @@
+import os
+
+import kakalot_scraper
+from kakalot_scraper.cbz.Naming import get_cbz_path
+from kakalot_scraper.library.Library import LibraryIndex
+from kakalot_scraper.library.Verify import verify_library
+from kakalot_scraper.manager.Manager import MangaInfo
+from kakalot_scraper.scheduler.Scheduler import SeriesScheduler
+
+URL = "https://example.com/manga/test"
+MANGA_INFO = MangaInfo("Test Manga", "", "Ongoing", "", "", [], "", URL)
+
+
+def _library(save_root):
+    """
+    Library with one series and one truncated chapter.
+    """
+    cbz_path = get_cbz_path(MANGA_INFO, "0001_0", save_root)
+    os.makedirs(os.path.dirname(cbz_path), exist_ok=True)
+    with open(cbz_path, "wb") as f:
+        f.write(b"PK\x03\x04 not a zip")
+    with LibraryIndex(os.path.join(save_root, ".library.db")) as index:
+        index.update_series(MANGA_INFO, 1, save_root)
+        index.add_chapter("test", "0001_0", cbz_path)
+    return cbz_path
+
+
+def test_verify_queues_broken_chapters(tmp_path, monkeypatch):
+    save_root = str(tmp_path / "library")
+    default_root = tmp_path / "default"
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "SAVE_ROOT", str(default_root))
+    cbz_path = _library(save_root)
+
+    counts = verify_library(save_root, workers=1)
+
+    assert counts == {"corrupt": 1}
+    assert os.path.exists(f"{cbz_path}.corrupt")
+    with LibraryIndex(os.path.join(save_root, ".library.db")) as index:
+        assert index.get_chapters("test") == {}
+        assert [url for url, _ in index.check_requests()] == [URL]
+    # Nothing is written to the default library or to the schedule
+    assert not default_root.exists()
+    assert not os.path.exists(os.path.join(save_root, ".schedule.json"))
+
+
+def test_scheduler_takes_check_requests(tmp_path):
+    save_root = str(tmp_path)
+    scheduler = SeriesScheduler(str(tmp_path / "schedule.json"))
+    scheduler.sync([URL])
+    scheduler.pop_due()
+    scheduler.record_check(URL, "Ongoing", "", 1)
+
+    with LibraryIndex(os.path.join(save_root, ".library.db")) as index:
+        index.update_series(MANGA_INFO, 1, save_root)
+        assert scheduler.take_requests(index) == []
+
+        index.request_check("test")
+        assert scheduler.take_requests(index) == [URL]
+        assert scheduler.pop_due() == [URL]
+        # The same request is only scheduled once, also when the check failed
+        assert scheduler.take_requests(index) == []
+
+        index.update_series(MANGA_INFO, 1, save_root)
+        assert index.check_requests() == []
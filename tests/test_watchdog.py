@@ -0,0 +1,18 @@
+import kakalot_scraper
+from kakalot_scraper.watchdog import Watchdog
+
+
+def test_cancel_drops_pending_reload(tmp_path, monkeypatch):
+    url_list = tmp_path / "to_scrape.conf"
+    url_list.write_text("")
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "URL_LIST_FILE_PATH", str(url_list))
+    monkeypatch.setattr(Watchdog.SETTINGS, "DEBOUNCE_SECONDS", 60.0)
+
+    handler = Watchdog.Handler()
+    handler.trigger_scrape()
+    timer = handler._timer
+    handler.cancel()
+
+    timer.join(1.0)
+    assert not timer.is_alive()
+    assert handler._timer is None
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import kakalot_scraper
+from kakalot_scraper.workqueue.WorkQueue import WorkQueue
+
+
+@pytest.fixture
+def queues(tmp_path, monkeypatch):
+    """
+    Two workers sharing one queue file, leases run out after 200ms.
+    """
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "USE_WORK_QUEUE", True)
+    path = str(tmp_path / "queue.db")
+    first = WorkQueue(path, owner="first", lease_seconds=0.2)
+    second = WorkQueue(path, owner="second", lease_seconds=0.2)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_claim_contention(queues):
+    first, second = queues
+
+    assert first.claim("series", "1")
+    assert not second.claim("series", "1")
+    assert second.claim("series", "2")
+    # Claiming a held chapter again is fine for its owner
+    assert first.claim("series", "1")
+    assert second.stats()["skipped"] == 1
+    assert first.active("series") == 2
+
+
+def test_release_frees_chapter(queues):
+    first, second = queues
+
+    assert first.claim("series", "1")
+    first.release("series", "1")
+
+    assert second.claim("series", "1")
+    assert second.stats()["reclaimed"] == 0
+
+
+def test_takeover_after_lease_expires(queues):
+    first, second = queues
+
+    assert first.claim("series", "1")
+    time.sleep(0.3)
+
+    assert first.active("series") == 0
+    assert second.claim("series", "1")
+    assert second.stats()["reclaimed"] == 1
+    assert not first.claim("series", "1")
+
+
+def test_renew_keeps_and_drops_leases(queues):
+    first, second = queues
+
+    assert first.claim("series", "1")
+    assert first.claim("series", "2")
+    time.sleep(0.3)
+    # Chapter 2 is taken over while the first worker missed its heartbeat
+    assert second.claim("series", "2")
+    first.renew()
+
+    assert first.stats()["held"] == 1
+    assert not second.claim("series", "1")
+    assert first.active("series") == 2
+
+
+def test_disabled_queue_always_claims(tmp_path, monkeypatch):
+    monkeypatch.setattr(kakalot_scraper.GLOBAL, "USE_WORK_QUEUE", False)
+    queue = WorkQueue(str(tmp_path / "queue.db"), owner="first")
+
+    assert queue.claim("series", "1")
+    assert queue.claim("series", "1")
+    assert not (tmp_path / "queue.db").exists()